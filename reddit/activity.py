@@ -0,0 +1,322 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .hyperloglog import HyperLogLog
+from .models import ActivityRollup, ArchivedComment, ArchivedPost, Comment, Post, Subreddit
+from .sharding import shards
+
+
+GRANULARITIES = ['minute', 'hour', 'day']
+
+# Sketches of 1024 registers, 1 KB per rollup with a standard error of about 3%.
+SKETCH_PRECISION = 10
+
+# Seconds rollups are kept at a granularity before being compacted into the next coarser one.
+DEFAULT_RETENTION = {'minute': 2 * 3600, 'hour': 7 * 86400}
+
+logger = logging.getLogger(__name__)
+
+
+def truncate(moment, granularity):
+    """
+    Return the start of the minute, hour or day of `moment`.
+    """
+    moment = moment.replace(second=0, microsecond=0)
+    if granularity in ('hour', 'day'):
+        moment = moment.replace(minute=0)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+class Tally:
+    """
+    Posts, comments and authors of one subreddit in one bucket.
+    """
+
+    def __init__(self):
+        self.posts = 0
+        self.comments = 0
+        self.authors = HyperLogLog(precision=SKETCH_PRECISION)
+
+    def add_rollup(self, rollup):
+        self.posts += rollup.posts
+        self.comments += rollup.comments
+        self.authors.merge(HyperLogLog.from_bytes(rollup.authors, precision=SKETCH_PRECISION))
+
+    def merge(self, other):
+        self.posts += other.posts
+        self.comments += other.comments
+        self.authors.merge(other.authors)
+
+    def sketch(self):
+        return self.authors.to_bytes() if any(self.authors.registers) else b''
+
+    def as_dict(self):
+        return {'posts': self.posts, 'comments': self.comments, 'active_authors': self.authors.count()}
+
+
+class ActivityRollups:
+    """
+    Posts, comments and active authors per subreddit, pre-aggregated in time buckets.
+
+    Created and deleted posts and comments are counted in memory per subreddit and minute,
+    and added to the `ActivityRollup` rows of their minutes by the first event after
+    `flush_interval` seconds or `max_pending` buffered buckets, each writing at most `flush_limit`
+    buckets until the buffer is empty, and all at exit. Deletions count
+    against the minute the content was created in. Counts that fail to be written are logged
+    and buffered again, never failing the request. `compact()`, run periodically by the
+    `rollup_activity` command, sums minute rollups older than `retention['minute']` into hour
+    rollups, and hour rollups older than `retention['hour']` into day rollups, so any time range
+    is summed from a few hundred rows at most. Authors are merged from HyperLogLog sketches,
+    and stay counted as active when their content is deleted.
+    """
+
+    def __init__(self, flush_interval=10, max_pending=10000, flush_limit=500, retention=None, enabled=True):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flush_limit = flush_limit
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # Subreddits of posts being deleted, for their comments deleted before them.
+        self.deleting = {}
+        self.reset()
+
+    def reset(self):
+        self.pending = defaultdict(Tally)
+        self.last_flush = time.monotonic()
+
+    @contextmanager
+    def paused(self):
+        """
+        Ignore the posts and comments deleted by this thread meanwhile, as when they're moved
+        to another shard or to the archive.
+        """
+        self.local.paused = True
+        try:
+            yield
+        finally:
+            self.local.paused = False
+
+    def subreddit_of(self, obj):
+        if isinstance(obj, Post):
+            return obj.subreddit_id
+        if Comment.post.is_cached(obj):
+            return obj.post.subreddit_id
+        if obj.post_id in self.deleting:
+            return self.deleting[obj.post_id]
+        return Post.objects.using(obj._state.db).filter(pk=obj.post_id).values_list('subreddit', flat=True).first()
+
+    def record(self, obj, deleted=False):
+        """
+        Count a created or deleted post or comment, once its transaction commits.
+        """
+        if not self.enabled or getattr(self.local, 'paused', False):
+            return
+        subreddit_pk = self.subreddit_of(obj)
+        if subreddit_pk is None:
+            return
+        change = -1 if deleted else 1
+        kind = 'posts' if isinstance(obj, Post) else 'comments'
+        author_pk = None if deleted else obj.author_id
+        transaction.on_commit(
+            partial(self.add, subreddit_pk, obj.created_at, author_pk, **{kind: change}),
+            using=obj._state.db or DEFAULT_DB_ALIAS
+        )
+
+    def add(self, subreddit_pk, created_at, author_pk=None, posts=0, comments=0):
+        with self.lock:
+            tally = self.pending[subreddit_pk, 'minute', truncate(created_at, 'minute')]
+            tally.posts += posts
+            tally.comments += comments
+            if author_pk is not None:
+                tally.authors.add(author_pk)
+            due = len(self.pending) >= self.max_pending or time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush(limit=self.flush_limit)
+
+    def flush(self, limit=None):
+        """
+        Write the buffered counts of at most `limit` buckets to the database, the others stay buffered
+        and due. Returns the number of written buckets.
+        """
+        with self.lock:
+            if limit is None or len(self.pending) <= limit:
+                pending = self.pending
+                self.reset()
+            else:
+                pending = {key: self.pending.pop(key) for key in list(islice(self.pending, limit))}
+
+        if not pending:
+            return 0
+        try:
+            self.write(pending)
+        except Exception:
+            logger.exception('Writing %s activity rollups failed, buffering them again.', len(pending))
+            self.restore(pending)
+            return 0
+        return len(pending)
+
+    def restore(self, tallies):
+        with self.lock:
+            for key, tally in tallies.items():
+                self.pending[key].merge(tally)
+
+    def write(self, tallies, batch_size=500):
+        """
+        Add `{(subreddit pk, granularity, start): Tally}` to the stored rollups, creating missing ones.
+        Counts of subreddits deleted meanwhile are dropped.
+        """
+        items = list(tallies.items())
+        with transaction.atomic():
+            for offset in range(0, len(items), batch_size):
+                self.write_batch(dict(items[offset:offset + batch_size]))
+
+    def write_batch(self, tallies):
+        subreddits = set(
+            Subreddit.objects.filter(pk__in={key[0] for key in tallies}).values_list('pk', flat=True)
+        )
+        tallies = {key: tally for key, tally in tallies.items() if key[0] in subreddits}
+        if not tallies:
+            return
+
+        # Insert the missing rollups empty, without failing when another process just did, then
+        # add to the locked rows. The given tallies are left as they were, to be buffered again on failure.
+        ActivityRollup.objects.bulk_create([
+            ActivityRollup(subreddit_id=subreddit_pk, granularity=granularity, start=start, authors=b'')
+            for subreddit_pk, granularity, start in tallies
+        ], ignore_conflicts=True)
+        stored = {
+            (rollup.subreddit_id, rollup.granularity, rollup.start): rollup
+            for rollup in ActivityRollup.objects.select_for_update().filter(
+                subreddit__in=subreddits,
+                granularity__in={key[1] for key in tallies},
+                start__in={key[2] for key in tallies},
+            )
+        }
+        changed = []
+        for key, tally in tallies.items():
+            rollup = stored[key]
+            total = Tally()
+            total.add_rollup(rollup)
+            total.merge(tally)
+            rollup.posts, rollup.comments, rollup.authors = total.posts, total.comments, total.sketch()
+            changed.append(rollup)
+        ActivityRollup.objects.bulk_update(changed, ['posts', 'comments', 'authors'])
+
+    def granularity_for(self, moment, now):
+        """
+        Return the granularity the rollups of `moment` are kept at once compacted.
+        """
+        for fine, coarse in zip(GRANULARITIES, GRANULARITIES[1:]):
+            if moment >= truncate(now - timedelta(seconds=self.retention[fine]), coarse):
+                return fine
+        return GRANULARITIES[-1]
+
+    def compact(self, now=None):
+        """
+        Sum the minute and hour rollups past their retention into rollups of the next coarser
+        granularity. Only whole hours and days are compacted. Returns the number of compacted rows.
+        """
+        now = now or timezone.now()
+        compacted = 0
+        for fine, coarse in zip(GRANULARITIES, GRANULARITIES[1:]):
+            cutoff = truncate(now - timedelta(seconds=self.retention[fine]), coarse)
+            with transaction.atomic():
+                rollups = list(ActivityRollup.objects.select_for_update().filter(granularity=fine, start__lt=cutoff))
+                tallies = defaultdict(Tally)
+                for rollup in rollups:
+                    tallies[rollup.subreddit_id, coarse, truncate(rollup.start, coarse)].add_rollup(rollup)
+                self.write(tallies)
+                pks = [rollup.pk for rollup in rollups]
+                for offset in range(0, len(pks), 500):
+                    ActivityRollup.objects.filter(pk__in=pks[offset:offset + 500]).delete()
+            compacted += len(rollups)
+        return compacted
+
+    def rebuild(self, now=None, chunk_size=2000):
+        """
+        Recount all rollups from the hot and archived posts and comments of every shard.
+        Content loaded without signals, e.g. by `import_dump`, is only counted this way.
+        Returns the number of counted posts and comments.
+        """
+        now = now or timezone.now()
+        ActivityRollup.objects.all().delete()
+        counted = 0
+        for alias in shards():
+            streams = [
+                ('posts', Post.objects.using(alias).values_list('subreddit', 'author', 'created_at')),
+                ('comments', Comment.objects.using(alias).values_list('post__subreddit', 'author', 'created_at')),
+                ('posts', ArchivedPost.objects.using(alias).values_list('subreddit', 'author', 'created_at')),
+                (
+                    'comments',
+                    ArchivedComment.objects.using(alias).values_list('post__subreddit', 'author', 'created_at')
+                ),
+            ]
+            for kind, rows in streams:
+                tallies = defaultdict(Tally)
+                for subreddit_pk, author_pk, created_at in rows.order_by().iterator(chunk_size=chunk_size):
+                    granularity = self.granularity_for(created_at, now)
+                    tally = tallies[subreddit_pk, granularity, truncate(created_at, granularity)]
+                    setattr(tally, kind, getattr(tally, kind) + 1)
+                    if author_pk is not None:
+                        tally.authors.add(author_pk)
+                    counted += 1
+                    if len(tallies) >= self.max_pending:
+                        self.write(tallies)
+                        tallies = defaultdict(Tally)
+                self.write(tallies)
+        return counted
+
+
+def activity_stats(subreddit_pk, start, end, interval='hour'):
+    """
+    Return the posts, comments and active authors of the subreddit from `start` until `end`,
+    in total and per `interval`, summed from the rollups starting in that range. Ranges are
+    resolved at the granularity their rollups are kept at, and counts are up to the flush
+    interval behind. Intervals without rollups are left out of the series.
+    """
+    rollups = ActivityRollup.objects.filter(subreddit=subreddit_pk, start__gte=start, start__lt=end).order_by('start')
+    total = Tally()
+    series = defaultdict(Tally)
+    for rollup in rollups:
+        total.add_rollup(rollup)
+        series[truncate(rollup.start, interval)].add_rollup(rollup)
+    return {
+        'start': start,
+        'end': end,
+        'interval': interval,
+        **total.as_dict(),
+        'series': [{'start': moment, **tally.as_dict()} for moment, tally in series.items()],
+    }
+
+
+def post_count(subreddit_pk):
+    """
+    Return the number of posts of the subreddit counted by its rollups, or None without any.
+    Removed posts are included, and the count is up to the flush interval behind.
+    """
+    return ActivityRollup.objects.filter(subreddit=subreddit_pk).aggregate(posts=Sum('posts'))['posts']
+
+
+activity_rollups = ActivityRollups(
+    flush_interval=getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 10),
+    max_pending=getattr(settings, 'ACTIVITY_MAX_PENDING', 10000),
+    flush_limit=getattr(settings, 'ACTIVITY_FLUSH_LIMIT', 500),
+    retention=getattr(settings, 'ACTIVITY_RETENTION', None),
+)
+atexit.register(activity_rollups.flush)
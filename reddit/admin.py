@@ -1,8 +1,232 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max, Min, Q, QuerySet
+from django.db.models.functions import Left
 
+from .estimates import bounded_count, estimate_count
 from .models import Comment, Post, Subreddit
+from .sharding import is_sharded, is_sharded_model, locate, shards
+
+
+CURSOR_VAR = 'cursor'
+
+
+def period_bounds(moment, kind):
+    """
+    Return the start of the year, month or day of `moment` and the start of the next one.
+    """
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind == 'day':
+        return start, start + timedelta(days=1)
+    start = start.replace(day=1)
+    if kind == 'month':
+        return start, (start + timedelta(days=32)).replace(day=1)
+    start = start.replace(month=1)
+    return start, start.replace(year=start.year + 1)
+
+
+class DrilldownQuerySet(QuerySet):
+    """
+    Queryset read by the admin's date hierarchy with index seeks: MIN() and MAX() are queried
+    apart, and `datetimes()` seeks the first row of each year, month or day instead of a
+    SELECT DISTINCT over all rows.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        # Without the changelist's annotations, which would wrap it in a subquery over every row.
+        queryset = self.order_by()
+        queryset.query.annotations = {}
+        queryset.query.set_annotation_mask(None)
+        if not args and len(kwargs) > 1 and all(isinstance(value, (Min, Max)) for value in kwargs.values()):
+            # SQLite reads a MIN() or MAX() from an index only when it's alone in the query.
+            return {name: queryset.aggregate(**{name: value})[name] for name, value in kwargs.items()}
+        return super(DrilldownQuerySet, queryset).aggregate(*args, **kwargs)
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None, is_dst=None):
+        queryset = self.order_by()
+        periods = []
+        first = queryset.aggregate(first=Min(field_name))['first']
+        while first is not None:
+            start, end = period_bounds(first, kind)
+            periods.append(start)
+            first = queryset.filter(**{f'{field_name}__gte': end}).aggregate(first=Min(field_name))['first']
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """
+    Pick the shard a changelist of posts or comments reads, the first one by default.
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shards()[1:]]
+
+    def choices(self, changelist):
+        for lookup, title in [(None, shards()[0]), *self.lookup_choices]:
+            params = {self.parameter_name: lookup} if lookup else {}
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string(params, [self.parameter_name]),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        if self.value() in shards():
+            return queryset.using(self.value())
+        return queryset
+
+
+class CursorChangeList(ChangeList):
+    """
+    Changelist paged by a cursor on its `ordering` instead of page number, so deep pages don't
+    scan past an OFFSET, and counted from table statistics or up to a limit instead of an exact COUNT(*).
+    """
+
+    def cursor_fields(self):
+        return [
+            self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+            for name in (field.lstrip('-') for field in self.model_admin.ordering)
+        ]
+
+    def encode_cursor(self, obj):
+        return ','.join(str(field.value_from_object(obj)) for field in self.cursor_fields())
+
+    def cursor_filter(self, cursor):
+        """
+        Return the rows after the cursor, in descending order of every cursor field.
+        """
+        fields = self.cursor_fields()
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, cursor.split(','), strict=True)]
+        except (ValueError, ValidationError):
+            raise IncorrectLookupParameters
+        condition = Q()
+        for index, field in enumerate(fields):
+            equal = {previous.attname: value for previous, value in zip(fields[:index], values)}
+            condition |= Q(**equal, **{f'{field.attname}__lt': values[index]})
+        return condition
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        return super().get_query_string(new_params, [CURSOR_VAR, *(remove or [])])
+
+    def apply_select_related(self, qs):
+        if qs.db != DEFAULT_DB_ALIAS and isinstance(self.list_select_related, (list, tuple)):
+            # Related rows are on the default database, a shard can't join them.
+            return qs.prefetch_related(*self.list_select_related)
+        return super().apply_select_related(qs)
+
+    def get_results(self, request):
+        self.cursor = self.params.get(CURSOR_VAR)
+        queryset = self.queryset
+        if self.cursor:
+            queryset = queryset.filter(self.cursor_filter(self.cursor))
+        rows = list(queryset[:self.list_per_page + 1])
+        has_next = len(rows) > self.list_per_page
+        self.result_list = rows[:self.list_per_page]
+
+        if self.queryset.query.where:
+            self.result_count, self.result_count_exact = bounded_count(self.queryset, self.model_admin.count_limit)
+            self.result_count_bounded = not self.result_count_exact
+        else:
+            self.result_count = estimate_count(self.model, self.queryset.db)
+            self.result_count_exact = self.result_count_bounded = False
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.paginator.count = self.result_count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = has_next or bool(self.cursor)
+        self.first_page_url = self.get_query_string()
+        self.next_page_url = None
+        if has_next:
+            self.next_page_url = self.get_query_string({CURSOR_VAR: self.encode_cursor(self.result_list[-1])})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Admin for tables too large to count or page by offset: pages are read newest first along
+    the (created_at, id) index, related objects are picked by id instead of from dropdowns, and
+    the date hierarchy seeks its dates in the index. Filters must be backed by an index too.
+    Sharded tables are read from one shard at a time, picked with a filter.
+    """
+    list_per_page = 50
+    ordering = ['-created_at', '-id']
+    date_hierarchy = 'created_at'
+    sortable_by = ()
+    show_full_result_count = False
+    # Filtered changelists are counted exactly up to this number of rows.
+    count_limit = 1000
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DrilldownQuerySet(self.model, query=queryset.query, using=queryset._db, hints=queryset._hints)
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if is_sharded() and is_sharded_model(self.model):
+            return [ShardFilter, *list_filter]
+        return list_filter
+
+    def get_object(self, request, object_id, from_field=None):
+        if from_field is None and is_sharded_model(self.model):
+            try:
+                alias = locate(self.model, self.model._meta.pk.to_python(object_id))
+            except ValidationError:
+                return None
+            return self.get_queryset(request).using(alias).filter(pk=object_id).first()
+        return super().get_object(request, object_id, from_field)
+
+
+@admin.register(Subreddit)
+class SubredditAdmin(LargeTableAdmin):
+    list_display = ['id', 'name', 'owner', 'shard', 'created_at']
+    list_select_related = ['owner']
+    raw_id_fields = ['owner', 'moderator']
+    search_fields = ['name__exact']
+
+
+@admin.register(Post)
+class PostAdmin(LargeTableAdmin):
+    list_display = ['id', 'title', 'subreddit', 'author', 'created_at', 'report_count', 'is_removed', 'is_locked']
+    list_select_related = ['subreddit', 'author']
+    list_filter = ['created_at', 'is_removed', 'is_locked']
+    raw_id_fields = ['subreddit', 'author']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('text', 'subreddit__description')
+
+
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
+    list_display = ['id', 'text_preview', 'post_pk', 'author', 'created_at', 'report_count', 'is_removed', 'is_locked']
+    list_select_related = ['author']
+    list_filter = ['created_at', 'is_removed', 'is_locked']
+    raw_id_fields = ['post', 'author']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('text').annotate(text_preview=Left('text', 80))
 
+    @admin.display(description='text')
+    def text_preview(self, obj):
+        return obj.text_preview
 
-admin.site.register(Subreddit)
-admin.site.register(Post)
-admin.site.register(Comment)
+    @admin.display(description='post')
+    def post_pk(self, obj):
+        return obj.post_id
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.core.checks import Tags, register
 
 
 class RedditConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reddit'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .checks import check_datetime_format, check_shared_caches
+
+        register(check_shared_caches, Tags.caches)
+        register(check_datetime_format)
@@ -0,0 +1,109 @@
+import zlib
+
+import msgpack
+from django.db import transaction
+
+from .activity import activity_rollups
+from .models import ArchivedComment, ArchivedPost, Comment, Post
+from .sharding import locate
+
+
+# Columns of the hot models kept as columns in the archive, everything else goes into the payload.
+POST_COLUMNS = ['id', 'subreddit_id', 'author_id', 'created_at']
+COMMENT_COLUMNS = ['id', 'post_id', 'author_id', 'created_at']
+
+ARCHIVE_MODELS = {
+    Post: (ArchivedPost, POST_COLUMNS),
+    Comment: (ArchivedComment, COMMENT_COLUMNS),
+}
+
+
+def encode(obj, columns):
+    """
+    Return the compressed payload of the fields of `obj` not stored as archive columns.
+    """
+    payload = {
+        field.attname: getattr(obj, field.attname)
+        for field in obj._meta.concrete_fields
+        if field.attname not in columns
+    }
+    return zlib.compress(msgpack.packb(payload, datetime=True), 9)
+
+
+def decode(data):
+    return msgpack.unpackb(zlib.decompress(data), timestamp=3)
+
+
+def restore(archived, model):
+    """
+    Rebuild a read-only, unsaved instance of `model` from its archived row.
+    """
+    archive_model, columns = ARCHIVE_MODELS[model]
+    fields = decode(archived.data)
+    fields.update({column: getattr(archived, column) for column in columns})
+    obj = model(**fields)
+    obj._state.adding = False
+    obj._state.db = archived._state.db
+    return obj
+
+
+def load(model, pk):
+    """
+    Return the archived post or comment with the given pk as an instance of `model`, or None.
+    """
+    archive_model, columns = ARCHIVE_MODELS[model]
+    archived = archive_model.objects.using(locate(archive_model, pk)).filter(pk=pk).first()
+    if archived is None:
+        return None
+    return restore(archived, model)
+
+
+def is_archived(post_pk):
+    return ArchivedPost.objects.using(locate(ArchivedPost, post_pk)).filter(pk=post_pk).exists()
+
+
+def load_comments(post_pk):
+    """
+    Return the comments of an archived post, newest first.
+    """
+    archived_comments = ArchivedComment.objects.using(locate(ArchivedPost, post_pk)).filter(post=post_pk)
+    return [restore(archived, Comment) for archived in archived_comments.order_by('-created_at')]
+
+
+def archive_batch(alias, cutoff, batch_size):
+    """
+    Move up to `batch_size` posts created before `cutoff`, with their comments, from the hot
+    tables of the `alias` shard into the archive. Archived content is locked, so it's shown
+    as read-only when served from the archive. Reports of archived content are dropped.
+
+    Every batch is a single transaction that removes what it archived from the hot tables,
+    so an interrupted run simply resumes where it stopped. Archived content still counts in
+    the activity rollups. Returns the numbers of archived posts and comments.
+    """
+    with transaction.atomic(using=alias):
+        posts = list(
+            Post.objects.using(alias).select_for_update()
+            .filter(created_at__lt=cutoff).order_by('pk')[:batch_size]
+        )
+        if not posts:
+            return 0, 0
+        post_pks = [post.pk for post in posts]
+        comments = list(Comment.objects.using(alias).filter(post__in=post_pks))
+
+        for obj in posts + comments:
+            obj.is_locked = True
+        ArchivedPost.objects.using(alias).bulk_create([
+            ArchivedPost(data=encode(post, POST_COLUMNS), **{column: getattr(post, column) for column in POST_COLUMNS})
+            for post in posts
+        ])
+        ArchivedComment.objects.using(alias).bulk_create([
+            ArchivedComment(
+                data=encode(comment, COMMENT_COLUMNS),
+                **{column: getattr(comment, column) for column in COMMENT_COLUMNS}
+            )
+            for comment in comments
+        ])
+        with activity_rollups.paused():
+            Post.objects.using(alias).filter(pk__in=post_pks).delete()
+
+    return len(posts), len(comments)
@@ -0,0 +1,91 @@
+import json
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve, reverse
+from rest_framework import status
+
+
+BATCH_URLCONF = 'reddit.urls'
+
+# Request headers of the batch request that don't apply to its sub-requests as such.
+EXCLUDED_META = {'CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_IDEMPOTENCY_KEY', 'HTTP_ACCEPT', 'HTTP_ACCEPT_ENCODING'}
+
+
+def api_root():
+    return reverse('batch')[:-len('batch/')]
+
+
+def build_request(request, method, path, body=None, idempotency_key=None):
+    """
+    Return a sub-request of `request` for `path`, authenticated as the same user.
+    """
+    path, _, query_string = path.partition('?')
+    content = b'' if body is None else json.dumps(body).encode()
+    environ = {key: value for key, value in request.META.items() if key not in EXCLUDED_META}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': query_string,
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': BytesIO(content),
+    })
+    if idempotency_key is not None:
+        environ['HTTP_IDEMPOTENCY_KEY'] = idempotency_key
+    sub_request = WSGIRequest(environ)
+    # Picked up by DRF in place of the authenticators, the sub-request isn't authenticated again.
+    if request.user.is_authenticated:
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def execute(request, method, path, body=None, idempotency_key=None):
+    """
+    Run one sub-request against the reddit URLconf and return (status, data).
+    """
+    root = api_root()
+    if not path.startswith('/'):
+        path = root + path
+    try:
+        if not path.startswith(root):
+            raise Resolver404
+        match = resolve('/' + path[len(root):].partition('?')[0], urlconf=BATCH_URLCONF)
+    except Resolver404:
+        return status.HTTP_404_NOT_FOUND, {'detail': 'Not found.'}
+    if match.url_name == 'batch':
+        return status.HTTP_400_BAD_REQUEST, {'detail': 'Batch requests can\'t be nested.'}
+
+    sub_request = build_request(request, method, path, body, idempotency_key)
+    response = match.func(sub_request, *match.args, **match.kwargs)
+    return response.status_code, getattr(response, 'data', None)
+
+
+def execute_batch(request, items):
+    """
+    Run the sub-requests in order and return their results. Read-only batches run in one
+    transaction on one connection; batches with writes run every sub-request on its own,
+    so a failed write doesn't undo the others.
+
+    With an `Idempotency-Key` header, every sub-request gets a key derived from it and its
+    position, so a retried batch replays the creates that succeeded instead of writing twice,
+    and runs the failed ones again.
+    """
+    idempotency_key = request.headers.get('Idempotency-Key')
+
+    def run():
+        results = []
+        for index, item in enumerate(items):
+            item_key = None if idempotency_key is None else f'{index}:{idempotency_key}'
+            status_code, data = execute(request, item['method'], item['path'], item.get('body'), item_key)
+            results.append({'status': status_code, 'body': data})
+        return results
+
+    if all(item['method'] == 'GET' for item in items):
+        with transaction.atomic():
+            return run()
+    return run()
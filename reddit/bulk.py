@@ -0,0 +1,22 @@
+from django.db import connections
+
+
+def bulk_insert_raw(model, objs, using, batch_size=None):
+    """
+    Insert `objs` with their field values as they are, primary keys included.
+
+    Unlike `bulk_create()`, fields' `pre_save()` isn't called, so `auto_now` and
+    `auto_now_add` timestamps of copied or imported rows are kept (the same raw mode
+    `loaddata` uses). No signals are sent.
+    """
+    if not objs:
+        return
+
+    fields = model._meta.local_concrete_fields
+    ops = connections[using].ops
+    batch_size = min(batch_size or len(objs), max(ops.bulk_batch_size(fields, objs), 1))
+    for start in range(0, len(objs), batch_size):
+        model._base_manager._insert(objs[start:start + batch_size], fields=fields, raw=True, using=using)
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
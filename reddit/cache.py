@@ -0,0 +1,138 @@
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .checks import is_shared_cache
+
+
+MISSING = object()
+
+
+class ObjectCache:
+    """
+    Read-through cache of serialized objects keyed by model and pk.
+
+    Hot keys are protected from stampedes in two ways. Entries are refreshed early with a
+    probability that grows as they approach expiry, scaled by how long the last load took
+    (probabilistic early expiration), so one request usually refreshes a hot key before it
+    expires. And only the request holding a short lock loads a key: during an early refresh
+    the others keep serving the cached value, on a miss they wait for the loader's result.
+
+    Writes update or delete the entries of the cache they run against. In a process-local cache
+    other processes keep serving their own copy, so entries there expire after `local_timeout`
+    seconds, the longest an edited, removed or deleted object is served by another process.
+
+    Counters updated more often than the objects, such as view counts, are cached under their
+    own keys by `set_counters()`, so updating them doesn't evict the objects.
+    """
+
+    def __init__(
+        self, alias='default', timeout=300, local_timeout=5, beta=1.0, lock_timeout=5, wait_timeout=1.0,
+        wait_interval=0.01
+    ):
+        self.alias = alias
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.wait_interval = wait_interval
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def entry_timeout(self):
+        if is_shared_cache(self.alias):
+            return self.timeout
+        return min(self.timeout, self.local_timeout)
+
+    def key(self, model, pk):
+        return f'object:{model._meta.label_lower}:{pk}'
+
+    def get(self, model, pk, loader):
+        """
+        Return the cached representation of the object, calling `loader()` to build it when needed.
+        Exceptions raised by the loader, such as `Http404`, are propagated and nothing is cached.
+        """
+        key = self.key(model, pk)
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            value, expires_at, delta = entry
+            if not self.should_refresh(expires_at, delta):
+                return value
+            if not self.acquire(key):
+                return value
+        elif not self.acquire(key):
+            value = self.wait(key)
+            if value is not MISSING:
+                return value
+            return loader()
+
+        try:
+            start = time.monotonic()
+            value = loader()
+            self.set(model, pk, value, delta=time.monotonic() - start)
+        finally:
+            self.release(key)
+        return value
+
+    def set(self, model, pk, value, delta=0.0):
+        timeout = self.entry_timeout
+        self.cache.set(self.key(model, pk), (value, time.time() + timeout, delta), timeout)
+
+    def delete(self, model, pk):
+        self.cache.delete(self.key(model, pk))
+
+    def delete_many(self, model, pks):
+        self.cache.delete_many([self.key(model, pk) for pk in pks])
+
+    def counters_key(self, model, pk):
+        return f'{self.key(model, pk)}:counters'
+
+    def set_counters(self, model, counters):
+        """
+        Cache `{pk: {name: value}}` counters of objects, read back by `with_counters()`.
+        """
+        entries = {self.counters_key(model, pk): values for pk, values in counters.items()}
+        self.cache.set_many(entries, self.entry_timeout)
+
+    def with_counters(self, model, pk, value, names):
+        """
+        Return the cached representation with its counters `names` updated from `set_counters()`.
+        Counters only grow, so the larger of the two values is the latest.
+        """
+        counters = self.cache.get(self.counters_key(model, pk))
+        if not counters:
+            return value
+        return {**value, **{name: max(value[name], counters[name]) for name in names if name in counters}}
+
+    def should_refresh(self, expires_at, delta):
+        return time.time() - delta * self.beta * math.log(1.0 - random.random()) >= expires_at
+
+    def acquire(self, key):
+        return self.cache.add(f'{key}:lock', True, self.lock_timeout)
+
+    def release(self, key):
+        self.cache.delete(f'{key}:lock')
+
+    def wait(self, key):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.wait_interval)
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return MISSING
+
+
+object_cache = ObjectCache(
+    alias=getattr(settings, 'OBJECT_CACHE_ALIAS', 'default'),
+    timeout=getattr(settings, 'OBJECT_CACHE_TIMEOUT', 300),
+    local_timeout=getattr(settings, 'OBJECT_CACHE_LOCAL_TIMEOUT', 5),
+)
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.checks import Error
+
+
+# Backends whose entries aren't seen by other processes.
+LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+# Settings naming cache aliases that must be shared by all worker processes, with their defaults.
+SHARED_CACHE_SETTINGS = {
+    'IDEMPOTENCY_CACHE_ALIAS': ('shared', 'reddit.E001'),
+}
+
+
+def is_shared_cache(alias):
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    return backend is not None and backend not in LOCAL_CACHE_BACKENDS
+
+
+def check_shared_caches(app_configs, **kwargs):
+    """
+    Reject process-local caches for state every worker process must see.
+    """
+    errors = []
+    for setting, (default, check_id) in SHARED_CACHE_SETTINGS.items():
+        alias = getattr(settings, setting, default)
+        if not is_shared_cache(alias):
+            errors.append(Error(
+                f'{setting} must name a cache shared by all processes, "{alias}" is process-local or missing.',
+                hint='Use the database, Redis or Memcached cache backend.',
+                id=check_id,
+            ))
+    return errors
+
+
+def check_datetime_format(app_configs, **kwargs):
+    """
+    Require UTC when datetimes are rendered as is, since they're no longer converted to the current timezone.
+    """
+    from rest_framework.settings import api_settings
+
+    if api_settings.DATETIME_FORMAT is None and settings.TIME_ZONE != 'UTC':
+        return [Error(
+            f'REST_FRAMEWORK["DATETIME_FORMAT"] = None requires TIME_ZONE = "UTC", not "{settings.TIME_ZONE}".',
+            hint='Datetimes are rendered in UTC as stored, set TIME_ZONE to "UTC" or a DATETIME_FORMAT.',
+            id='reddit.E002',
+        )]
+    return []
@@ -0,0 +1,121 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipCodec:
+    """
+    gzip through zlib directly, so whole bodies and streams can use different levels.
+    """
+    encoding = 'gzip'
+
+    def __init__(self, level=6, stream_level=1):
+        self.level = level
+        self.stream_level = stream_level
+
+    def compress(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_stream(self, chunks):
+        compressor = zlib.compressobj(self.stream_level, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class BrotliCodec:
+    encoding = 'br'
+
+    def __init__(self, level=5, stream_level=1):
+        self.level = level
+        self.stream_level = stream_level
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.level)
+
+    def compress_stream(self, chunks):
+        compressor = brotli.Compressor(quality=self.stream_level)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class ZstdCodec:
+    encoding = 'zstd'
+
+    def __init__(self, level=3, stream_level=1):
+        self.level = level
+        self.stream_level = stream_level
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def compress_stream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=self.stream_level).compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def available_codecs():
+    """
+    Return the codecs usable in this environment, in order of server preference.
+    """
+    codecs = []
+    if brotli is not None:
+        codecs.append(BrotliCodec())
+    if zstandard is not None:
+        codecs.append(ZstdCodec())
+    codecs.append(GzipCodec())
+    return codecs
+
+
+def parse_accept_encoding(header):
+    """
+    Return a dict of the codings accepted by the `Accept-Encoding` header and their q-values.
+    """
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate(header, codecs):
+    """
+    Pick the codec for a request's `Accept-Encoding` header, or None to send the body as is.
+    Server preference decides between codings the client accepts with the same q-value.
+    """
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for codec in codecs:
+        quality = accepted.get(codec.encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = codec, quality
+    return best
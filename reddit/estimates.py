@@ -0,0 +1,107 @@
+import json
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import Max
+
+
+def table_statistics(model, using):
+    """
+    Return the row count of the model's table kept by the database statistics, or None.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples FROM pg_class WHERE oid = %s::regclass'
+    elif connection.vendor == 'mysql':
+        sql = 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s'
+    elif connection.vendor == 'sqlite':
+        # Filled by ANALYZE, the first number of `stat` is the number of rows.
+        sql = 'SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s'
+    else:
+        return None
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def estimate_count(model, using=DEFAULT_DB_ALIAS):
+    """
+    Return an estimate of the number of rows of the model's table without counting them:
+    from the database statistics, or from the largest primary key when there are none.
+    """
+    estimate = table_statistics(model, using)
+    if estimate is None:
+        estimate = model._base_manager.using(using).aggregate(max_pk=Max('pk'))['max_pk'] or 0
+    return estimate
+
+
+def bounded_count(queryset, limit):
+    """
+    Count the rows of `queryset`, reading at most `limit + 1` of them.
+    Returns (count, exact); past the limit the count is `limit` and not exact.
+    """
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, False
+    return count, True
+
+
+def planner_estimate(queryset):
+    """
+    Return the number of rows the query planner expects `queryset` to return, or None when
+    the database doesn't estimate it; only PostgreSQL does.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def rows_per_value(model, column, using=DEFAULT_DB_ALIAS):
+    """
+    Return the average number of rows per distinct value of `column` kept by the database
+    statistics, or None. SQLite keeps it for the leading column of every analyzed index.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT c.reltuples, s.n_distinct FROM pg_class c JOIN pg_stats s ON s.tablename = c.relname '
+                    'WHERE c.oid = %s::regclass AND s.attname = %s',
+                    [table, column]
+                )
+                row = cursor.fetchone()
+                if row is None or row[0] <= 0 or not row[1]:
+                    return None
+                # Negative values are the number of distinct values as a fraction of the rows.
+                distinct = -row[1] * row[0] if row[1] < 0 else row[1]
+                return max(round(row[0] / distinct), 1)
+            if connection.vendor == 'sqlite':
+                cursor.execute('SELECT idx, stat FROM sqlite_stat1 WHERE tbl = %s AND idx IS NOT NULL', [table])
+                for index, stat in cursor.fetchall():
+                    cursor.execute('SELECT name FROM pragma_index_info(%s) WHERE seqno = 0', [index])
+                    leading = cursor.fetchone()
+                    values = stat.split()
+                    if leading is not None and leading[0] == column and len(values) > 1:
+                        return int(values[1])
+    except DatabaseError:
+        return None
+    return None
@@ -0,0 +1,96 @@
+from django.contrib.auth.models import User
+from rest_framework.exceptions import ValidationError
+
+from .models import Post, Subreddit
+from .serializers import PostSummarySerializer, SubredditSummarySerializer, UserSummarySerializer
+from .sharding import sharded
+
+
+# Fields that can be expanded, with the model of the related object and its serializer.
+RELATIONS = {
+    'author': (User, UserSummarySerializer),
+    'owner': (User, UserSummarySerializer),
+    'subreddit': (Subreddit, SubredditSummarySerializer),
+    'post': (Post, PostSummarySerializer),
+}
+
+MAX_DEPTH = 2
+
+
+def parse_expand(value):
+    """
+    Parse `post.author,subreddit` into the tree {'post': {'author': {}}, 'subreddit': {}}.
+    """
+    tree = {}
+    for path in filter(None, value.split(',')):
+        names = path.strip().split('.')
+        if len(names) > MAX_DEPTH:
+            raise ValidationError({'expand': f'Relations can be expanded at most {MAX_DEPTH} levels deep.'})
+        node = tree
+        for name in names:
+            if name not in RELATIONS:
+                raise ValidationError({'expand': f'"{name}" can\'t be expanded.'})
+            node = node.setdefault(name, {})
+    return tree
+
+
+def loader_queryset(model):
+    if model is Post:
+        return sharded(Post.objects.filter(is_removed=False))
+    return model._default_manager.all()
+
+
+class Loader:
+    """
+    Request-scoped memo of related objects and their representations.
+    Objects missing from the memo are read with one query per model and batch.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.representations = {}
+
+    def load_many(self, model, pks):
+        loaded = self.objects.setdefault(model, {})
+        missing = [pk for pk in pks if pk not in loaded]
+        if missing:
+            found = loader_queryset(model).in_bulk(missing)
+            for pk in missing:
+                loaded[pk] = found.get(pk)
+        return {pk: loaded[pk] for pk in pks}
+
+    def represent(self, model, serializer_class, obj):
+        if obj is None:
+            return None
+        key = (model, obj.pk)
+        if key not in self.representations:
+            self.representations[key] = serializer_class(obj).data
+        return self.representations[key]
+
+
+def representations(data):
+    """
+    Return the object representations in response data: a single object, a list, a page
+    with `results`, or tagged `{'type': ..., 'data': ...}` items.
+    """
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        data = data['results']
+    items = data if isinstance(data, list) else [data]
+    return [item['data'] if isinstance(item.get('data'), dict) else item for item in items if isinstance(item, dict)]
+
+
+def expand(objs, tree, loader):
+    """
+    Replace the ids of the relations in `tree` by the related objects, in place. Every level
+    loads the related objects of all `objs` at once, so the number of queries depends on the
+    expanded relations, not on the number of objects.
+    """
+    for name, children in tree.items():
+        model, serializer_class = RELATIONS[name]
+        # Objects related to the same one share its representation, which is expanded once.
+        holders = list({id(obj): obj for obj in objs if isinstance(obj.get(name), int)}.values())
+        related = loader.load_many(model, {obj[name] for obj in holders})
+        for obj in holders:
+            obj[name] = loader.represent(model, serializer_class, related[obj[name]])
+        if children:
+            expand([obj[name] for obj in holders if obj[name] is not None], children, loader)
@@ -0,0 +1,55 @@
+import hashlib
+import math
+
+
+class HyperLogLog:
+    """
+    Fixed-size estimate of the number of distinct values added to it.
+
+    With the default precision the sketch is 4096 one-byte registers (4 KB) with a standard
+    error of about 1.6%. Sketches of the same precision are merged by taking the maximum of
+    each register, so the sketches of several processes combine into the one of their union.
+    """
+
+    def __init__(self, registers=None, precision=12):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is None:
+            self.registers = bytearray(self.size)
+        else:
+            if len(registers) != self.size:
+                raise ValueError(f'Expected {self.size} registers, got {len(registers)}.')
+            self.registers = bytearray(registers)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('Only sketches of the same precision can be merged.')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -register for register in self.registers)
+        if estimate <= 2.5 * self.size:
+            # Small cardinalities are estimated better from the number of empty registers.
+            zeros = self.registers.count(0)
+            if zeros:
+                estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data, precision=12):
+        if not data:
+            return cls(precision=precision)
+        return cls(data, precision=precision)
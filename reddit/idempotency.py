@@ -0,0 +1,115 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed.'
+    default_code = 'idempotency_key_in_use'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+class IdempotencyStore:
+    """
+    Store of the responses of requests sent with an `Idempotency-Key` header.
+
+    A repeated request with the same key and the same method, path and data gets the stored
+    response back without running the view again. While the first request is running, a short
+    lock makes duplicates wait for its response instead of running concurrently. Only successful
+    responses are stored, a request that failed runs again when it's retried.
+
+    Retries can reach any worker process, so the cache `alias` must be shared by all of them,
+    which the `reddit.E001` system check enforces.
+    """
+    max_key_length = 255
+
+    def __init__(self, alias='shared', timeout=86400, lock_timeout=30, wait_timeout=2.0, wait_interval=0.01):
+        self.alias = alias
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.wait_interval = wait_interval
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, user_pk, idempotency_key):
+        digest = hashlib.sha256(idempotency_key.encode()).hexdigest()
+        return f'idempotency:{user_pk}:{digest}'
+
+    def fingerprint(self, request):
+        data = request.data
+        if hasattr(data, 'lists'):
+            data = dict(data.lists())
+        payload = json.dumps([request.method, request.path, data], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def run(self, request, idempotency_key, handler):
+        """
+        Return the response of `handler()`, or the stored response of an earlier request with the same key.
+        """
+        if len(idempotency_key) > self.max_key_length:
+            raise ValidationError(f'Idempotency-Key must be at most {self.max_key_length} characters.')
+
+        key = self.key(request.user.pk, idempotency_key)
+        fingerprint = self.fingerprint(request)
+        entry = self.cache.get(key)
+        if entry is None:
+            if not self.acquire(key):
+                entry = self.wait(key)
+                if entry is None:
+                    raise IdempotencyKeyInUse()
+            else:
+                try:
+                    entry = self.cache.get(key)
+                    if entry is None:
+                        response = handler()
+                        if status.is_success(response.status_code):
+                            entry = (fingerprint, response.status_code, response.data, dict(response.headers))
+                            self.cache.set(key, entry, self.timeout)
+                        return response
+                finally:
+                    self.release(key)
+        return self.replay(entry, fingerprint)
+
+    def replay(self, entry, fingerprint):
+        stored_fingerprint, status_code, data, headers = entry
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyKeyReused()
+        response = Response(data, status=status_code, headers=headers)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    def acquire(self, key):
+        return self.cache.add(f'{key}:lock', True, self.lock_timeout)
+
+    def release(self, key):
+        self.cache.delete(f'{key}:lock')
+
+    def wait(self, key):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.wait_interval)
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry
+        return None
+
+
+idempotency_store = IdempotencyStore(
+    alias=getattr(settings, 'IDEMPOTENCY_CACHE_ALIAS', 'shared'),
+    timeout=getattr(settings, 'IDEMPOTENCY_TIMEOUT', 86400),
+)
@@ -0,0 +1,263 @@
+import csv
+import json
+import os
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .bulk import bulk_insert_raw
+from .models import Comment, Post, ShardSequence, Subreddit
+from .sharding import max_id, shard_for_subreddit, shards
+
+
+FORMATS = ['ndjson', 'csv']
+
+
+def read_records(path, fmt=None, start=0):
+    """
+    Yield `(position, record)` for each line of an NDJSON dump or row of a CSV dump, from
+    position `start` on. The format defaults to the file extension. Records are dicts, or
+    None for lines that can't be read.
+    """
+    fmt = fmt or ('csv' if str(path).endswith('.csv') else 'ndjson')
+    with open(path, newline='', encoding='utf-8') as file:
+        if fmt == 'csv':
+            rows = csv.DictReader(file)
+        else:
+            rows = file
+        for position, row in enumerate(rows, 1):
+            if position <= start:
+                continue
+            if fmt == 'csv':
+                yield position, {key: value if value != '' else None for key, value in row.items()}
+                continue
+            if not row.strip():
+                yield position, None
+                continue
+            try:
+                record = json.loads(row)
+            except ValueError:
+                record = None
+            yield position, record if isinstance(record, dict) else None
+
+
+def parse_timestamp(value):
+    """
+    Return an aware datetime from an ISO 8601 string or a Unix timestamp.
+    """
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace('.', '', 1).isdigit()):
+        return datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Invalid timestamp: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def parse_bool(value):
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 't', 'yes')
+    return bool(value)
+
+
+def id_map(queryset, field):
+    """
+    Return a dict of the values of `field` to primary keys, read once so rows are resolved in memory.
+    """
+    return dict(queryset.values_list(field, 'pk').iterator())
+
+
+class DumpImporter:
+    """
+    Load posts or comments from a dump, keeping the ids and timestamps of the dump.
+
+    Subreddits are referenced by name and authors by username, both resolved from in-memory
+    maps; unknown authors are imported without one. Rows are written per shard with raw
+    inserts, so no signals are sent and `auto_now` fields aren't touched. Rows referencing
+    unknown subreddits or posts, rows already in the database or earlier in the dump and
+    unreadable rows are skipped.
+
+    Id sequences are only moved past the imported ids at the end, and blocks of ids already
+    reserved by running processes can't be taken back, so the app must be stopped while importing.
+    """
+
+    def __init__(self, model, batch_size=5000):
+        self.model = model
+        self.batch_size = batch_size
+        self.users = id_map(User.objects.all(), 'username')
+        self.subreddits = id_map(Subreddit.objects.all(), 'name') if model is Post else {}
+        self.imported = 0
+        self.skipped = Counter()
+
+    def build(self, record):
+        """
+        Return an unsaved instance for the record, or None when it can't be imported.
+        """
+        if record is None:
+            self.skipped['invalid'] += 1
+            return None
+        try:
+            created_at = parse_timestamp(record['created_at'])
+            updated_at = parse_timestamp(record['updated_at']) if record.get('updated_at') else created_at
+            fields = {
+                'id': int(record['id']),
+                'author_id': self.users.get(record.get('author')),
+                'is_removed': parse_bool(record.get('is_removed', False)),
+                'is_locked': parse_bool(record.get('is_locked', False)),
+                'created_at': created_at,
+                'updated_at': updated_at,
+            }
+            if self.model is Post:
+                fields['subreddit_id'] = self.subreddits.get(record['subreddit'])
+                if fields['subreddit_id'] is None:
+                    self.skipped['unknown subreddit'] += 1
+                    return None
+                fields['title'] = record['title'][:Post._meta.get_field('title').max_length]
+                fields['text'] = record.get('text') or ''
+            else:
+                fields['post_id'] = int(record['post'])
+                fields['text'] = record['text']
+        except (KeyError, TypeError, ValueError):
+            self.skipped['invalid'] += 1
+            return None
+        return self.model(**fields)
+
+    def route(self, objs):
+        """
+        Group `objs` by the shard they belong to.
+        """
+        batches = {}
+        if self.model is Post:
+            for obj in objs:
+                batches.setdefault(shard_for_subreddit(obj.subreddit_id), []).append(obj)
+            return batches
+
+        post_pks = {obj.post_id for obj in objs}
+        post_shards = {}
+        for alias in shards():
+            for pk in Post.objects.using(alias).filter(pk__in=post_pks).values_list('pk', flat=True):
+                post_shards[pk] = alias
+        for obj in objs:
+            alias = post_shards.get(obj.post_id)
+            if alias is None:
+                self.skipped['unknown post'] += 1
+                continue
+            batches.setdefault(alias, []).append(obj)
+        return batches
+
+    def insert(self, objs):
+        # Only the first of the rows of a batch with the same id is imported, like rows already in the database.
+        unique = {}
+        for obj in objs:
+            unique.setdefault(obj.pk, obj)
+        self.skipped['duplicate'] += len(objs) - len(unique)
+        for alias, batch in self.route(list(unique.values())).items():
+            existing = set(
+                self.model._base_manager.using(alias)
+                .filter(pk__in=[obj.pk for obj in batch]).values_list('pk', flat=True)
+            )
+            batch = [obj for obj in batch if obj.pk not in existing]
+            self.skipped['existing'] += len(existing)
+            with transaction.atomic(using=alias):
+                bulk_insert_raw(self.model, batch, using=alias)
+            self.imported += len(batch)
+
+    def run(self, records, on_batch=None):
+        """
+        Import `records` from `read_records()` in batches. `on_batch(position)` is called after
+        each committed batch with the position of its last record.
+        """
+        objs = []
+        position = None
+        for position, record in records:
+            obj = self.build(record)
+            if obj is not None:
+                objs.append(obj)
+            if len(objs) >= self.batch_size:
+                self.insert(objs)
+                objs = []
+                if on_batch is not None:
+                    on_batch(position)
+        if objs:
+            self.insert(objs)
+        if position is not None and on_batch is not None:
+            on_batch(position)
+        self.reset_sequences()
+
+    def reset_sequences(self):
+        """
+        Move id sequences past the imported ids, so new rows don't collide with them.
+        """
+        for alias in shards():
+            connection = connections[alias]
+            statements = connection.ops.sequence_reset_sql(no_style(), [self.model])
+            if statements:
+                with connection.cursor() as cursor:
+                    for sql in statements:
+                        cursor.execute(sql)
+        ShardSequence.objects.filter(name=self.model._meta.label_lower).update(
+            next_value=Greatest('next_value', max_id(self.model) + 1)
+        )
+
+
+def drop_indexes(model, using):
+    """
+    Drop the `Meta.indexes` of `model` on the `using` database, so a large load doesn't update
+    them row by row. Returns the names of the dropped indexes.
+    """
+    connection = connections[using]
+    schema_editor = connection.schema_editor()
+    with connection.cursor() as cursor:
+        existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        dropped = [index for index in model._meta.indexes if index.name in existing]
+        for index in dropped:
+            cursor.execute(str(index.remove_sql(model, schema_editor)))
+    return [index.name for index in dropped]
+
+
+def create_indexes(model, using):
+    """
+    Create the `Meta.indexes` of `model` missing on the `using` database. Returns their names.
+    """
+    connection = connections[using]
+    schema_editor = connection.schema_editor()
+    with connection.cursor() as cursor:
+        existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        missing = [index for index in model._meta.indexes if index.name not in existing]
+        for index in missing:
+            cursor.execute(str(index.create_sql(model, schema_editor)))
+    return [index.name for index in missing]
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_checkpoint(path, checkpoint):
+    """
+    Replace the checkpoint file at once, so an interrupted write never leaves half of it behind.
+    """
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(f'{path}.tmp', path)
+
+
+def remove_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+IMPORT_MODELS = {
+    'posts': Post,
+    'comments': Comment,
+}
@@ -0,0 +1,38 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.test.utils import setup_test_environment
+
+
+@contextmanager
+def sandbox():
+    """
+    Run a benchmark against throwaway rows: everything written inside the block is rolled back.
+    Also sets up the test environment, so the test client can be used against the views.
+    """
+    setup_test_environment()
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def timings(func, repeat, setup=None):
+    """
+    Call `func` `repeat` times and return the wall times in milliseconds.
+    `setup` runs before every call and isn't timed.
+    """
+    results = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        results.append((time.perf_counter() - start) * 1000)
+    return results
+
+
+def summary(results):
+    results = sorted(results)
+    return f'median {statistics.median(results):8.3f} ms  p95 {results[int(len(results) * 0.95) - 1]:8.3f} ms'
@@ -0,0 +1,46 @@
+import random
+import string
+from datetime import timedelta
+
+from django.utils import timezone
+
+
+def make_text(length):
+    words = (''.join(random.choices(string.ascii_lowercase, k=random.randint(2, 9))) for _ in range(length))
+    return ' '.join(words)[:length]
+
+
+def make_posts(size):
+    """
+    Return `size` items shaped like a serialized page of posts.
+    """
+    now = timezone.now()
+    return [
+        {
+            'id': 100000 + i,
+            'title': make_text(60),
+            'text': make_text(400),
+            'subreddit': random.randint(1, 500),
+            'author': random.randint(1, 100000),
+            'created_at': now - timedelta(seconds=i * 37),
+            'updated_at': now - timedelta(seconds=i * 11),
+        }
+        for i in range(size)
+    ]
+
+
+def make_comments(size):
+    """
+    Return `size` items shaped like a serialized page of comments.
+    """
+    now = timezone.now()
+    return [
+        {
+            'id': 500000 + i,
+            'text': make_text(200),
+            'post': 100000,
+            'created_at': now - timedelta(seconds=i * 13),
+            'updated_at': now - timedelta(seconds=i * 5),
+        }
+        for i in range(size)
+    ]
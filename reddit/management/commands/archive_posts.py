@@ -0,0 +1,40 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reddit.archive import archive_batch
+from reddit.sharding import shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Move posts older than ARCHIVE_AFTER_DAYS, with their comments, into the archive tables. '
+        'Runs in batches, each committed on its own, so an interrupted run can be resumed by running it again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None, help='Age in days, defaults to ARCHIVE_AFTER_DAYS.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts archived per transaction.')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches per shard.')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches.')
+
+    def handle(self, *args, **options):
+        days = options['older_than'] if options['older_than'] is not None else getattr(settings, 'ARCHIVE_AFTER_DAYS', 180)
+        cutoff = timezone.now() - timedelta(days=days)
+
+        for alias in shards():
+            total_posts = total_comments = batches = 0
+            while options['max_batches'] is None or batches < options['max_batches']:
+                posts, comments = archive_batch(alias, cutoff, options['batch_size'])
+                if not posts:
+                    break
+                batches += 1
+                total_posts += posts
+                total_comments += comments
+                self.stdout.write(f'{alias}: batch {batches}, {posts} posts, {comments} comments')
+                if options['pause']:
+                    time.sleep(options['pause'])
+            self.stdout.write(f'{alias}: archived {total_posts} posts and {total_comments} comments')
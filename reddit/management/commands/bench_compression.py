@@ -0,0 +1,46 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from reddit.compression import available_codecs
+from reddit.middleware import CompressionMiddleware
+
+from ._sample_data import make_comments, make_posts
+
+
+class Command(BaseCommand):
+    help = 'Compare CPU time per response against bytes saved for each compression coding.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 25, 100, 1000], help='Page sizes to measure.')
+        parser.add_argument('--repeat', type=int, default=20, help='Rounds per measurement.')
+
+    def handle(self, *args, **options):
+        codecs = available_codecs()
+        middleware = CompressionMiddleware(lambda request: None)
+        renderer = JSONRenderer()
+
+        for kind, make_page in (('posts', make_posts), ('comments', make_comments)):
+            for size in options['sizes']:
+                content = renderer.render(make_page(size))
+                self.stdout.write(f'{kind}, {size} items, {len(content)} B')
+                for codec in codecs:
+                    compressed = codec.compress(content)
+                    streamed = b''.join(codec.compress_stream(self.chunks(content)))
+                    whole = self.measure(lambda: codec.compress(content), options['repeat'])
+                    stream = self.measure(lambda: b''.join(codec.compress_stream(self.chunks(content))), options['repeat'])
+                    middleware.compress(codec, content)
+                    cached = self.measure(lambda: middleware.compress(codec, content), options['repeat'])
+                    self.stdout.write(
+                        f'  {codec.encoding:<5} level {codec.level:>2}: {len(compressed):>8} B'
+                        f' ({1 - len(compressed) / len(content):6.1%} saved) {whole:8.3f} ms'
+                        f' | stream level {codec.stream_level}: {len(streamed):>8} B {stream:8.3f} ms'
+                        f' | cached hit {cached:8.3f} ms'
+                    )
+
+    def measure(self, func, repeat):
+        return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+    def chunks(self, content, size=4096):
+        return (content[i:i + size] for i in range(0, len(content), size))
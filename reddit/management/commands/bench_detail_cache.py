@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reddit.cache import object_cache
+from reddit.models import Comment, Post, Subreddit
+
+from ._bench import sandbox, summary, timings
+
+
+class Command(BaseCommand):
+    help = 'Compare cold and warm latency of the cached detail endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help='Requests per measurement.')
+
+    def handle(self, *args, **options):
+        with sandbox():
+            user = User.objects.create_user('bench-detail-cache')
+            subreddit = Subreddit.objects.create(name='bench-detail-cache', description='Description', owner=user)
+            subreddit.moderator.add(user)
+            post = Post.objects.create(title='Post title', text='Post text', subreddit=subreddit, author=user)
+            comment = Comment.objects.create(text='Comment text', post=post, author=user)
+            client = APIClient()
+
+            for name, obj in (('subreddit_detail', subreddit), ('post_detail', post), ('comment_detail', comment)):
+                url = reverse(name, kwargs={'pk': obj.pk})
+                get = lambda: client.get(url, format='json')
+                cold = timings(get, options['repeat'], setup=lambda: object_cache.delete(type(obj), obj.pk))
+                warm = timings(get, options['repeat'])
+                self.stdout.write(f'{name}')
+                self.stdout.write(f'  cold  {summary(cold)}')
+                self.stdout.write(f'  warm  {summary(warm)}')
@@ -0,0 +1,41 @@
+import json
+import timeit
+
+import cbor2
+import msgpack
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from reddit.renderers import CBORRenderer, MessagePackRenderer
+
+from ._sample_data import make_comments, make_posts
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and encode/decode time of JSON, MessagePack and CBOR on list pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[25, 100, 1000], help='Page sizes to measure.')
+        parser.add_argument('--repeat', type=int, default=50, help='Encode/decode rounds per measurement.')
+
+    def handle(self, *args, **options):
+        codecs = [
+            ('json', JSONRenderer(), json.loads),
+            ('msgpack', MessagePackRenderer(), lambda content: msgpack.unpackb(content, timestamp=3)),
+            ('cbor', CBORRenderer(), cbor2.loads),
+        ]
+
+        for kind, make_page in (('posts', make_posts), ('comments', make_comments)):
+            for size in options['sizes']:
+                page = make_page(size)
+                self.stdout.write(f'{kind}, {size} items')
+                baseline = None
+                for name, renderer, loads in codecs:
+                    content = renderer.render(page)
+                    encode = min(timeit.repeat(lambda: renderer.render(page), number=1, repeat=options['repeat']))
+                    decode = min(timeit.repeat(lambda: loads(content), number=1, repeat=options['repeat']))
+                    baseline = baseline or len(content)
+                    self.stdout.write(
+                        f'  {name:<8} {len(content):>9} B ({len(content) / baseline:6.1%})'
+                        f'  encode {encode * 1000:8.3f} ms  decode {decode * 1000:8.3f} ms'
+                    )
@@ -0,0 +1,55 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reddit.models import Post, SimHashBucket, Subreddit
+from reddit.spam import buckets, simhash, spam_detector, to_signed
+
+from ._bench import sandbox, summary, timings
+from ._sample_data import make_text
+
+
+class Command(BaseCommand):
+    help = 'Measure the cost of near-duplicate detection per comment POST, against a window of recent fingerprints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=300, help='Requests per measurement.')
+        parser.add_argument('--recent', type=int, default=20000, help='Fingerprints of recent content in the window.')
+
+    def handle(self, *args, **options):
+        with sandbox():
+            user = User.objects.create_user('bench-spam')
+            subreddit = Subreddit.objects.create(name='bench-spam', description='Description', owner=user)
+            post = Post.objects.create(title='Post', text='Post text', subreddit=subreddit, author=user)
+
+            count = spam_detector.max_distance + 1
+            SimHashBucket.objects.bulk_create([
+                SimHashBucket(bucket=bucket, simhash=to_signed(value), kind='comment', object_id=i, author=user)
+                for i, value in enumerate(random.getrandbits(64) for _ in range(options['recent']))
+                for bucket in buckets(value, count)
+            ], batch_size=5000)
+
+            client = APIClient()
+            client.force_authenticate(user)
+            url = reverse('post_comments', kwargs={'pk': post.pk})
+            texts = [make_text(random.randint(100, 500)) for _ in range(options['repeat'] * 2)]
+            requests = iter(texts)
+            create = lambda: client.post(url, data={'text': next(requests)}, format='json')
+
+            spam_detector.enabled = False
+            try:
+                unchecked = timings(create, options['repeat'])
+            finally:
+                spam_detector.enabled = True
+            checked = timings(create, options['repeat'])
+            hashing = timings(lambda: simhash(random.choice(texts)), options['repeat'])
+            lookups = timings(lambda: spam_detector.find(random.choice(texts)), options['repeat'])
+
+            self.stdout.write(f'post_comments POST ({options["recent"]} recent fingerprints, {count} buckets each)')
+            self.stdout.write(f'  unchecked  {summary(unchecked)}')
+            self.stdout.write(f'  checked    {summary(checked)}')
+            self.stdout.write(f'simhash      {summary(hashing)}')
+            self.stdout.write(f'lookup       {summary(lookups)}')
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reddit.models import Post, Subreddit
+from reddit.viewcounts import view_counter
+
+from ._bench import sandbox, summary, timings
+
+
+class Command(BaseCommand):
+    help = 'Measure the overhead of view tracking on post detail requests and the cost of a flush.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500, help='Requests per measurement.')
+        parser.add_argument('--posts', type=int, default=100, help='Number of viewed posts.')
+
+    def handle(self, *args, **options):
+        with sandbox():
+            user = User.objects.create_user('bench-view-counts')
+            subreddit = Subreddit.objects.create(name='bench-view-counts', description='Description', owner=user)
+            posts = [
+                Post.objects.create(title=f'Post {i}', text='Post text', subreddit=subreddit, author=user)
+                for i in range(options['posts'])
+            ]
+            urls = [reverse('post_detail', kwargs={'pk': post.pk}) for post in posts]
+            client = APIClient()
+            for url in urls:
+                client.get(url, format='json')
+
+            requests = iter(range(options['repeat'] * 2))
+            get = lambda: client.get(urls[next(requests) % len(urls)], format='json')
+
+            flush_interval = view_counter.flush_interval
+            view_counter.flush_interval = float('inf')
+            try:
+                view_counter.enabled = False
+                untracked = timings(get, options['repeat'])
+                view_counter.enabled = True
+                tracked = timings(get, options['repeat'])
+            finally:
+                view_counter.flush_interval = flush_interval
+
+            start = time.perf_counter()
+            flushed = view_counter.flush()
+            flush_time = (time.perf_counter() - start) * 1000
+
+            self.stdout.write('post_detail')
+            self.stdout.write(f'  untracked  {summary(untracked)}')
+            self.stdout.write(f'  tracked    {summary(tracked)}')
+            self.stdout.write(f'flush of {flushed} posts ({options["repeat"]} views)  {flush_time:8.3f} ms')
@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reddit.importer import (
+    FORMATS, IMPORT_MODELS, DumpImporter, create_indexes, drop_indexes, read_checkpoint, read_records,
+    remove_checkpoint, write_checkpoint
+)
+from reddit.sharding import shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import posts or comments from an NDJSON or CSV dump, keeping their ids and timestamps. '
+        'Posts reference subreddits by name, comments reference posts by id, authors are usernames. '
+        'Progress is checkpointed after every batch, so an interrupted import resumes when run again. '
+        'The checkpoint is removed once the import completes. '
+        'Stop the app while importing: ids it allocates could collide with the imported ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORT_MODELS), help='What the dump holds.')
+        parser.add_argument('path', help='Path of the dump file.')
+        parser.add_argument('--format', choices=FORMATS, help='Format of the dump, defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per transaction.')
+        parser.add_argument('--checkpoint', help='Path of the checkpoint file, defaults to <path>.checkpoint.')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint.')
+        parser.add_argument(
+            '--defer-indexes', action='store_true',
+            help='Drop secondary indexes during the import and create them once it is done.'
+        )
+
+    def handle(self, *args, **options):
+        model = IMPORT_MODELS[options['kind']]
+        checkpoint_path = options['checkpoint'] or f'{options["path"]}.checkpoint'
+        checkpoint = None if options['restart'] else read_checkpoint(checkpoint_path)
+        if checkpoint is not None and checkpoint['kind'] != options['kind']:
+            raise CommandError(f'{checkpoint_path} is a checkpoint of an import of {checkpoint["kind"]}.')
+        start = checkpoint['position'] if checkpoint is not None else 0
+        if start:
+            self.stdout.write(f'Resuming after record {start}')
+
+        try:
+            records = read_records(options['path'], options['format'], start)
+            importer = DumpImporter(model, batch_size=options['batch_size'])
+            if options['defer_indexes']:
+                for alias in shards():
+                    dropped = drop_indexes(model, alias)
+                    if dropped:
+                        self.stdout.write(f'{alias}: dropped {", ".join(dropped)}')
+
+            started = time.perf_counter()
+
+            def on_batch(position):
+                write_checkpoint(checkpoint_path, {'kind': options['kind'], 'position': position})
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{position} records read, {importer.imported} {options["kind"]} imported '
+                    f'({importer.imported / elapsed if elapsed else 0:.0f} rows/s)'
+                )
+
+            importer.run(records, on_batch=on_batch)
+            elapsed = time.perf_counter() - started
+        except OSError as e:
+            raise CommandError(e)
+
+        # Also restores indexes left dropped by an interrupted import.
+        for alias in shards():
+            index_started = time.perf_counter()
+            created = create_indexes(model, alias)
+            if created:
+                self.stdout.write(
+                    f'{alias}: created {", ".join(created)} in {time.perf_counter() - index_started:.1f}s'
+                )
+
+        remove_checkpoint(checkpoint_path)
+        skipped = ', '.join(f'{count} {reason}' for reason, count in sorted(importer.skipped.items()))
+        self.stdout.write(
+            f'Imported {importer.imported} {options["kind"]} in {elapsed:.1f}s '
+            f'({importer.imported / elapsed if elapsed else 0:.0f} rows/s), skipped: {skipped or "none"}'
+        )
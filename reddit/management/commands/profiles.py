@@ -0,0 +1,57 @@
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reddit.profiling import FORMATS, profile_route, read_profile, write_collapsed, write_speedscope
+
+
+class Command(BaseCommand):
+    help = (
+        'List the request profiles in PROFILING_DIR, or merge the profiles of a route '
+        '(or of all routes) into one aggregate flame graph.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help='Profile directory, defaults to PROFILING_DIR.')
+        parser.add_argument('--merge', action='store_true', help='Merge profiles instead of listing them.')
+        parser.add_argument('--route', help='Only use the profiles of this route.')
+        parser.add_argument('--output', help='File to write the merged profile to, defaults to stdout.')
+        parser.add_argument('--format', choices=FORMATS, default='collapsed', help='Format of the merged profile.')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or getattr(settings, 'PROFILING_DIR', 'profiles')
+        if not os.path.isdir(directory):
+            raise CommandError(f'No profiles in {directory}.')
+
+        profiles = defaultdict(list)
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(tuple(FORMATS.values())):
+                profiles[profile_route(filename)].append(os.path.join(directory, filename))
+        if options['route'] is not None:
+            profiles = {options['route']: profiles.get(options['route'], [])}
+
+        if not options['merge']:
+            for route, paths in sorted(profiles.items()):
+                samples = sum(sum(read_profile(path).values()) for path in paths)
+                self.stdout.write(f'{route:<32}{len(paths):6} profiles {samples:9} samples')
+            return
+
+        stacks = Counter()
+        for paths in profiles.values():
+            for path in paths:
+                stacks.update(read_profile(path))
+        if not stacks:
+            raise CommandError('No profiles to merge.')
+
+        name = options['route'] or 'all routes'
+        if options['output'] is None:
+            if options['format'] != 'collapsed':
+                raise CommandError('--output is required for the speedscope format.')
+            for stack, count in stacks.most_common():
+                self.stdout.write(f'{stack} {count}')
+        elif options['format'] == 'speedscope':
+            write_speedscope(stacks, options['output'], name)
+        else:
+            write_collapsed(stacks, options['output'])
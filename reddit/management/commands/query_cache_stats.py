@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from reddit.querycache import query_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Report hits and misses of the query cache per model, counted by all processes sharing '
+        'QUERY_CACHE_ALIAS. Processes add their counts every few lookups and at exit.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after reporting them.')
+
+    def handle(self, *args, **options):
+        for label, (hits, misses) in sorted(query_cache.stats().items()):
+            lookups = hits + misses
+            rate = hits / lookups if lookups else 0
+            self.stdout.write(f'{label:<24}{hits:10} hits {misses:10} misses {rate:8.1%} hit rate')
+        if options['reset']:
+            query_cache.reset_stats()
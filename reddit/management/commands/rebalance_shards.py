@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reddit.models import Subreddit
+from reddit.sharding import move_subreddit, placement, shard_for_subreddit, shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Move subreddits with their posts and comments between shards. Without --subreddit, every '
+        'subreddit is moved to its hash placement over the current SHARD_DATABASES.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subreddit', type=int, help='Pk of a single subreddit to move.')
+        parser.add_argument('--to', dest='target', help='Target shard alias for --subreddit.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows copied per query.')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the planned moves.')
+
+    def handle(self, *args, **options):
+        if options['subreddit'] is not None:
+            if options['target'] is None:
+                raise CommandError('--to is required with --subreddit.')
+            subreddit = Subreddit.objects.filter(pk=options['subreddit']).first()
+            if subreddit is None:
+                raise CommandError(f'Subreddit {options["subreddit"]} does not exist.')
+            plan = [(subreddit, options['target'])]
+        else:
+            plan = [(subreddit, placement(subreddit.name)) for subreddit in Subreddit.objects.order_by('pk')]
+
+        for subreddit, target in plan:
+            if target not in shards():
+                raise CommandError(f'"{target}" is not in SHARD_DATABASES.')
+            source = shard_for_subreddit(subreddit.pk)
+            if source == target:
+                continue
+
+            self.stdout.write(f'{subreddit.name} ({subreddit.pk}): {source} -> {target}')
+            if options['dry_run']:
+                continue
+            moved = move_subreddit(subreddit, target, batch_size=options['batch_size'])
+            self.stdout.write('  ' + ', '.join(f'{count} {label}' for label, count in moved.items()))
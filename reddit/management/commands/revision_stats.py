@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from reddit.models import Comment, Post
+from reddit.revisions import storage_overhead
+from reddit.sharding import shards
+
+
+class Command(BaseCommand):
+    help = 'Report the storage used by the edit history, compared to storing every revision in full.'
+
+    def handle(self, *args, **options):
+        for model in (Post, Comment):
+            totals = [0, 0, 0, 0]
+            for alias in shards():
+                for i, value in enumerate(storage_overhead(model, alias)):
+                    totals[i] += value
+            count, snapshots, stored, full = totals
+            ratio = stored / full if full else 0
+            self.stdout.write(
+                f'{str(model._meta.verbose_name_plural):<10}{count:8} revisions {snapshots:6} snapshots '
+                f'{stored:10} bytes stored {full:10} bytes as full copies ({ratio:.0%})'
+            )
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reddit.activity import activity_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Compact minute and hour activity rollups past ACTIVITY_RETENTION into hour and day rollups, '
+        'meant to be run periodically, e.g. every ten minutes from cron. '
+        'With --rebuild, recount all rollups from the posts and comments first, e.g. after import_dump; '
+        'content created or deleted while rebuilding may be counted twice.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recount all rollups from posts and comments.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            started = time.perf_counter()
+            counted = activity_rollups.rebuild()
+            self.stdout.write(f'Counted {counted} posts and comments in {time.perf_counter() - started:.1f}s')
+        compacted = activity_rollups.compact()
+        self.stdout.write(f'Compacted {compacted} rollups')
@@ -0,0 +1,98 @@
+import os
+import random
+import signal
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer
+
+from reddit.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve the project with a pool of forked worker processes, to measure the warm-up and '
+        'compare warm workers against runserver. The application is loaded and warmed up once in '
+        'the master process, so workers start with the URL resolver, serializer fields and database '
+        'backends ready and share that memory copy-on-write. Workers run Django\'s development '
+        'server, one request at a time without timeouts: this is a benchmark harness, not a '
+        'production server. In production, use gunicorn with reddit_project/gunicorn_conf.py, '
+        'which runs the same warm-up.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('addrport', nargs='?', default='127.0.0.1:8000', help='Address and port to listen on.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes.')
+        parser.add_argument('--warmup-only', action='store_true', help='Only print the startup profile and exit.')
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork') and not options['warmup_only']:
+            raise CommandError('serve needs a platform with os.fork(), use runserver instead.')
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1.')
+        host, _, port = options['addrport'].rpartition(':')
+        if not port.isdigit():
+            raise CommandError(f'"{options["addrport"]}" is not a valid address and port.')
+
+        start = time.perf_counter()
+        application, profile = warm_up()
+        self.stdout.write('Startup profile:')
+        for phase, seconds in profile:
+            self.stdout.write(f'  {phase:<14}{seconds * 1000:9.1f} ms')
+        self.stdout.write(f'  {"total":<14}{(time.perf_counter() - start) * 1000:9.1f} ms')
+        if options['warmup_only']:
+            return
+
+        server = WSGIServer((host or '127.0.0.1', int(port)), WSGIRequestHandler)
+        server.set_app(application)
+        self.stdout.write(f'Listening on http://{options["addrport"]}/ with {options["workers"]} workers')
+        self.stdout.write('Workers run the development server, don\'t use this in production.')
+        self.stdout.flush()
+        self.run_master(server, options['workers'])
+
+    def run_master(self, server, count):
+        """
+        Keep `count` workers serving from the shared listening socket, replacing the ones that die,
+        until the master is interrupted or terminated.
+        """
+        workers = set()
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+            for pid in workers:
+                os.kill(pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        while True:
+            while not stopping and len(workers) < count:
+                workers.add(self.spawn_worker(server))
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            workers.discard(pid)
+            if not stopping:
+                self.stderr.write(f'Worker {pid} exited with status {status}, restarting')
+        server.server_close()
+
+    def spawn_worker(self, server):
+        pid = os.fork()
+        if pid:
+            return pid
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        random.seed()
+        try:
+            server.serve_forever()
+        finally:
+            # Never return into the master loop. Unlike os._exit(), this runs the atexit
+            # handlers, e.g. to flush buffered view counts.
+            sys.exit(0)
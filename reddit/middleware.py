@@ -0,0 +1,138 @@
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .compression import available_codecs, negotiate
+from .profiling import StackSampler, write_profile
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with the best coding the client accepts: brotli or zstd when the
+    libraries are installed, gzip otherwise.
+
+    Bodies shorter than `COMPRESSION_MIN_LENGTH` are sent as is. Streaming responses are
+    compressed chunk by chunk at a fast level. Compressed bodies of public responses of at
+    least `COMPRESSION_CACHE_MIN_LENGTH` are cached by a digest of the uncompressed content,
+    so a repeated response is hashed instead of recompressed. Responses to requests with
+    credentials are per user, and compressed without caching so they don't evict reusable entries.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.codecs = available_codecs()
+        self.min_length = getattr(settings, 'COMPRESSION_MIN_LENGTH', 1024)
+        self.cache_min_length = getattr(settings, 'COMPRESSION_CACHE_MIN_LENGTH', 4096)
+        self.cache_timeout = getattr(settings, 'COMPRESSION_CACHE_TIMEOUT', 300)
+        self.cache = caches[getattr(settings, 'COMPRESSION_CACHE_ALIAS', 'default')]
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        codec = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.codecs)
+        if codec is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = codec.compress_stream(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if self.cacheable(request, response):
+                compressed_content = self.compress(codec, response.content)
+            else:
+                compressed_content = codec.compress(response.content)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codec.encoding
+
+        return response
+
+    def cacheable(self, request, response):
+        """
+        Return whether the body is large and the same for any client, so worth caching compressed.
+        """
+        if len(response.content) < self.cache_min_length or request.method not in ('GET', 'HEAD'):
+            return False
+        if 'HTTP_AUTHORIZATION' in request.META or settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return False
+        cache_control = response.get('Cache-Control', '')
+        return 'private' not in cache_control and 'no-store' not in cache_control
+
+    def compress(self, codec, content):
+        digest = hashlib.blake2b(content, digest_size=20).hexdigest()
+        key = f'compressed:{codec.encoding}:{digest}'
+        compressed_content = self.cache.get(key)
+        if compressed_content is None:
+            compressed_content = codec.compress(content)
+            self.cache.set(key, compressed_content, self.cache_timeout)
+        return compressed_content
+
+
+class ProfilingMiddleware:
+    """
+    Profile single requests with a stack sampler and write the result to `PROFILING_DIR`,
+    one file per request named after its route.
+
+    Staff users trigger a profile with the `X-Profile` header or the `profile` query parameter.
+    Such requests are authenticated with the API's authentication classes before the sampler
+    starts, so requests of other users run unprofiled, at no sampling cost.
+    `PROFILING_SAMPLE_RATE` additionally profiles that fraction of all requests.
+    """
+    header = 'HTTP_X_PROFILE'
+    query_param = 'profile'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.directory = getattr(settings, 'PROFILING_DIR', 'profiles')
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.interval = getattr(settings, 'PROFILING_INTERVAL', 0.005)
+        self.format = getattr(settings, 'PROFILING_FORMAT', 'collapsed')
+
+    def __call__(self, request):
+        requested = bool(request.META.get(self.header) or request.GET.get(self.query_param))
+        requested = requested and self.is_staff(request)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not requested and not sampled:
+            return self.get_response(request)
+
+        sampler = StackSampler(self.interval).start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unresolved'
+        filename = write_profile(stacks, self.directory, route, self.format)
+        if requested:
+            response.headers['X-Profile'] = filename
+        return response
+
+    def is_staff(self, request):
+        """
+        Authenticate the request as the API views do, which only happens inside the view otherwise.
+        """
+        api_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            return api_request.user.is_staff
+        except APIException:
+            return False
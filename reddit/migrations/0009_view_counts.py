@@ -0,0 +1,31 @@
+# Generated by Django 4.1.3 on 2026-10-19 13:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0008_created_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewers',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='reddit.post')),
+                ('sketch', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='unique_viewers',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='view_count',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.3 on 2026-10-19 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0010_revisions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['subreddit', '-created_at', '-id'], name='post_subreddit_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subreddit',
+            index=models.Index(fields=['-created_at'], name='subreddit_created_idx'),
+        ),
+    ]
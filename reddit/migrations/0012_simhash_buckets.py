@@ -0,0 +1,40 @@
+# Generated by Django 4.1.3 on 2026-10-19 13:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reddit', '0011_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimHashBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveBigIntegerField()),
+                ('simhash', models.BigIntegerField()),
+                ('kind', models.CharField(max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='simhashbucket',
+            index=models.Index(fields=['bucket', 'created_at'], name='simhashbucket_bucket_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='simhashbucket',
+            index=models.Index(fields=['kind', 'object_id'], name='simhashbucket_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='simhashbucket',
+            index=models.Index(fields=['created_at'], name='simhashbucket_created_idx'),
+        ),
+    ]
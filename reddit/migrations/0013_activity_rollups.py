@@ -0,0 +1,34 @@
+# Generated by Django 4.1.3 on 2026-10-19 13:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0012_simhash_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(max_length=8)),
+                ('start', models.DateTimeField()),
+                ('posts', models.IntegerField(default=0)),
+                ('comments', models.IntegerField(default=0)),
+                ('authors', models.BinaryField()),
+                ('subreddit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reddit.subreddit')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='activityrollup',
+            index=models.Index(fields=['granularity', 'start'], name='activityrollup_compact_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='activityrollup',
+            constraint=models.UniqueConstraint(fields=('subreddit', 'start', 'granularity'), name='unique_activity_rollup'),
+        ),
+    ]
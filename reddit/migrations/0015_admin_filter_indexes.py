@@ -0,0 +1,29 @@
+# Generated by Django 4.1.3 on 2026-10-19 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reddit', '0014_notifications'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_removed', True)), fields=['-created_at', '-id'], name='comment_removed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_locked', True)), fields=['-created_at', '-id'], name='comment_locked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_removed', True)), fields=['-created_at', '-id'], name='post_removed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_locked', True)), fields=['-created_at', '-id'], name='post_locked_idx'),
+        ),
+    ]
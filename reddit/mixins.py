@@ -0,0 +1,220 @@
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from . import archive, revisions
+from .cache import object_cache
+from .expansion import Loader, expand, parse_expand, representations
+from .idempotency import idempotency_store
+from .sharding import locate
+
+
+class StreamingListMixin:
+    """
+    Stream unpaginated list responses when the accepted renderer supports it.
+    Rows are serialized and encoded one by one while the response is written,
+    so large lists never exist as a single serialized structure in memory.
+    Paginations with a `paginates(request)` method leave other requests unpaginated.
+    """
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        paginated = self.paginator is not None and getattr(self.paginator, 'paginates', lambda request: True)(request)
+        if not hasattr(renderer, 'render_stream') or paginated or getattr(self, 'expand', None):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if renderer.stream_requires_length or not hasattr(queryset, 'iterator'):
+            rows = list(queryset)
+            length = len(rows)
+        else:
+            rows = queryset.iterator(chunk_size=self.stream_chunk_size)
+            length = None
+
+        serializer = self.get_serializer()
+        items = (serializer.to_representation(row) for row in rows)
+        response = StreamingHttpResponse(renderer.render_stream(items, length), content_type=renderer.media_type)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class MergedStreamListMixin:
+    """
+    List several querysets as one stream, paginated with `MergedCursorPagination`.
+
+    Views provide `get_streams()` and a serializer per kind of stream in `stream_serializers`.
+    Stream names are either a kind or `kind@shard`, for the per-shard parts of one kind.
+    Items are returned as `{'type': kind, 'data': ...}` unless `tag_results` is disabled.
+    """
+    stream_serializers = {}
+    tag_results = True
+
+    def get_streams(self):
+        raise NotImplementedError('.get_streams() must be overridden.')
+
+    def list(self, request, *args, **kwargs):
+        page = [
+            (stream.partition('@')[0], obj)
+            for stream, obj in self.paginator.paginate_streams(self.get_streams(), request)
+        ]
+
+        serialized = {}
+        for kind, serializer_class in self.stream_serializers.items():
+            objs = [obj for obj_kind, obj in page if obj_kind == kind]
+            serialized[kind] = iter(serializer_class(objs, many=True, context=self.get_serializer_context()).data)
+
+        if self.tag_results:
+            results = [{'type': kind, 'data': next(serialized[kind])} for kind, obj in page]
+        else:
+            results = [next(serialized[kind]) for kind, obj in page]
+        return self.paginator.get_paginated_response(results)
+
+
+class CachedRetrieveMixin:
+    """
+    Serve GET requests from the per-object cache; update and destroy write through to it.
+
+    Object permissions aren't checked on cached reads, which is only correct for
+    permission classes that allow safe methods on every object. Fields listed in
+    `cached_counters` are served from the counters cached apart from the object.
+    """
+    cached_counters = ()
+
+    def retrieve(self, request, *args, **kwargs):
+        model = self.get_queryset().model
+        data = object_cache.get(model, self.kwargs['pk'], lambda: self.get_serializer(self.get_object()).data)
+        if self.cached_counters:
+            data = object_cache.with_counters(model, self.kwargs['pk'], data, self.cached_counters)
+        return Response(data)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        object_cache.set(type(serializer.instance), serializer.instance.pk, serializer.data)
+
+    def perform_destroy(self, instance):
+        model, pk = type(instance), instance.pk
+        super().perform_destroy(instance)
+        object_cache.delete(model, pk)
+
+
+class RevisionMixin:
+    """
+    Record a revision of the tracked fields with every update, in the transaction of the update.
+    """
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        model, alias = type(instance), instance._state.db
+        with transaction.atomic(using=alias):
+            # Diff against the locked row, not the loaded instance: a concurrent edit may have changed it since.
+            locked = model._base_manager.using(alias).select_for_update().filter(pk=instance.pk)
+            old = next(iter(locked.values(*revisions.TRACKED_FIELDS[model])), None)
+            if old is None:
+                raise Http404
+            super().perform_update(serializer)
+            revisions.record(serializer.instance, old, editor=self.request.user)
+
+
+class LocatedObjectMixin:
+    """
+    Look the object up on the shard that holds it.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset.using(locate(queryset.model, self.kwargs['pk']))
+
+
+class ArchiveFallbackMixin:
+    """
+    Serve objects missing from the hot tables from the archive. Archived objects are read-only.
+    """
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            obj = archive.load(self.get_queryset().model, self.kwargs['pk'])
+            if obj is None or obj.is_removed:
+                raise
+            if self.request.method not in SAFE_METHODS:
+                raise PermissionDenied('This content is archived and can no longer be changed.')
+            self.check_object_permissions(self.request, obj)
+            return obj
+
+
+class IdempotentCreateMixin:
+    """
+    Answer POST requests repeated with the same `Idempotency-Key` header with the stored
+    response of the first one, so retried creates don't write twice.
+    """
+
+    def post(self, request, *args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        handler = super().post
+        if idempotency_key is None:
+            return handler(request, *args, **kwargs)
+        return idempotency_store.run(request, idempotency_key, lambda: handler(request, *args, **kwargs))
+
+
+class CachedQueryMixin:
+    """
+    Read the results of the view's queryset from the query cache; the model must use `CachedManager`.
+    """
+    query_cache_timeout = None
+
+    def get_queryset(self):
+        return super().get_queryset().cached(self.query_cache_timeout)
+
+
+class MultiGetMixin:
+    """
+    Answer list requests with `?ids=1,2,3` with just those objects, in the requested order,
+    read with one IN query (per shard) instead of one detail request per object.
+    Missing ids are left out.
+    """
+    multi_get_param = 'ids'
+    multi_get_max = 100
+
+    def list(self, request, *args, **kwargs):
+        if self.multi_get_param not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        ids = self.get_multi_get_ids()
+        objs = self.filter_queryset(self.get_queryset()).in_bulk(ids)
+        serializer = self.get_serializer([objs[pk] for pk in ids if pk in objs], many=True)
+        return Response(serializer.data)
+
+    def get_multi_get_ids(self):
+        raw = self.request.query_params[self.multi_get_param]
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in raw.split(',') if pk))
+        except ValueError:
+            ids = None
+        if not ids or len(ids) > self.multi_get_max:
+            raise ValidationError({
+                self.multi_get_param: f'Expected a comma-separated list of at most {self.multi_get_max} ids.'
+            })
+        return ids
+
+
+class ExpandMixin:
+    """
+    Inline related objects named in `?expand=author,post.subreddit` in place of their ids.
+    Related objects are loaded per relation for the whole response, not per row.
+    """
+    expand_param = 'expand'
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.expand = parse_expand(request.query_params.get(self.expand_param, ''))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if getattr(self, 'expand', None) and isinstance(response, Response) and status.is_success(response.status_code):
+            expand(representations(response.data), self.expand, Loader())
+        return super().finalize_response(request, response, *args, **kwargs)
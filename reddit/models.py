@@ -1,17 +1,26 @@
 from django.contrib.auth.models import User
 from django.db import models
 
+from .querycache import CachedManager
+from .sharding import ShardedManager
+
 
 class Subreddit(models.Model):
     name = models.CharField(max_length=256, unique=True, blank=False, null=False)
     description = models.TextField(max_length=512, blank=True, null=True)
     owner = models.ForeignKey(User, related_name='owns_subreddit', on_delete=models.SET_NULL, blank=False, null=True)
     moderator = models.ManyToManyField(User, related_name='moderates_subreddit')
+    shard = models.CharField(max_length=64, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CachedManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='subreddit_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -20,13 +29,33 @@ class Subreddit(models.Model):
 class Post(models.Model):
     title = models.CharField(max_length=256, blank=False, null=False)
     text = models.TextField(max_length=512, blank=True, null=True)
-    subreddit = models.ForeignKey(Subreddit, on_delete=models.CASCADE)
-    author = models.ForeignKey(User, on_delete=models.SET_NULL, blank=False, null=True)
+    subreddit = models.ForeignKey(Subreddit, on_delete=models.CASCADE, db_constraint=False)
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, blank=False, null=True, db_constraint=False)
+    is_removed = models.BooleanField(default=False)
+    is_locked = models.BooleanField(default=False)
+    report_count = models.PositiveIntegerField(default=0)
+    view_count = models.PositiveBigIntegerField(default=0)
+    unique_viewers = models.PositiveBigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            models.Index(fields=['subreddit', '-created_at', '-id'], name='post_subreddit_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(
+                fields=['subreddit', '-created_at', '-id'],
+                condition=models.Q(report_count__gt=0, is_removed=False),
+                name='post_modqueue_idx'
+            ),
+            # Removed and locked posts are rare, for the admin's filters.
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_removed=True), name='post_removed_idx'),
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_locked=True), name='post_locked_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -35,12 +64,240 @@ class Post(models.Model):
 class Comment(models.Model):
     text = models.TextField(max_length=512, blank=False, null=False)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
-    author = models.ForeignKey(User, on_delete=models.SET_NULL, blank=False, null=True)
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, blank=False, null=True, db_constraint=False)
+    is_removed = models.BooleanField(default=False)
+    is_locked = models.BooleanField(default=False)
+    report_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='comment_created_idx'),
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='comment_author_created_idx'),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(report_count__gt=0, is_removed=False),
+                name='comment_modqueue_idx'
+            ),
+            # Removed and locked comments are rare, for the admin's filters.
+            models.Index(
+                fields=['-created_at', '-id'], condition=models.Q(is_removed=True), name='comment_removed_idx'
+            ),
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_locked=True), name='comment_locked_idx'),
+        ]
 
     def __str__(self):
         return self.text
+
+
+class Report(models.Model):
+    reporter = models.ForeignKey(User, related_name='reports', on_delete=models.CASCADE, db_constraint=False)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, blank=True, null=True)
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, blank=True, null=True)
+    reason = models.CharField(max_length=256, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ShardedManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['reporter', 'post'], name='unique_post_report'),
+            models.UniqueConstraint(fields=['reporter', 'comment'], name='unique_comment_report'),
+            models.CheckConstraint(
+                check=models.Q(post__isnull=False, comment__isnull=True) | models.Q(post__isnull=True, comment__isnull=False),
+                name='report_single_target'
+            ),
+        ]
+
+    def __str__(self):
+        return self.reason
+
+
+class Revision(models.Model):
+    """
+    One version of the title and text of a post, or the text of a comment.
+    Snapshots store the full version, other revisions the changes to the previous one.
+    """
+    post = models.ForeignKey(Post, related_name='revisions', on_delete=models.CASCADE, blank=True, null=True)
+    comment = models.ForeignKey(Comment, related_name='revisions', on_delete=models.CASCADE, blank=True, null=True)
+    number = models.PositiveIntegerField()
+    editor = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, null=True, db_constraint=False)
+    is_snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ShardedManager()
+
+    class Meta:
+        ordering = ['-number']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'number'], name='unique_post_revision'),
+            models.UniqueConstraint(fields=['comment', 'number'], name='unique_comment_revision'),
+            models.CheckConstraint(
+                check=models.Q(post__isnull=False, comment__isnull=True) | models.Q(post__isnull=True, comment__isnull=False),
+                name='revision_single_target'
+            ),
+        ]
+
+    def __str__(self):
+        return str(self.number)
+
+
+class PostViewers(models.Model):
+    """
+    HyperLogLog sketch of the viewers of a post, `Post.unique_viewers` is its estimate.
+    """
+    post = models.OneToOneField(Post, primary_key=True, related_name='+', on_delete=models.CASCADE)
+    sketch = models.BinaryField()
+
+    def __str__(self):
+        return str(self.pk)
+
+
+class ArchivedPost(models.Model):
+    """
+    Read-only copy of an old post, moved out of the `Post` table by `archive_posts`.
+    Only the columns needed for lookups are kept as such, the rest is a compressed payload.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    subreddit = models.ForeignKey(Subreddit, on_delete=models.CASCADE, db_constraint=False)
+    author = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, null=True, db_constraint=False)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.BinaryField()
+
+    def __str__(self):
+        return str(self.pk)
+
+
+class ArchivedComment(models.Model):
+    """
+    Read-only copy of a comment of an archived post.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    post = models.ForeignKey(ArchivedPost, on_delete=models.CASCADE)
+    author = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, null=True, db_constraint=False)
+    created_at = models.DateTimeField()
+    data = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', '-created_at'], name='archivedcomment_post_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.pk)
+
+
+class ShardSequence(models.Model):
+    """
+    Next free primary key of a sharded model, so ids stay unique across shards.
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return self.name
+
+
+class SimHashBucket(models.Model):
+    """
+    One band of the SimHash of the text of a recent post or comment, for finding near-duplicates.
+    `bucket` is the number of the band and its bits; texts within the configured distance of
+    each other share at least one bucket.
+    """
+    bucket = models.PositiveBigIntegerField()
+    simhash = models.BigIntegerField()
+    kind = models.CharField(max_length=16)
+    object_id = models.BigIntegerField()
+    author = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, null=True, db_constraint=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', 'created_at'], name='simhashbucket_bucket_idx'),
+            models.Index(fields=['kind', 'object_id'], name='simhashbucket_object_idx'),
+            models.Index(fields=['created_at'], name='simhashbucket_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+class ActivityRollup(models.Model):
+    """
+    Posts, comments and active authors of a subreddit in one minute, hour or day starting at `start`.
+    Counts are net of content deleted since, `authors` is a HyperLogLog sketch of the authors.
+    """
+    subreddit = models.ForeignKey(Subreddit, related_name='+', on_delete=models.CASCADE)
+    granularity = models.CharField(max_length=8)
+    start = models.DateTimeField()
+    posts = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+    authors = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['subreddit', 'start', 'granularity'], name='unique_activity_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'start'], name='activityrollup_compact_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subreddit_id} {self.granularity} {self.start}'
+
+
+class Notification(models.Model):
+    """
+    Replies to a post of the recipient, or mentions of the recipient in the comments of a post.
+    Notifications of the same post are coalesced while unread: `count` is the number of
+    comments, `comment_id` and `actor` belong to the latest one.
+    """
+    recipient = models.ForeignKey(User, related_name='notifications', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=16)
+    post_id = models.BigIntegerField()
+    comment_id = models.BigIntegerField()
+    actor = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, null=True, db_constraint=False)
+    count = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'kind', 'post_id'],
+                condition=models.Q(is_read=False),
+                name='unique_unread_notification'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['recipient', '-updated_at', '-id'], name='notification_inbox_idx'),
+            models.Index(
+                fields=['recipient', '-updated_at', '-id'],
+                condition=models.Q(is_read=False),
+                name='notification_unread_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.post_id}'
+
+
+class NotificationInbox(models.Model):
+    """
+    Number of unread notifications of a user, updated as they're delivered and read.
+    """
+    user = models.OneToOneField(User, primary_key=True, related_name='+', on_delete=models.CASCADE)
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.pk)
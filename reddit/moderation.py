@@ -0,0 +1,72 @@
+from django.db import transaction
+
+from .cache import object_cache
+from .models import Comment, Post, Report
+from .pagination import forget_count, forget_counts
+from .sharding import shard_for_subreddit
+
+
+ACTION_VALUES = {
+    'remove': {'is_removed': True},
+    'approve': {'is_removed': False, 'report_count': 0},
+    'lock': {'is_locked': True},
+    'unlock': {'is_locked': False},
+    'remove_user_content': {'is_removed': True},
+}
+
+
+def moderate(subreddit_pk, action, posts=(), comments=(), user=None):
+    """
+    Apply a moderation action to posts and comments of the subreddit.
+
+    Every table is changed with a single set-based UPDATE scoped to the subreddit, so ids
+    from other subreddits are ignored. `remove_user_content` targets everything `user` wrote
+    in the subreddit instead of the given ids. `approve` also deletes the reports of the
+    approved content. Returns the number of changed rows per table.
+
+    Cached representations of the changed objects are invalidated; for `remove_user_content`
+    this needs the ids, which are read with an extra indexed query per table. Removing and
+    approving also invalidate the cached post count of the subreddit and the cached comment
+    counts of the posts of changed comments, read with one more query for given comment ids.
+    """
+    shard = shard_for_subreddit(subreddit_pk)
+    post_queryset = Post.objects.using(shard).filter(subreddit=subreddit_pk)
+    comment_queryset = Comment.objects.using(shard).filter(post__subreddit=subreddit_pk)
+
+    if action == 'remove_user_content':
+        post_queryset = post_queryset.filter(author=user)
+        comment_queryset = comment_queryset.filter(author=user)
+    else:
+        post_queryset = post_queryset.filter(pk__in=posts) if posts else None
+        comment_queryset = comment_queryset.filter(pk__in=comments) if comments else None
+
+    values = ACTION_VALUES[action]
+    counted = 'is_removed' in values
+    commented_posts = set()
+    with transaction.atomic(using=shard):
+        if action == 'remove_user_content':
+            posts = list(post_queryset.values_list('pk', flat=True))
+            comments = []
+            for comment_pk, post_pk in comment_queryset.values_list('pk', 'post'):
+                comments.append(comment_pk)
+                commented_posts.add(post_pk)
+        elif counted and comment_queryset is not None:
+            commented_posts.update(comment_queryset.values_list('post', flat=True).distinct())
+        changed = {
+            'posts': post_queryset.update(**values) if post_queryset is not None else 0,
+            'comments': comment_queryset.update(**values) if comment_queryset is not None else 0,
+        }
+        if action == 'approve':
+            # Approved content can be reported again, also by users who reported it before.
+            if post_queryset is not None:
+                Report.objects.using(shard).filter(post__in=post_queryset).delete()
+            if comment_queryset is not None:
+                Report.objects.using(shard).filter(comment__in=comment_queryset).delete()
+
+    object_cache.delete_many(Post, posts)
+    object_cache.delete_many(Comment, comments)
+    if counted and changed['posts']:
+        forget_count(Post, 'subreddit', subreddit_pk)
+    if counted and changed['comments']:
+        forget_counts(Comment, 'post', commented_posts)
+    return changed
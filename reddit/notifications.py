@@ -0,0 +1,226 @@
+import atexit
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Comment, Notification, NotificationInbox, Post
+
+
+# `u/name` or `@name`, not part of a word, a path or an email address.
+MENTION = re.compile(r'(?<![\w/@.])(?:/?u/|@)([\w.@+-]*[\w+-])')
+
+logger = logging.getLogger(__name__)
+
+
+def mentioned(text):
+    """
+    Return the usernames mentioned in `text`, in order of first mention.
+    """
+    return list(dict.fromkeys(MENTION.findall(text or '')))
+
+
+class Delivery:
+    """
+    Comments to notify one user of, for one post.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.comment_pk = None
+        self.actor_pk = None
+
+    def add(self, comment_pk, actor_pk, count=1):
+        self.count += count
+        # Comment pks are allocated in order, the latest comment is shown.
+        if self.comment_pk is None or comment_pk > self.comment_pk:
+            self.comment_pk, self.actor_pk = comment_pk, actor_pk
+
+
+class NotificationQueue:
+    """
+    Process-local buffer of notifications of replies to posts and mentions in comments.
+
+    New comments are queued once committed, so creating one writes no notification. Queued
+    notifications are written by the comments after `flush_interval` seconds or `max_pending`
+    queued notifications, each writing at most `flush_limit` until the queue is empty, and all
+    at exit. Notifications of the same kind and post
+    for one user are coalesced: the ones queued meanwhile into one, added to the user's unread
+    notification of the post when there is one. Only the first `max_mentions` users mentioned
+    in a comment are notified. Notifications that fail to be written are logged and queued
+    again, never failing the request.
+
+    Unread notifications are counted in `NotificationInbox`, updated in the same transaction.
+    """
+
+    def __init__(self, flush_interval=5, max_pending=10000, flush_limit=500, max_mentions=10, enabled=True):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flush_limit = flush_limit
+        self.max_mentions = max_mentions
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # Mentions are queued by username, resolved to users when written.
+        self.pending = defaultdict(Delivery)
+        self.last_flush = time.monotonic()
+
+    def record(self, comment):
+        """
+        Queue the notifications of a new comment, once its transaction commits.
+        """
+        if not self.enabled:
+            return
+        if Comment.post.is_cached(comment):
+            post_author_pk = comment.post.author_id
+        else:
+            post_author_pk = Post.objects.using(comment._state.db).filter(pk=comment.post_id).values_list(
+                'author', flat=True
+            ).first()
+
+        recipients = []
+        if post_author_pk is not None and post_author_pk != comment.author_id:
+            recipients.append((post_author_pk, 'reply'))
+        author_username = comment.author.username if Comment.author.is_cached(comment) and comment.author else None
+        for username in mentioned(comment.text)[:self.max_mentions]:
+            if username != author_username:
+                recipients.append((username, 'mention'))
+        if recipients:
+            transaction.on_commit(
+                partial(self.add, recipients, comment.post_id, comment.pk, comment.author_id),
+                using=comment._state.db or DEFAULT_DB_ALIAS
+            )
+
+    def add(self, recipients, post_pk, comment_pk, actor_pk):
+        with self.lock:
+            for recipient, kind in recipients:
+                self.pending[recipient, kind, post_pk].add(comment_pk, actor_pk)
+            due = len(self.pending) >= self.max_pending or time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush(limit=self.flush_limit)
+
+    def flush(self, limit=None):
+        """
+        Write at most `limit` queued notifications to the database, the others stay queued and due.
+        Returns the number of written notifications.
+        """
+        with self.lock:
+            if limit is None or len(self.pending) <= limit:
+                pending = self.pending
+                self.reset()
+            else:
+                pending = {key: self.pending.pop(key) for key in list(islice(self.pending, limit))}
+
+        items = list(pending.items())
+        written = 0
+        for offset in range(0, len(items), 500):
+            batch = dict(items[offset:offset + 500])
+            try:
+                written += self.write(batch)
+            except Exception:
+                logger.exception('Writing %s notifications failed, queueing them again.', len(batch))
+                self.restore(batch)
+        return written
+
+    def restore(self, pending):
+        with self.lock:
+            for key, delivery in pending.items():
+                self.pending[key].add(delivery.comment_pk, delivery.actor_pk, delivery.count)
+
+    def write(self, pending):
+        usernames = {recipient for recipient, kind, post_pk in pending if isinstance(recipient, str)}
+        pks = {recipient for recipient, kind, post_pk in pending if not isinstance(recipient, str)}
+        users = User.objects.filter(Q(pk__in=pks) | Q(username__in=usernames)).values_list('pk', 'username')
+        recipient_pks = {}
+        for pk, username in users:
+            recipient_pks[pk] = recipient_pks[username] = pk
+
+        deliveries = defaultdict(Delivery)
+        for (recipient, kind, post_pk), delivery in pending.items():
+            recipient_pk = recipient_pks.get(recipient)
+            if recipient_pk is not None:
+                deliveries[recipient_pk, kind, post_pk].add(delivery.comment_pk, delivery.actor_pk, delivery.count)
+        if not deliveries:
+            return 0
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Insert the missing unread notifications empty, without failing when another process
+            # just did, then add to the locked rows. Rows still empty were created here.
+            Notification.objects.bulk_create([
+                Notification(
+                    recipient_id=recipient_pk, kind=kind, post_id=post_pk, comment_id=delivery.comment_pk,
+                    actor_id=delivery.actor_pk, count=0, created_at=now, updated_at=now
+                )
+                for (recipient_pk, kind, post_pk), delivery in deliveries.items()
+            ], ignore_conflicts=True)
+            unread = {
+                (notification.recipient_id, notification.kind, notification.post_id): notification
+                for notification in Notification.objects.select_for_update().filter(
+                    recipient__in={key[0] for key in deliveries},
+                    post_id__in={key[2] for key in deliveries},
+                    is_read=False,
+                )
+            }
+            changed = []
+            new_unread = defaultdict(int)
+            for (recipient_pk, kind, post_pk), delivery in deliveries.items():
+                notification = unread[recipient_pk, kind, post_pk]
+                if notification.count == 0:
+                    new_unread[recipient_pk] += 1
+                notification.count += delivery.count
+                notification.comment_id, notification.actor_id = delivery.comment_pk, delivery.actor_pk
+                notification.updated_at = now
+                changed.append(notification)
+            Notification.objects.bulk_update(changed, ['count', 'comment_id', 'actor', 'updated_at'])
+
+            NotificationInbox.objects.bulk_create(
+                [NotificationInbox(user_id=user_pk) for user_pk in new_unread], ignore_conflicts=True
+            )
+            # One UPDATE per distinct increment, usually a single one.
+            by_increment = defaultdict(list)
+            for user_pk, count in new_unread.items():
+                by_increment[count].append(user_pk)
+            for count, user_pks in by_increment.items():
+                NotificationInbox.objects.filter(user__in=user_pks).update(unread=F('unread') + count)
+        return len(deliveries)
+
+
+def unread_count(user_pk):
+    return NotificationInbox.objects.filter(user=user_pk).values_list('unread', flat=True).first() or 0
+
+
+def mark_read(user_pk, pks=None):
+    """
+    Mark the unread notifications of the user with the given pks, or all of them, as read.
+    Returns the number of notifications marked.
+    """
+    with transaction.atomic():
+        notifications = Notification.objects.filter(recipient=user_pk, is_read=False)
+        if pks is not None:
+            notifications = notifications.filter(pk__in=pks)
+        read = notifications.update(is_read=True)
+        if read:
+            NotificationInbox.objects.filter(user=user_pk).update(unread=Greatest(F('unread') - read, 0))
+    return read
+
+
+notification_queue = NotificationQueue(
+    flush_interval=getattr(settings, 'NOTIFICATION_FLUSH_INTERVAL', 5),
+    max_pending=getattr(settings, 'NOTIFICATION_MAX_PENDING', 10000),
+    flush_limit=getattr(settings, 'NOTIFICATION_FLUSH_LIMIT', 500),
+    max_mentions=getattr(settings, 'NOTIFICATION_MAX_MENTIONS', 10),
+)
+atexit.register(notification_queue.flush)
@@ -0,0 +1,231 @@
+import heapq
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .checks import is_shared_cache
+from .estimates import bounded_count, estimate_count, planner_estimate, rows_per_value
+
+
+class MergedCursorPagination:
+    """
+    Cursor pagination over several querysets merged into one stream ordered by creation date.
+
+    Every queryset is read from its own position in ('-created_at', '-id') order and the
+    results are combined with a k-way merge, so a page costs one indexed range query per
+    stream instead of a UNION sorted over every row. Subclasses can order by another date
+    field with `ordering_field`.
+    """
+    page_size = 25
+    ordering_field = 'created_at'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_streams(self, streams, request):
+        """
+        Return a list of (kind, obj) tuples for the requested page.
+        `streams` maps a kind name to a queryset with `created_at` (or `ordering_field`) and `id` fields.
+        """
+        self.request = request
+        positions = self.decode_cursor(request)
+        field = self.ordering_field
+
+        pages = []
+        for kind, queryset in streams.items():
+            position = positions.get(kind)
+            if position is not None:
+                created_at, pk = position
+                queryset = queryset.filter(Q(**{f'{field}__lt': created_at}) | Q(**{field: created_at, 'id__lt': pk}))
+            rows = queryset.order_by(f'-{field}', '-id')[:self.page_size + 1]
+            pages.append([(kind, obj) for obj in rows])
+
+        merged = heapq.merge(*pages, key=lambda item: (getattr(item[1], field), item[1].pk), reverse=True)
+        page = []
+        self.has_next = False
+        for item in merged:
+            if len(page) == self.page_size:
+                self.has_next = True
+                break
+            page.append(item)
+
+        self.next_positions = dict(positions)
+        for kind, obj in page:
+            self.next_positions[kind] = (getattr(obj, field), obj.pk)
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_positions))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return {}
+
+        try:
+            raw = json.loads(b64decode(encoded.encode('ascii')).decode('ascii'))
+            positions = {}
+            for kind, (created_at, pk) in raw.items():
+                created_at = parse_datetime(created_at)
+                if created_at is None:
+                    raise ValueError
+                positions[kind] = (created_at, int(pk))
+        except (TypeError, ValueError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        return positions
+
+    def encode_cursor(self, positions):
+        raw = {kind: [created_at.isoformat(), pk] for kind, (created_at, pk) in positions.items()}
+        return b64encode(json.dumps(raw, separators=(',', ':')).encode('ascii')).decode('ascii')
+
+
+class NotificationCursorPagination(MergedCursorPagination):
+    """
+    Cursor pagination of a notification inbox, by latest activity.
+    """
+    ordering_field = 'updated_at'
+
+
+def count_cache_alias():
+    return getattr(settings, 'COUNT_CACHE_ALIAS', 'shared')
+
+
+def count_cache_key(model, scope, pk):
+    return f'count:{model._meta.label_lower}:{scope}:{pk}'
+
+
+def forget_count(model, scope, pk):
+    caches[count_cache_alias()].delete(count_cache_key(model, scope, pk))
+
+
+def forget_counts(model, scope, pks):
+    caches[count_cache_alias()].delete_many([count_cache_key(model, scope, pk) for pk in pks])
+
+
+class EstimatedCountPagination(BasePagination):
+    """
+    Page number pagination, used when a page is requested with `?page=` or `?page_size=`,
+    whose count is exact only when that's cheap.
+
+    Lists of up to `count_limit` rows are counted exactly, reading at most `count_limit + 1`
+    rows by index, and the count is cached per `count_scope` of the view (its `subreddit` or
+    `post` from the `pk` URL kwarg) until a row of the scope is created or deleted, or for
+    COUNT_CACHE_TIMEOUT seconds. Cached counts are only exact when COUNT_CACHE_ALIAS names a
+    cache shared by all processes, otherwise writes in other processes aren't seen and they're
+    flagged as approximate. Longer lists are estimated, from the view's maintained counters
+    (`estimate_count()`), the query planner or the database statistics, and flagged with
+    `count_approximate`. The last page counts its list exactly for free.
+    """
+    page_size = 25
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_limit = 1000
+    invalid_page_message = 'Invalid page.'
+
+    def paginates(self, request):
+        return self.page_query_param in request.query_params or self.page_size_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.paginates(request):
+            return None
+        self.request = request
+        self.page_number = self.get_positive_param(request, self.page_query_param, 1)
+        page_size = min(self.get_positive_param(request, self.page_size_query_param, self.page_size), self.max_page_size)
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        page = rows[:page_size]
+        if not page and self.page_number > 1:
+            raise NotFound(self.invalid_page_message)
+
+        if not self.has_next:
+            self.count, self.count_exact = offset + len(page), True
+        else:
+            self.count, self.count_exact = self.get_count(queryset, view, offset + len(rows))
+        return page
+
+    def get_positive_param(self, request, name, default):
+        try:
+            value = int(request.query_params.get(name, default))
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        if value < 1:
+            raise NotFound(self.invalid_page_message)
+        return value
+
+    def get_count(self, queryset, view, seen):
+        """
+        Return (count, exact) of a list known to hold at least `seen` rows.
+        """
+        if isinstance(queryset, list):
+            return len(queryset), True
+
+        scope = getattr(view, 'count_scope', None)
+        key = count_cache_key(queryset.model, scope, view.kwargs['pk']) if scope else None
+        alias = count_cache_alias()
+        if key is not None:
+            cached = caches[alias].get(key)
+            if cached is not None and cached >= seen:
+                return cached, is_shared_cache(alias)
+
+        if seen <= self.count_limit:
+            count, exact = bounded_count(queryset, self.count_limit)
+            if exact:
+                if key is not None:
+                    caches[alias].set(key, count, getattr(settings, 'COUNT_CACHE_TIMEOUT', 60))
+                return count, True
+            seen = self.count_limit + 1
+
+        return max(self.estimate_count(queryset, view, scope) or 0, seen), False
+
+    def estimate_count(self, queryset, view, scope):
+        if hasattr(view, 'estimate_count'):
+            estimate = view.estimate_count()
+            if estimate is not None:
+                return estimate
+        estimate = planner_estimate(queryset)
+        if estimate is None and scope:
+            estimate = rows_per_value(queryset.model, queryset.model._meta.get_field(scope).column, queryset.db)
+        if estimate is None and not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+        return estimate
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('count_approximate', not self.count_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
@@ -1,5 +1,20 @@
 from rest_framework import permissions
 
+from .models import Subreddit
+
+
+def is_owner_or_moderator(user, subreddit_pk):
+    """
+    Return whether the user owns or moderates the subreddit.
+    The owner and moderators are read with one query, never from the query cache: its
+    invalidation isn't seen by other processes, which would keep granting removed moderators access.
+    """
+    if not user.is_authenticated:
+        return False
+
+    staff = Subreddit.objects.filter(pk=subreddit_pk).order_by().values_list('owner', 'moderator')
+    return any(user.pk in row for row in staff)
+
 
 class SuperUserPermission(permissions.BasePermission):
     """
@@ -26,13 +41,17 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
 class IsAuthorOrReadOnly(permissions.BasePermission):
     """
     Object-level permission to only allow authors of an object to edit it.
-    Assumes the model instance has an `author` attribute.
+    Locked objects can only be deleted by their authors.
+    Assumes the model instance has `author` and `is_locked` attributes.
     """
 
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
 
+        if request.method != 'DELETE' and obj.is_locked:
+            return False
+
         return obj.author == request.user
 
 
@@ -46,13 +65,7 @@ class SubredditOwnerModeratorPostPermission(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        if request.user == obj.subreddit.owner:
-            return True
-
-        if request.user in obj.subreddit.moderator.all():
-            return True
-        
-        return False
+        return is_owner_or_moderator(request.user, obj.subreddit_id)
 
 
 class SubredditOwnerModeratorCommentPermission(permissions.BasePermission):
@@ -65,10 +78,14 @@ class SubredditOwnerModeratorCommentPermission(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        if request.user == obj.post.subreddit.owner:
-            return True
+        return is_owner_or_moderator(request.user, obj.post.subreddit_id)
 
-        if request.user in obj.post.subreddit.moderator.all():
-            return True
-        
-        return False
+
+class SubredditOwnerModeratorPermission(permissions.BasePermission):
+    """
+    Permission to only allow the subreddit owner and moderators to use the view.
+    Checked once per request with a single query; assumes the subreddit pk is the `pk` URL kwarg.
+    """
+
+    def has_permission(self, request, view):
+        return is_owner_or_moderator(request.user, view.kwargs['pk'])
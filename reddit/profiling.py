@@ -0,0 +1,139 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+
+class StackSampler:
+    """
+    Sample the stack of one thread from a background thread every `interval` seconds.
+
+    Samples are kept as collapsed stacks, `outer;...;inner` mapped to the number of samples,
+    so the cost per sample is a stack walk and a counter increment. The profiled thread
+    isn't instrumented and runs at full speed between samples.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self.stacks
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.stacks[collapse(frame)] += 1
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def write_collapsed(stacks, path):
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+
+
+def write_speedscope(stacks, path, name):
+    """
+    Write the stacks as a speedscope sampled profile, weighted by their number of samples.
+    """
+    frames = {}
+    samples = []
+    weights = []
+    for stack, count in stacks.most_common():
+        samples.append([frames.setdefault(frame, len(frames)) for frame in stack.split(';')])
+        weights.append(count)
+    profile = {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': [{'name': frame} for frame in frames]},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'none',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+        'name': name,
+        'exporter': 'reddit',
+    }
+    with open(path, 'w') as f:
+        json.dump(profile, f)
+
+
+FORMATS = {
+    'collapsed': '.collapsed',
+    'speedscope': '.speedscope.json',
+}
+
+
+def read_profile(path):
+    """
+    Return the collapsed stacks of a profile written in either format, with sample counts.
+    """
+    stacks = Counter()
+    if path.endswith(FORMATS['speedscope']):
+        with open(path) as f:
+            data = json.load(f)
+        frames = [frame['name'] for frame in data['shared']['frames']]
+        for profile in data['profiles']:
+            for sample, weight in zip(profile['samples'], profile['weights']):
+                stacks[';'.join(frames[i] for i in sample)] += int(weight)
+    else:
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def write_profile(stacks, directory, route, profile_format='collapsed'):
+    """
+    Write the stacks of one request to `directory` as `<route>.<time>.<pid>.<random><extension>`.
+    Returns the file name.
+    """
+    os.makedirs(directory, exist_ok=True)
+    safe_route = re.sub(r'[^\w-]', '_', route)
+    timestamp = time.strftime('%Y%m%dT%H%M%S')
+    filename = f'{safe_route}.{timestamp}.{os.getpid()}.{uuid.uuid4().hex[:8]}{FORMATS[profile_format]}'
+    path = os.path.join(directory, filename)
+    if profile_format == 'speedscope':
+        write_speedscope(stacks, path, route)
+    else:
+        write_collapsed(stacks, path)
+    return filename
+
+
+def profile_route(filename):
+    return filename.split('.', 1)[0]
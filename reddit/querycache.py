@@ -0,0 +1,222 @@
+import atexit
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, transaction
+
+
+MISSING = object()
+
+# Tables read by a query, including joins and subqueries.
+READ_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+"(\w+)"', re.IGNORECASE)
+# Table written by a statement.
+WRITTEN_TABLE = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)\s+"?(\w+)"?',
+    re.IGNORECASE
+)
+
+
+class QueryCache:
+    """
+    Cache of ORM query results keyed by their SQL and parameters.
+
+    Every table has a version counter in the cache, and each result is stored under a key
+    including the versions of the tables its query reads. Any INSERT, UPDATE or DELETE bumps
+    the version of its table, so results depending on it are never read again and expire on
+    their own. Writes are seen at the database connection, so bulk operations, `update()`
+    and raw SQL invalidate as well. Writes inside a transaction bump on commit, and queries
+    inside a transaction bypass the cache, since they may see uncommitted writes.
+
+    Versions are only shared by the processes sharing the cache `alias`. With a process-local
+    cache, other processes don't see a write and may return results up to `timeout` seconds
+    old, so only cache what may be that stale, never what grants access.
+
+    Hits and misses are counted per model in the process, and added to shared counters every
+    `stats_flush_every` lookups and at exit.
+    """
+
+    def __init__(self, alias='default', timeout=300, stats_flush_every=100):
+        self.alias = alias
+        self.timeout = timeout
+        self.stats_flush_every = stats_flush_every
+        self.lock = threading.Lock()
+        self.unflushed = Counter()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version_key(self, using, table):
+        return f'querycache:version:{using}:{table}'
+
+    def versions(self, using, tables):
+        """
+        Return the current versions of `tables`, starting missing counters at a fresh value so
+        results stored under an evicted counter are never matched again.
+        """
+        keys = [self.version_key(using, table) for table in tables]
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                self.cache.add(key, time.time_ns(), None)
+                versions[key] = self.cache.get(key)
+        return [versions[key] for key in keys]
+
+    def bump(self, using, table):
+        key = self.version_key(using, table)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, time.time_ns(), None)
+
+    def written(self, using, table):
+        """
+        Invalidate the results reading `table`, once the write is committed.
+        """
+        if connections[using].in_atomic_block:
+            transaction.on_commit(partial(self.bump, using, table), using=using)
+        else:
+            self.bump(using, table)
+
+    def fetch(self, queryset, timeout=None):
+        """
+        Return the results of `queryset` as `list(queryset)` would, from the cache when possible.
+        """
+        connection = connections[queryset.db]
+        if connection.in_atomic_block:
+            return list(queryset._iterable_class(queryset))
+        try:
+            sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+        except EmptyResultSet:
+            return []
+
+        tables = sorted(set(READ_TABLES.findall(sql)))
+        signature = repr((
+            sql, params, queryset._iterable_class.__name__, queryset._fields, self.versions(queryset.db, tables)
+        ))
+        key = f'querycache:result:{queryset.db}:{hashlib.sha1(signature.encode()).hexdigest()}'
+
+        results = self.cache.get(key, MISSING)
+        self.record(queryset.model, hit=results is not MISSING)
+        if results is MISSING:
+            results = list(queryset._iterable_class(queryset))
+            self.cache.set(key, results, self.timeout if timeout is None else timeout)
+        return results
+
+    def record(self, model, hit):
+        with self.lock:
+            self.unflushed[model._meta.label_lower, 'hits' if hit else 'misses'] += 1
+            due = sum(self.unflushed.values()) >= self.stats_flush_every
+        if due:
+            self.flush_stats()
+
+    def stats_key(self, label, kind):
+        return f'querycache:stats:{label}:{kind}'
+
+    def flush_stats(self):
+        with self.lock:
+            unflushed, self.unflushed = self.unflushed, Counter()
+        for (label, kind), count in unflushed.items():
+            key = self.stats_key(label, kind)
+            if not self.cache.add(key, count, None):
+                self.cache.incr(key, count)
+
+    def stats(self):
+        """
+        Return `{model label: (hits, misses)}` of the models using `CachedQuerySet`, across processes.
+        """
+        self.flush_stats()
+        labels = [model._meta.label_lower for model in cached_models()]
+        counts = self.cache.get_many([self.stats_key(label, kind) for label in labels for kind in ('hits', 'misses')])
+        return {
+            label: (counts.get(self.stats_key(label, 'hits'), 0), counts.get(self.stats_key(label, 'misses'), 0))
+            for label in labels
+        }
+
+    def reset_stats(self):
+        with self.lock:
+            self.unflushed = Counter()
+        labels = [model._meta.label_lower for model in cached_models()]
+        self.cache.delete_many([self.stats_key(label, kind) for label in labels for kind in ('hits', 'misses')])
+
+
+query_cache = QueryCache(
+    alias=getattr(settings, 'QUERY_CACHE_ALIAS', 'default'),
+    timeout=getattr(settings, 'QUERY_CACHE_TIMEOUT', 300),
+)
+atexit.register(query_cache.flush_stats)
+
+
+def cache_tables():
+    """
+    Return the tables of the database caches.
+    """
+    return {
+        options['LOCATION'] for options in settings.CACHES.values()
+        if options['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache'
+    }
+
+
+def invalidate_written_table(execute, sql, params, many, context):
+    """
+    Database execute wrapper bumping the version of the table written by a statement.
+    """
+    result = execute(sql, params, many, context)
+    match = WRITTEN_TABLE.match(sql)
+    # Writes of a database cache are its own, bumping them would write to it again without end.
+    if match and match.group(1) not in cache_tables():
+        query_cache.written(context['connection'].alias, match.group(1))
+    return result
+
+
+def install(connection):
+    """
+    Watch the writes of `connection`. The wrapper is put first, so it stays in place when wrappers
+    added with `connection.execute_wrapper()` are removed.
+    """
+    if invalidate_written_table not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, invalidate_written_table)
+
+
+class CachedQuerySet(models.QuerySet):
+    """
+    QuerySet whose results are read from the query cache after `cached()`.
+    Models opt in by using `CachedManager`, queries by calling `cached()`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_results = False
+        self._cache_timeout = None
+
+    def cached(self, timeout=None):
+        clone = self._chain()
+        clone._cache_results = True
+        clone._cache_timeout = timeout
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_results = self._cache_results
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._cache_results:
+            self._result_cache = query_cache.fetch(self, self._cache_timeout)
+        super()._fetch_all()
+
+
+CachedManager = models.Manager.from_queryset(CachedQuerySet)
+
+
+def cached_models():
+    return [model for model in apps.get_models() if issubclass(model._default_manager._queryset_class, CachedQuerySet)]
@@ -0,0 +1,73 @@
+import re
+
+from django.contrib.auth.models import User
+from django.db import connections
+
+from .models import (
+    ActivityRollup, ArchivedComment, ArchivedPost, Comment, Notification, Post, PostViewers, Report, Revision, Subreddit
+    )
+
+
+# Tables expected to grow too large to be read in full or sorted without an index.
+LARGE_MODELS = [
+    User, Subreddit, Subreddit.moderator.through, Post, Comment, Report, Revision, PostViewers,
+    ArchivedPost, ArchivedComment, ActivityRollup, Notification,
+]
+
+
+def large_tables():
+    return {model._meta.db_table for model in LARGE_MODELS}
+
+
+def explain(sql, using='default'):
+    """
+    Return the lines of the query plan of an executed query, as captured by `CaptureQueriesContext`,
+    from `EXPLAIN QUERY PLAN` on SQLite or `EXPLAIN` on PostgreSQL.
+
+    Small tables are cheaper to scan than to read by index, so PostgreSQL is told to avoid
+    sequential scans and sorts wherever an index can be used instead.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET enable_seqscan = off')
+            cursor.execute('SET enable_sort = off')
+            try:
+                cursor.execute(f'EXPLAIN {sql}')
+                return [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.execute('RESET enable_seqscan')
+                cursor.execute('RESET enable_sort')
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan, tables=None, vendor='sqlite'):
+    """
+    Return the lines of `plan` that read one of `tables` in full without an index, or sort
+    rows in a temporary structure instead of reading them in index order. Subqueries are
+    named by their aliases (`U0`, `T3`) in plans, so those count as large tables as well.
+    """
+    tables = large_tables() if tables is None else tables
+    if vendor == 'postgresql':
+        scan = re.compile(r'Seq Scan on "?(\w+)"?')
+        sort = re.compile(r'\bSort\b')
+    else:
+        scan = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?! USING)(?: AS \w+)?$')
+        sort = re.compile(r'USE TEMP B-TREE')
+    problems = []
+    for line in plan:
+        line = line.strip(' ->')
+        match = scan.search(line)
+        scanned = match is not None and (match.group(1) in tables or re.fullmatch(r'[TU]\d+', match.group(1)))
+        if scanned or sort.search(line):
+            problems.append(line)
+    return problems
+
+
+def touches(sql, tables=None):
+    """
+    Return whether the query reads one of `tables`.
+    """
+    tables = large_tables() if tables is None else tables
+    return any(f'"{table}"' in sql for table in tables)
@@ -0,0 +1,78 @@
+import cbor2
+import msgpack
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class BinaryRenderer(BaseRenderer):
+    """
+    Base class for compact binary renderers.
+
+    Datetimes reach the renderer as `datetime` objects (see `DATETIME_FORMAT` in settings) and
+    are written with the native timestamp type of the format instead of an ISO 8601 string.
+    Anything the format can't encode natively falls back to the conversions used by DRF's JSON encoder.
+    """
+    charset = None
+    render_style = 'binary'
+
+    # Whether `render_stream` needs the number of items before the first one is written.
+    stream_requires_length = False
+
+    def __init__(self):
+        self.fallback_encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.dumps(data)
+
+    def render_stream(self, items, length=None):
+        """
+        Yield the encoding of an array of `items` chunk by chunk.
+        """
+        raise NotImplementedError('.render_stream() must be overridden.')
+
+    def dumps(self, data):
+        raise NotImplementedError('.dumps() must be overridden.')
+
+
+class MessagePackRenderer(BinaryRenderer):
+    """
+    Renderer which serializes to MessagePack, with datetimes as timestamp extension values.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    stream_requires_length = True
+
+    def packer(self):
+        return msgpack.Packer(datetime=True, default=self.fallback_encoder.default)
+
+    def dumps(self, data):
+        return self.packer().pack(data)
+
+    def render_stream(self, items, length=None):
+        packer = self.packer()
+        yield packer.pack_array_header(length)
+        for item in items:
+            yield packer.pack(item)
+
+
+class CBORRenderer(BinaryRenderer):
+    """
+    Renderer which serializes to CBOR, with datetimes as epoch-based timestamps (tag 1).
+    Streams are written as indefinite-length arrays, so the length isn't needed up front.
+    """
+    media_type = 'application/cbor'
+    format = 'cbor'
+
+    def default(self, encoder, value):
+        encoder.encode(self.fallback_encoder.default(value))
+
+    def dumps(self, data):
+        return cbor2.dumps(data, datetime_as_timestamp=True, default=self.default)
+
+    def render_stream(self, items, length=None):
+        yield b'\x9f'
+        for item in items:
+            yield self.dumps(item)
+        yield b'\xff'
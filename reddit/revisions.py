@@ -0,0 +1,165 @@
+import zlib
+from difflib import SequenceMatcher
+
+import msgpack
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Subquery
+
+from .models import Comment, Post, Revision
+
+
+# Versioned fields per model, and the `Revision` field pointing at the model.
+TRACKED_FIELDS = {
+    Post: ['title', 'text'],
+    Comment: ['text'],
+}
+TARGET_FIELDS = {
+    Post: 'post',
+    Comment: 'comment',
+}
+
+
+def snapshot_interval():
+    return getattr(settings, 'REVISION_SNAPSHOT_INTERVAL', 10)
+
+
+def diff(old, new):
+    """
+    Return the edit operations turning `old` into `new`: a positive int keeps that many
+    characters, a negative int drops that many, a string is inserted. None stands for
+    setting the field to None.
+    """
+    if new is None:
+        return None
+    old = old or ''
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append(new[j1:j2])
+    return ops
+
+
+def patch(old, ops):
+    if ops is None:
+        return None
+    old = old or ''
+    parts = []
+    position = 0
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.append(old[position:position + op])
+            position += op
+        else:
+            position -= op
+    return ''.join(parts)
+
+
+def encode(fields, is_snapshot):
+    data = msgpack.packb(fields)
+    return zlib.compress(data) if is_snapshot else data
+
+
+def decode(revision):
+    data = bytes(revision.data)
+    return msgpack.unpackb(zlib.decompress(data) if revision.is_snapshot else data)
+
+
+def revisions_of(obj, using=None):
+    model = type(obj)
+    return Revision.objects.using(using or obj._state.db).filter(**{TARGET_FIELDS[model]: obj.pk})
+
+
+def record(obj, old, editor=None):
+    """
+    Record the edit of `obj` from the field values in `old` to its current ones.
+
+    The first edit also records the original version. Every `REVISION_SNAPSHOT_INTERVAL`
+    revisions a full snapshot is stored, the ones in between are diffs to their previous
+    revision, so any version is rebuilt from at most that many rows.
+    Returns the new revision, or None if no tracked field changed.
+    """
+    model = type(obj)
+    fields = TRACKED_FIELDS[model]
+    new = {field: getattr(obj, field) for field in fields}
+    changes = {field: diff(old[field], new[field]) for field in fields if old[field] != new[field]}
+    if not changes:
+        return None
+
+    alias = obj._state.db
+    target = {TARGET_FIELDS[model]: obj}
+    with transaction.atomic(using=alias):
+        # Lock the edited row, so concurrent edits get consecutive numbers.
+        model._base_manager.using(alias).select_for_update().filter(pk=obj.pk).exists()
+        last = revisions_of(obj, alias).aggregate(last=Max('number'))['last']
+        if last is None:
+            Revision.objects.using(alias).create(number=1, is_snapshot=True, data=encode(old, True), **target)
+            last = 1
+        number = last + 1
+        is_snapshot = (number - 1) % snapshot_interval() == 0
+        data = encode(new if is_snapshot else changes, is_snapshot)
+        return Revision.objects.using(alias).create(
+            number=number, editor=editor, is_snapshot=is_snapshot, data=data, **target
+        )
+
+
+def apply(fields, revision):
+    """
+    Return the fields of `revision`, given the fields of the revision before it.
+    """
+    changes = decode(revision)
+    if revision.is_snapshot:
+        return changes
+    fields = dict(fields)
+    for field, ops in changes.items():
+        fields[field] = patch(fields.get(field), ops)
+    return fields
+
+
+def rebuild(revisions):
+    """
+    Return the fields of the last of `revisions`, ordered by number and starting at a snapshot.
+    """
+    fields = {}
+    for revision in revisions:
+        fields = apply(fields, revision)
+    return fields
+
+
+def version(revisions, **lookups):
+    """
+    Return the last revision of `revisions` matching `lookups` with its rebuilt fields, or None.
+    Reads the revisions from the closest snapshot on in one query.
+    """
+    target = revisions.filter(**lookups).order_by('-number')[:1].values('number')
+    snapshot = revisions.filter(is_snapshot=True, number__lte=Subquery(target)).order_by('-number')[:1].values('number')
+    chain = list(revisions.filter(number__gte=Subquery(snapshot), number__lte=Subquery(target)).order_by('number'))
+    if not chain:
+        return None
+    return chain[-1], rebuild(chain)
+
+
+def storage_overhead(model, using=None):
+    """
+    Return (revisions, snapshots, stored bytes, bytes if every revision was a full copy)
+    of the revisions of `model` on the `using` database.
+    """
+    target_field = TARGET_FIELDS[model]
+    queryset = Revision.objects.using(using).filter(**{f'{target_field}__isnull': False})
+    count = snapshots = stored = full = 0
+    for target_pk in queryset.order_by().values_list(target_field, flat=True).distinct():
+        fields = {}
+        for revision in queryset.filter(**{target_field: target_pk}).order_by('number'):
+            fields = apply(fields, revision)
+            count += 1
+            snapshots += revision.is_snapshot
+            stored += len(revision.data)
+            full += len(encode(fields, False))
+    return count, snapshots, stored, full
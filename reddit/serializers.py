@@ -1,6 +1,11 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Comment, Post, Subreddit
+from .activity import GRANULARITIES
+from .models import Comment, Notification, Post, Report, Revision, Subreddit
 
 
 class SubredditSerializer(serializers.ModelSerializer):
@@ -15,7 +20,7 @@ class SubredditDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Subreddit
-        fields = '__all__'
+        exclude = ['shard']
         extra_kwargs = {
             'name': {'required': False},
             'description': {'required': False},
@@ -28,10 +33,12 @@ class SubredditPostsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Post
-        fields = ['title', 'text', 'author']
+        fields = ['title', 'text', 'author', 'view_count', 'unique_viewers']
         extra_kwargs = {
             'author': {'required': False},
-            'subreddit': {'required': False}
+            'subreddit': {'required': False},
+            'view_count': {'read_only': True},
+            'unique_viewers': {'read_only': True}
         }
 
 
@@ -39,9 +46,11 @@ class PostSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Post
-        fields = ['id', 'title', 'text', 'subreddit', 'author']
+        fields = ['id', 'title', 'text', 'subreddit', 'author', 'view_count', 'unique_viewers']
         extra_kwargs = {
             'author': {'required': False},
+            'view_count': {'read_only': True},
+            'unique_viewers': {'read_only': True}
         }
 
 
@@ -54,7 +63,12 @@ class PostDetailSerializer(serializers.ModelSerializer):
             'title': {'required': False},
             'text': {'required': False},
             'subreddit': {'required': False},
-            'author': {'required': False}
+            'author': {'required': False},
+            'is_removed': {'read_only': True},
+            'is_locked': {'read_only': True},
+            'report_count': {'read_only': True},
+            'view_count': {'read_only': True},
+            'unique_viewers': {'read_only': True}
         }
 
 
@@ -67,7 +81,10 @@ class PostCommentsSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'text' : {'required': True},
             'post': {'required': False},
-            'author': {'required': False}
+            'author': {'required': False},
+            'is_removed': {'read_only': True},
+            'is_locked': {'read_only': True},
+            'report_count': {'read_only': True}
         }
 
 
@@ -80,5 +97,136 @@ class CommentDetailSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'text': {'required': False},
             'post': {'read_only': True},
-            'author': {'read_only': True}
+            'author': {'read_only': True},
+            'is_removed': {'read_only': True},
+            'is_locked': {'read_only': True},
+            'report_count': {'read_only': True}
         }
+
+
+class UserPostsSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'text', 'subreddit', 'view_count', 'unique_viewers', 'created_at']
+
+
+class UserCommentsSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'text', 'post', 'created_at']
+
+
+class ReportSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Report
+        fields = ['id', 'reason', 'created_at']
+
+
+class ModQueuePostSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'author', 'report_count', 'is_locked', 'created_at']
+
+
+class ModQueueCommentSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'text', 'post', 'author', 'report_count', 'is_locked', 'created_at']
+
+
+class ModerationActionSerializer(serializers.Serializer):
+    ACTIONS = ['remove', 'approve', 'lock', 'unlock', 'remove_user_content']
+
+    action = serializers.ChoiceField(choices=ACTIONS)
+    posts = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    comments = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    user = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if data['action'] == 'remove_user_content':
+            if 'user' not in data:
+                raise serializers.ValidationError({'user': 'This field is required for this action.'})
+        elif not data['posts'] and not data['comments']:
+            raise serializers.ValidationError('Provide at least one post or comment id.')
+        return data
+
+
+class ActivityStatsQuerySerializer(serializers.Serializer):
+    """
+    Time range of subreddit stats, the last day by default.
+    """
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    interval = serializers.ChoiceField(choices=GRANULARITIES, default='hour')
+
+    def validate(self, data):
+        data.setdefault('end', timezone.now())
+        data.setdefault('start', data['end'] - timedelta(days=1))
+        if data['start'] >= data['end']:
+            raise serializers.ValidationError({'start': 'The start must be before the end.'})
+        return data
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    post = serializers.IntegerField(source='post_id')
+    comment = serializers.IntegerField(source='comment_id')
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'kind', 'post', 'comment', 'actor', 'count', 'is_read', 'created_at', 'updated_at']
+
+
+class NotificationReadSerializer(serializers.Serializer):
+    """
+    Notifications to mark as read, all unread ones when omitted.
+    """
+    notifications = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)
+
+
+class RevisionSerializer(serializers.ModelSerializer):
+    size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Revision
+        fields = ['number', 'editor', 'is_snapshot', 'size', 'created_at']
+
+    def get_size(self, revision):
+        return len(revision.data)
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+
+class SubredditSummarySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Subreddit
+        fields = ['id', 'name', 'description']
+
+
+class PostSummarySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'subreddit', 'author', 'created_at']
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    METHODS = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
+
+    method = serializers.ChoiceField(choices=METHODS)
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchRequestSerializer(many=True, allow_empty=False, max_length=50)
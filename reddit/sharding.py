@@ -0,0 +1,359 @@
+import heapq
+import os
+import threading
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import F, Max
+
+
+SHARDED_MODELS = {
+    'reddit.post', 'reddit.comment', 'reddit.report', 'reddit.revision', 'reddit.postviewers',
+    'reddit.archivedpost', 'reddit.archivedcomment',
+}
+
+
+def shards():
+    """
+    Return the database aliases holding posts and comments.
+    """
+    return getattr(settings, 'SHARD_DATABASES', [DEFAULT_DB_ALIAS])
+
+
+def is_sharded():
+    return len(shards()) > 1
+
+
+def is_sharded_model(model):
+    # Not `label_lower`, which the database cache's stand-in model lacks.
+    return f'{model._meta.app_label}.{model._meta.model_name}' in SHARDED_MODELS
+
+
+def placement(name):
+    """
+    Return the initial shard of a new subreddit, a stable hash of its name.
+    """
+    aliases = shards()
+    return aliases[zlib.crc32(name.encode()) % len(aliases)]
+
+
+def shard_for_subreddit(subreddit_pk):
+    """
+    Return the alias of the shard holding the posts and comments of the subreddit.
+
+    The subreddit-to-shard map is read from `Subreddit.shard` on every call, a primary key
+    lookup, so a subreddit moved by `rebalance_shards` in another process is followed at once.
+    """
+    from .models import Subreddit
+
+    if not is_sharded():
+        return shards()[0]
+    return Subreddit.objects.filter(pk=subreddit_pk).values_list('shard', flat=True).first() or shards()[0]
+
+
+def locate(model, pk):
+    """
+    Return the alias of the shard holding the sharded object with the given pk.
+
+    Primary keys are unique across shards, so the first shard that has the row is cached as
+    its location. Rows move between shards with their subreddit, possibly in another process,
+    so the cached shard is checked first and the others are looked up when the row is gone.
+    Missing rows resolve to the first shard.
+    """
+    if not is_sharded():
+        return shards()[0]
+
+    key = f'shard:{model._meta.label_lower}:{pk}'
+    cached = cache.get(key)
+    candidates = shards()
+    if cached in candidates:
+        candidates = [cached] + [alias for alias in candidates if alias != cached]
+    for candidate in candidates:
+        if model._default_manager.using(candidate).filter(pk=pk).exists():
+            if candidate != cached:
+                cache.set(key, candidate, None)
+            return candidate
+    return shards()[0]
+
+
+def forget_locations(model, pks):
+    cache.delete_many([f'shard:{model._meta.label_lower}:{pk}' for pk in pks])
+
+
+def shard_for_instance(instance):
+    """
+    Return the shard of a sharded object, or of the sharded rows related to a subreddit.
+    """
+    from .models import ArchivedComment, ArchivedPost, Comment, Post, PostViewers, Report, Revision, Subreddit
+
+    if instance._state.db is not None and not isinstance(instance, Subreddit):
+        return instance._state.db
+
+    if isinstance(instance, Subreddit):
+        return shard_for_subreddit(instance.pk)
+    if isinstance(instance, (Post, ArchivedPost)):
+        return shard_for_subreddit(instance.subreddit_id)
+    if isinstance(instance, (Comment, PostViewers)):
+        return shard_for_related(instance, 'post', Post)
+    if isinstance(instance, ArchivedComment):
+        return shard_for_related(instance, 'post', ArchivedPost)
+    if isinstance(instance, (Report, Revision)):
+        if instance.post_id is not None:
+            return shard_for_related(instance, 'post', Post)
+        return shard_for_related(instance, 'comment', Comment)
+    return None
+
+
+def shard_for_related(instance, field_name, model):
+    if instance._meta.get_field(field_name).is_cached(instance):
+        return shard_for_instance(getattr(instance, field_name))
+    return locate(model, getattr(instance, f'{field_name}_id'))
+
+
+class ShardRouter:
+    """
+    Route posts, comments and reports to the shard of their subreddit; everything else,
+    including users and subreddits, stays on the default database.
+
+    Queries without an instance hint can't be routed and need an explicit `using()`,
+    see `shard_for_subreddit()`, `locate()` and `ShardedResults`.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded_model(model):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None:
+            return shard_for_instance(instance)
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name is not None and f'{app_label}.{model_name}' in SHARDED_MODELS:
+            return True
+        return db == DEFAULT_DB_ALIAS
+
+
+class ShardedQuerySet(models.QuerySet):
+
+    def create(self, **kwargs):
+        """
+        Create the object on the shard picked by the router from the instance itself.
+        """
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+
+ShardedManager = models.Manager.from_queryset(ShardedQuerySet)
+
+
+class ShardedResults:
+    """
+    A queryset evaluated on every shard, merged by (created_at, pk), newest first.
+    Each shard streams its rows in order, so the merge never sorts the combined result.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset.order_by('-created_at', '-pk')
+
+    def __iter__(self):
+        return self.iterator()
+
+    def iterator(self, chunk_size=2000):
+        streams = [self.queryset.using(alias).iterator(chunk_size=chunk_size) for alias in shards()]
+        return heapq.merge(*streams, key=lambda obj: (obj.created_at, obj.pk), reverse=True)
+
+    def in_bulk(self, id_list):
+        objs = {}
+        for alias in shards():
+            objs.update(self.queryset.using(alias).in_bulk(id_list))
+        return objs
+
+
+def sharded(queryset):
+    """
+    Return `queryset` itself when there's a single shard, otherwise its scatter-gather results.
+    """
+    if not is_sharded():
+        return queryset
+    return ShardedResults(queryset)
+
+
+_id_blocks = {}
+_id_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    # Forked workers must not hand out ids from blocks reserved by their parent.
+    os.register_at_fork(after_in_child=_id_blocks.clear)
+
+
+def allocate_id(model):
+    """
+    Return a primary key unique across all shards.
+    Ids are handed out from blocks reserved on a sequence in the default database.
+    """
+    label = model._meta.label_lower
+    with _id_lock:
+        block = _id_blocks.get(label)
+        if block is None or block[0] >= block[1]:
+            block = _id_blocks[label] = list(reserve_id_block(model))
+        pk = block[0]
+        block[0] += 1
+    return pk
+
+
+def reserve_id_block(model):
+    from .models import ShardSequence
+
+    size = getattr(settings, 'SHARD_ID_BLOCK_SIZE', 100)
+    label = model._meta.label_lower
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        sequence = ShardSequence.objects.select_for_update().filter(name=label).first()
+        if sequence is None:
+            start = max_id(model) + 1
+            ShardSequence.objects.create(name=label, next_value=start + size)
+        else:
+            start = sequence.next_value
+            ShardSequence.objects.filter(name=label).update(next_value=F('next_value') + size)
+    return start, start + size
+
+
+def max_id(model):
+    ids = [model._default_manager.using(alias).aggregate(max_id=Max('pk'))['max_id'] or 0 for alias in shards()]
+    return max(ids)
+
+
+def shard_streams(kind, queryset):
+    """
+    Split `queryset` into one stream per shard for `MergedCursorPagination`.
+    """
+    if not is_sharded():
+        return {kind: queryset}
+    return {f'{kind}@{alias}': queryset.using(alias) for alias in shards()}
+
+
+def copy_rows(queryset, target, batch_size=1000):
+    """
+    Copy the rows of `queryset` to the `target` shard in pk order, skipping rows already there.
+    Returns the pks of all rows in `queryset`.
+    """
+    from .bulk import bulk_insert_raw
+
+    model = queryset.model
+    target_manager = model._base_manager.using(target)
+    pks = []
+    last_pk = None
+    while True:
+        batch_queryset = queryset.order_by('pk')
+        if last_pk is not None:
+            batch_queryset = batch_queryset.filter(pk__gt=last_pk)
+        batch = list(batch_queryset[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        batch_pks = [obj.pk for obj in batch]
+        existing = set(target_manager.filter(pk__in=batch_pks).values_list('pk', flat=True))
+        bulk_insert_raw(model, [obj for obj in batch if obj.pk not in existing], using=target)
+        pks.extend(batch_pks)
+    return pks
+
+
+def move_rows(source, target, querysets, batch_size=1000, before_delete=None):
+    """
+    Move the rows selected by `querysets(alias)` from the `source` to the `target` shard.
+
+    `querysets` returns querysets in dependency order, parents first. Rows are copied, then
+    `before_delete()` runs (e.g. to switch the shard map), then rows written in the meantime
+    are copied again and the originals are deleted, children first. Returns the number of
+    moved rows per model.
+    """
+    from .activity import activity_rollups
+    from .cache import object_cache
+
+    for queryset in querysets(source):
+        copy_rows(queryset, target, batch_size)
+    if before_delete is not None:
+        before_delete()
+
+    moved = {}
+    for queryset in querysets(source):
+        pks = copy_rows(queryset, target, batch_size)
+        moved[queryset.model] = pks
+    with transaction.atomic(using=source), activity_rollups.paused():
+        for queryset in reversed(querysets(source)):
+            queryset.delete()
+
+    for model, pks in moved.items():
+        forget_locations(model, pks)
+        object_cache.delete_many(model, pks)
+    return {model._meta.label_lower: len(pks) for model, pks in moved.items()}
+
+
+def subreddit_querysets(subreddit_pk):
+    from .models import ArchivedComment, ArchivedPost, Comment, Post, PostViewers, Report, Revision
+
+    def querysets(alias):
+        return [
+            Post.objects.using(alias).filter(subreddit=subreddit_pk),
+            PostViewers.objects.using(alias).filter(post__subreddit=subreddit_pk),
+            Comment.objects.using(alias).filter(post__subreddit=subreddit_pk),
+            Report.objects.using(alias).filter(
+                models.Q(post__subreddit=subreddit_pk) | models.Q(comment__post__subreddit=subreddit_pk)
+            ),
+            Revision.objects.using(alias).filter(
+                models.Q(post__subreddit=subreddit_pk) | models.Q(comment__post__subreddit=subreddit_pk)
+            ),
+            ArchivedPost.objects.using(alias).filter(subreddit=subreddit_pk),
+            ArchivedComment.objects.using(alias).filter(post__subreddit=subreddit_pk),
+        ]
+    return querysets
+
+
+def post_querysets(post_pk):
+    from .models import Comment, Post, PostViewers, Report, Revision
+
+    def querysets(alias):
+        return [
+            Post.objects.using(alias).filter(pk=post_pk),
+            PostViewers.objects.using(alias).filter(post=post_pk),
+            Comment.objects.using(alias).filter(post=post_pk),
+            Report.objects.using(alias).filter(models.Q(post=post_pk) | models.Q(comment__post=post_pk)),
+            Revision.objects.using(alias).filter(models.Q(post=post_pk) | models.Q(comment__post=post_pk)),
+        ]
+    return querysets
+
+
+def move_subreddit(subreddit, target, batch_size=1000):
+    """
+    Move all posts, comments and reports of the subreddit to the `target` shard and point the
+    shard map at it. Writes to the subreddit made during the move are copied in a second pass.
+    """
+    from .models import Subreddit
+
+    source = shard_for_subreddit(subreddit.pk)
+    if source == target:
+        return {}
+
+    def switch():
+        Subreddit.objects.filter(pk=subreddit.pk).update(shard=target)
+
+    return move_rows(source, target, subreddit_querysets(subreddit.pk), batch_size, before_delete=switch)
+
+
+def relocate_post(post):
+    """
+    Move the post with its comments and reports to the shard of its subreddit, if it isn't there.
+    """
+    target = shard_for_subreddit(post.subreddit_id)
+    if post._state.db == target:
+        return
+    move_rows(post._state.db, target, post_querysets(post.pk))
+    post._state.db = target
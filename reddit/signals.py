@@ -0,0 +1,129 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .activity import activity_rollups
+from .cache import object_cache
+from . import querycache
+from .models import ArchivedComment, ArchivedPost, Comment, Post, Report, Revision, Subreddit
+from .notifications import notification_queue
+from .pagination import forget_count
+from .sharding import allocate_id, is_sharded, placement, shard_for_subreddit, shards
+from .spam import spam_detector
+
+
+@receiver(connection_created)
+def watch_query_cache_writes(sender, connection, **kwargs):
+    querycache.install(connection)
+
+
+@receiver(post_save, sender=Subreddit)
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Subreddit)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def invalidate_cached_object(sender, instance, **kwargs):
+    object_cache.delete(sender, instance.pk)
+
+
+@receiver(m2m_changed, sender=Subreddit.moderator.through)
+def invalidate_cached_subreddit_moderators(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove'):
+            object_cache.delete_many(Subreddit, pk_set)
+        elif action == 'pre_clear':
+            object_cache.delete_many(Subreddit, instance.moderates_subreddit.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        object_cache.delete(Subreddit, instance.pk)
+
+
+@receiver(pre_save, sender=Subreddit)
+def place_subreddit(sender, instance, **kwargs):
+    if not instance.shard:
+        instance.shard = placement(instance.name)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+@receiver(pre_save, sender=Report)
+@receiver(pre_save, sender=Revision)
+def assign_sharded_id(sender, instance, raw, **kwargs):
+    if instance.pk is None and not raw and is_sharded():
+        instance.pk = allocate_id(sender)
+
+
+@receiver(pre_delete, sender=Subreddit)
+def delete_sharded_posts(sender, instance, **kwargs):
+    alias = shard_for_subreddit(instance.pk)
+    if alias != instance._state.db:
+        Post.objects.using(alias).filter(subreddit=instance.pk).delete()
+        ArchivedPost.objects.using(alias).filter(subreddit=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=User)
+def clear_sharded_authors(sender, instance, **kwargs):
+    for alias in shards():
+        if alias == instance._state.db:
+            continue
+        Post.objects.using(alias).filter(author=instance.pk).update(author=None)
+        Comment.objects.using(alias).filter(author=instance.pk).update(author=None)
+        ArchivedPost.objects.using(alias).filter(author=instance.pk).update(author=None)
+        ArchivedComment.objects.using(alias).filter(author=instance.pk).update(author=None)
+        Report.objects.using(alias).filter(reporter=instance.pk).delete()
+        Revision.objects.using(alias).filter(editor=instance.pk).update(editor=None)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def record_fingerprint(sender, instance, created, raw, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'text' not in update_fields):
+        return
+    spam_detector.record(sender._meta.model_name, instance, created=created)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def forget_fingerprint(sender, instance, **kwargs):
+    spam_detector.forget(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def count_created_activity(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        activity_rollups.record(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post_subreddit(sender, instance, **kwargs):
+    activity_rollups.deleting[instance.pk] = instance.subreddit_id
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def count_deleted_activity(sender, instance, **kwargs):
+    activity_rollups.record(instance, deleted=True)
+    if sender is Post:
+        activity_rollups.deleting.pop(instance.pk, None)
+
+
+@receiver(post_save, sender=Comment)
+def queue_notifications(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        notification_queue.record(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def forget_subreddit_post_count(sender, instance, created=True, raw=False, **kwargs):
+    if created and not raw:
+        forget_count(Post, 'subreddit', instance.subreddit_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def forget_post_comment_count(sender, instance, created=True, raw=False, **kwargs):
+    if created and not raw:
+        forget_count(Comment, 'post', instance.post_id)
@@ -0,0 +1,144 @@
+import hashlib
+import re
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import SimHashBucket
+
+
+BITS = 64
+MASK = (1 << BITS) - 1
+BAND_SHIFT = 32
+
+WORD = re.compile(r'\w+')
+
+
+def features(text):
+    """
+    Return the lowercased words of `text`. Case, punctuation and spacing don't change them.
+    """
+    return WORD.findall(text.lower())
+
+
+@lru_cache(maxsize=65536)
+def feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+
+
+def simhash(text):
+    """
+    Return the 64-bit SimHash of `text`: every bit is set when it's set in the hashes of
+    most of its features. Similar texts share most features, so their hashes differ in few bits.
+    """
+    hashes = [format(feature_hash(feature), '064b') for feature in features(text)]
+    half = len(hashes) / 2
+    value = 0
+    # Columns of the binary hashes are the bits of all features at one position, most significant first.
+    for column in zip(*hashes):
+        value = (value << 1) | (column.count('1') > half)
+    return value
+
+
+def buckets(value, count):
+    """
+    Split the hash into `count` bands of nearly equal width, returned as `band number << 32 | bits`.
+    Hashes differing in fewer than `count` bits have at least one band in common.
+    """
+    width, wider = divmod(BITS, count)
+    result = []
+    for band in range(count):
+        bits = width + (band < wider)
+        result.append(band << BAND_SHIFT | (value & ((1 << bits) - 1)))
+        value >>= bits
+    return result
+
+
+def distance(first, second):
+    return ((first ^ second) & MASK).bit_count()
+
+
+def to_signed(value):
+    """
+    Return the 64-bit hash as a signed integer, as stored in a `BigIntegerField`.
+    """
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+
+class NearDuplicateDetector:
+    """
+    Finds recent posts and comments whose text is a near-duplicate of a new text.
+
+    The SimHash of every post and comment is stored on write in `max_distance + 1` LSH
+    buckets, one per band of the hash. Texts within `max_distance` bits share at least one
+    band, so candidates are read with one indexed IN lookup and compared exactly. Only content
+    of the last `window` seconds is compared, older buckets are pruned once per window.
+    Texts with fewer than `min_words` words aren't fingerprinted: short replies repeat legitimately.
+    """
+
+    def __init__(self, max_distance=6, window=3600, min_words=8, action='flag', enabled=True):
+        self.max_distance = max_distance
+        self.window = window
+        self.min_words = min_words
+        self.action = action
+        self.enabled = enabled
+        self.last_prune = time.monotonic()
+
+    def fingerprint(self, text):
+        """
+        Return the SimHash of `text`, or None when it's too short to compare.
+        """
+        if not self.enabled or not text or len(WORD.findall(text)) < self.min_words:
+            return None
+        return simhash(text)
+
+    def find(self, text):
+        """
+        Return `(kind, object_id)` of recent content within `max_distance` bits of `text`.
+        """
+        value = self.fingerprint(text)
+        if value is None:
+            return []
+        since = timezone.now() - timedelta(seconds=self.window)
+        candidates = SimHashBucket.objects.filter(
+            bucket__in=buckets(value, self.max_distance + 1), created_at__gte=since
+        ).values_list('simhash', 'kind', 'object_id')
+        return sorted({
+            (kind, object_id) for candidate, kind, object_id in candidates
+            if distance(candidate, value) <= self.max_distance
+        })
+
+    def record(self, kind, obj, created=True):
+        """
+        Store the fingerprint of the text of a saved post or comment.
+        """
+        if not created:
+            self.forget(kind, obj.pk)
+        value = self.fingerprint(obj.text)
+        if value is None:
+            return
+        SimHashBucket.objects.bulk_create([
+            SimHashBucket(bucket=bucket, simhash=to_signed(value), kind=kind, object_id=obj.pk, author_id=obj.author_id)
+            for bucket in buckets(value, self.max_distance + 1)
+        ])
+        self.prune()
+
+    def forget(self, kind, pk):
+        SimHashBucket.objects.filter(kind=kind, object_id=pk).delete()
+
+    def prune(self):
+        if time.monotonic() - self.last_prune < self.window:
+            return
+        self.last_prune = time.monotonic()
+        SimHashBucket.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=self.window)).delete()
+
+
+spam_detector = NearDuplicateDetector(
+    max_distance=getattr(settings, 'SPAM_MAX_DISTANCE', 6),
+    window=getattr(settings, 'SPAM_WINDOW', 3600),
+    min_words=getattr(settings, 'SPAM_MIN_WORDS', 8),
+    action=getattr(settings, 'SPAM_ACTION', 'flag'),
+)
@@ -1,14 +1,59 @@
+import gc
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import cbor2
+import msgpack
 from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
-
-from .models import Comment, Post, Subreddit
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from reddit_project import gunicorn_conf
+
+from .activity import activity_rollups
+from .cache import ObjectCache, object_cache
+from .checks import check_datetime_format, check_shared_caches
+from .compression import GzipCodec, negotiate
+from .estimates import bounded_count
+from .hyperloglog import HyperLogLog
+from .notifications import notification_queue
+from .idempotency import idempotency_store
+from .models import (
+    ActivityRollup, ArchivedPost, Comment, Notification, NotificationInbox, Post, Report, SimHashBucket, Subreddit
+)
+from .pagination import EstimatedCountPagination, MergedCursorPagination
+from .profiling import write_profile
+from .querycache import query_cache
+from .queryplans import explain, plan_problems, touches
+from . import revisions
+from .revisions import storage_overhead
+from .spam import buckets, distance, simhash, spam_detector
 from .serializers import (
     CommentDetailSerializer,
     PostSerializer, PostDetailSerializer, PostCommentsSerializer,
-    SubredditSerializer, SubredditDetailSerializer, SubredditPostsSerializer
+    SubredditSerializer, SubredditDetailSerializer, SubredditPostsSerializer,
+    UserCommentsSerializer, UserPostsSerializer
     )
+from .sharding import copy_rows
+from .viewcounts import view_counter
+from .views import PostDetailView
 
 
 class SubredditsTest(APITestCase):
@@ -542,3 +587,2378 @@ class CommentDetailsTest(APITestCase):
         response = self.client.delete(self.url)
 
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class UserActivityTest(APITestCase):
+    """
+    Test 'user_posts', 'user_comments' and 'user_overview' API.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('username1', 'password')
+        self.other_user = User.objects.create_user('username2', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.other_user)
+
+        now = timezone.now()
+        self.items = []
+        for i in range(6):
+            if i % 2:
+                obj = Comment.objects.create(text=f'Comment {i}', post=self.post, author=self.user)
+            else:
+                obj = Post.objects.create(title=f'Post {i}', text='Text', subreddit=self.subreddit, author=self.user)
+            type(obj).objects.filter(pk=obj.pk).update(created_at=now - timedelta(minutes=i))
+            self.items.append(obj)
+        Comment.objects.create(text='Other comment', post=self.post, author=self.other_user)
+
+    def test_get_user_posts(self):
+        """
+        Ensure we can view all Posts of the user, newest first.
+        """
+        posts = Post.objects.filter(author=self.user).order_by('-created_at', '-id')
+        serializer = UserPostsSerializer(posts, many=True)
+
+        response = self.client.get(reverse('user_posts', kwargs={'pk': self.user.pk}), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], serializer.data)
+
+    def test_get_user_comments(self):
+        """
+        Ensure we can view all Comments of the user, newest first.
+        """
+        comments = Comment.objects.filter(author=self.user).order_by('-created_at', '-id')
+        serializer = UserCommentsSerializer(comments, many=True)
+
+        response = self.client.get(reverse('user_comments', kwargs={'pk': self.user.pk}), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], serializer.data)
+
+    def test_get_user_overview_pages(self):
+        """
+        Ensure the overview merges Posts and Comments by creation date across pages.
+        """
+        url = reverse('user_overview', kwargs={'pk': self.user.pk})
+        expected = [(type(obj).__name__.lower(), obj.pk) for obj in self.items]
+
+        seen = []
+        with mock.patch.object(MergedCursorPagination, 'page_size', 4):
+            while url:
+                response = self.client.get(url, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                seen.extend((item['type'], item['data']['id']) for item in response.data['results'])
+                url = response.data['next']
+
+        self.assertEqual(seen, expected)
+
+    def test_get_user_overview_invalid_cursor(self):
+        """
+        Ensure a malformed overview cursor is rejected.
+        """
+        url = reverse('user_overview', kwargs={'pk': self.user.pk})
+
+        response = self.client.get(url, {'cursor': 'not-a-cursor'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BinaryRenderersTest(APITestCase):
+    """
+    Test MessagePack and CBOR content negotiation.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('username', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user)
+        Comment.objects.create(text='Comment 1', post=self.post, author=self.user)
+        Comment.objects.create(text='Comment 2', post=self.post, author=self.user)
+        self.formats = {
+            'application/msgpack': lambda content: msgpack.unpackb(content, timestamp=3),
+            'application/cbor': cbor2.loads,
+        }
+
+    def test_get_post_comments_streamed(self):
+        """
+        Ensure list endpoints stream the negotiated binary format.
+        """
+        serializer = PostCommentsSerializer(Comment.objects.all(), many=True)
+        url = reverse('post_comments', kwargs={'pk': self.post.pk})
+
+        for media_type, loads in self.formats.items():
+            response = self.client.get(url, HTTP_ACCEPT=media_type)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], media_type)
+            self.assertTrue(response.streaming)
+            self.assertEqual(loads(b''.join(response.streaming_content)), [dict(item) for item in serializer.data])
+
+    def test_get_post_details(self):
+        """
+        Ensure detail endpoints render the negotiated binary format with native datetimes.
+        """
+        url = reverse('post_detail', kwargs={'pk': self.post.pk})
+
+        for media_type, loads in self.formats.items():
+            response = self.client.get(url, HTTP_ACCEPT=media_type)
+            data = loads(response.content)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(data['title'], self.post.title)
+            self.assertEqual(data['created_at'], self.post.created_at)
+
+    def test_add_post_binary(self):
+        """
+        Ensure we can create a Post from a binary request body.
+        """
+        self.client.force_authenticate(self.user)
+        data = {'title': 'Post title test', 'text': 'Post text test', 'subreddit': self.subreddit.pk}
+        bodies = {
+            'application/msgpack': msgpack.packb(data),
+            'application/cbor': cbor2.dumps(data),
+        }
+
+        for media_type, body in bodies.items():
+            response = self.client.post(reverse('posts'), data=body, content_type=media_type, HTTP_ACCEPT=media_type)
+
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.formats[media_type](response.content)['title'], data['title'])
+
+    def test_add_post_malformed_body(self):
+        """
+        Ensure a malformed binary body is rejected.
+        """
+        self.client.force_authenticate(self.user)
+
+        response = self.client.post(reverse('posts'), data=b'\xc1', content_type='application/msgpack')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_non_utc_time_zone_rejected(self):
+        """
+        Ensure the system checks reject another time zone, as datetimes are rendered in UTC.
+        """
+        with override_settings(TIME_ZONE='Europe/Warsaw'):
+            errors = check_datetime_format(None)
+
+        self.assertEqual([error.id for error in errors], ['reddit.E002'])
+        self.assertEqual(check_datetime_format(None), [])
+
+
+class CompressionTest(APITestCase):
+    """
+    Test response compression.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('username', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user)
+        for i in range(20):
+            Post.objects.create(title=f'Post title {i}', text='Post text ' * 20, subreddit=self.subreddit, author=self.user)
+        self.url = reverse('posts')
+        caches['compression'].clear()
+
+    def test_get_posts_gzip(self):
+        """
+        Ensure large responses are gzipped when the client accepts it.
+        """
+        serializer = PostSerializer(Post.objects.all(), many=True)
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), serializer.data)
+
+    def test_get_small_response_uncompressed(self):
+        """
+        Ensure bodies below the size threshold are sent as is.
+        """
+        response = self.client.get(reverse('subreddits'), HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_get_posts_identity(self):
+        """
+        Ensure responses aren't compressed for clients that don't accept it.
+        """
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_get_posts_streamed_gzip(self):
+        """
+        Ensure streaming responses are compressed chunk by chunk.
+        """
+        response = self.client.get(self.url, HTTP_ACCEPT='application/msgpack', HTTP_ACCEPT_ENCODING='gzip')
+        data = msgpack.unpackb(gzip.decompress(b''.join(response.streaming_content)), timestamp=3)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(data), 20)
+
+    def test_repeated_response_not_recompressed(self):
+        """
+        Ensure an identical response body is served from the compressed cache.
+        """
+        with mock.patch('reddit.compression.zlib.compressobj', wraps=zlib.compressobj) as compressobj:
+            first = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(compressobj.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+    def test_per_user_response_not_cached(self):
+        """
+        Ensure responses to requests with credentials are compressed without being cached.
+        """
+        token = Token.objects.create(user=self.user)
+
+        with mock.patch('reddit.compression.zlib.compressobj', wraps=zlib.compressobj) as compressobj:
+            for _ in range(2):
+                response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_AUTHORIZATION=f'Token {token.key}')
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        self.assertEqual(compressobj.call_count, 2)
+
+    def test_small_response_not_cached(self):
+        """
+        Ensure bodies below the cache threshold are compressed without being cached.
+        """
+        with override_settings(COMPRESSION_CACHE_MIN_LENGTH=10 ** 6):
+            with mock.patch('reddit.compression.zlib.compressobj', wraps=zlib.compressobj) as compressobj:
+                self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+                self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(compressobj.call_count, 2)
+
+    def test_negotiate(self):
+        """
+        Ensure Accept-Encoding q-values are honoured.
+        """
+        codecs = [GzipCodec()]
+
+        self.assertIs(negotiate('gzip, deflate', codecs), codecs[0])
+        self.assertIs(negotiate('*', codecs), codecs[0])
+        self.assertIsNone(negotiate('gzip;q=0', codecs))
+        self.assertIsNone(negotiate('', codecs))
+
+
+class ModerationTest(APITestCase):
+    """
+    Test 'post_report', 'comment_report', 'subreddit_modqueue' and 'subreddit_moderation' API.
+    """
+    def setUp(self):
+        self.user_subreddit_owner = User.objects.create_user('username1', 'password')
+        self.user_subreddit_moderator = User.objects.create_user('username2', 'password')
+        self.user_author = User.objects.create_user('username3', 'password')
+        self.user_no_role = User.objects.create_user('username4', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit 1', description='Description', owner=self.user_subreddit_owner)
+        self.subreddit.moderator.add(self.user_subreddit_moderator)
+        self.other_subreddit = Subreddit.objects.create(name='Subreddit 2', description='Description', owner=self.user_no_role)
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', text='Text', subreddit=self.subreddit, author=self.user_author)
+            for i in range(3)
+        ]
+        self.other_post = Post.objects.create(title='Other', text='Text', subreddit=self.other_subreddit, author=self.user_author)
+        self.comment = Comment.objects.create(text='Comment', post=self.posts[0], author=self.user_author)
+        self.url = reverse('subreddit_moderation', kwargs={'pk': self.subreddit.pk})
+
+    def test_report_post(self):
+        """
+        Ensure users can report a Post once and it shows up in the moderation queue.
+        """
+        self.client.force_authenticate(self.user_no_role)
+        url = reverse('post_report', kwargs={'pk': self.posts[1].pk})
+
+        response = self.client.post(url, data={'reason': 'Spam'}, format='json')
+        duplicate = self.client.post(url, data={'reason': 'Spam'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(duplicate.status_code, status.HTTP_400_BAD_REQUEST)
+        self.posts[1].refresh_from_db()
+        self.assertEqual(self.posts[1].report_count, 1)
+
+    def test_report_post_concurrently(self):
+        """
+        Ensure a report saved concurrently by the same user is rejected, not an error.
+        """
+        Report.objects.create(reporter=self.user_no_role, post=self.posts[1], reason='Spam')
+        self.client.force_authenticate(self.user_no_role)
+        url = reverse('post_report', kwargs={'pk': self.posts[1].pk})
+
+        # The first report isn't visible yet when the duplicate is checked.
+        with mock.patch('django.db.models.query.QuerySet.exists', return_value=False):
+            response = self.client.post(url, data={'reason': 'Spam'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.posts[1].refresh_from_db()
+        self.assertEqual(self.posts[1].report_count, 0)
+
+    def test_get_modqueue(self):
+        """
+        Ensure moderators can view reported Posts and Comments with their report counts.
+        """
+        Post.objects.filter(pk=self.posts[2].pk).update(report_count=2)
+        Comment.objects.filter(pk=self.comment.pk).update(report_count=1)
+        Post.objects.filter(pk=self.other_post.pk).update(report_count=5)
+        self.client.force_authenticate(self.user_subreddit_moderator)
+
+        response = self.client.get(reverse('subreddit_modqueue', kwargs={'pk': self.subreddit.pk}), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        items = {(item['type'], item['data']['id']): item['data']['report_count'] for item in response.data['results']}
+        self.assertEqual(items, {('post', self.posts[2].pk): 2, ('comment', self.comment.pk): 1})
+
+    def test_get_modqueue_other_user(self):
+        """
+        Ensure other users can't view the moderation queue.
+        """
+        self.client.force_authenticate(self.user_no_role)
+
+        response = self.client.get(reverse('subreddit_modqueue', kwargs={'pk': self.subreddit.pk}), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_remove(self):
+        """
+        Ensure moderators can remove many Posts with one UPDATE, ignoring ids from other subreddits.
+        """
+        self.client.force_authenticate(self.user_subreddit_moderator)
+        ids = [post.pk for post in self.posts[:2]] + [self.other_post.pk]
+
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, data={'action': 'remove', 'posts': ids}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'posts': 2, 'comments': 0})
+        self.assertEqual(set(Post.objects.filter(is_removed=False).values_list('pk', flat=True)), {self.posts[2].pk, self.other_post.pk})
+        self.assertEqual(self.client.get(reverse('post_detail', kwargs={'pk': self.posts[0].pk})).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_approve(self):
+        """
+        Ensure approving clears reports and restores removed content.
+        """
+        Post.objects.filter(pk=self.posts[0].pk).update(report_count=3, is_removed=True)
+        self.client.force_authenticate(self.user_subreddit_owner)
+
+        response = self.client.post(self.url, data={'action': 'approve', 'posts': [self.posts[0].pk]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.posts[0].refresh_from_db()
+        self.assertEqual((self.posts[0].report_count, self.posts[0].is_removed), (0, False))
+
+    def test_report_after_approve(self):
+        """
+        Ensure approved Posts can be reported again by users who reported them before.
+        """
+        url = reverse('post_report', kwargs={'pk': self.posts[0].pk})
+        self.client.force_authenticate(self.user_no_role)
+        self.client.post(url, data={'reason': 'Spam'}, format='json')
+        self.client.force_authenticate(self.user_subreddit_owner)
+        self.client.post(self.url, data={'action': 'approve', 'posts': [self.posts[0].pk]}, format='json')
+        self.client.force_authenticate(self.user_no_role)
+
+        response = self.client.post(url, data={'reason': 'Spam again'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].report_count, 1)
+        self.assertEqual(Report.objects.filter(post=self.posts[0]).count(), 1)
+
+    def test_bulk_lock(self):
+        """
+        Ensure locked Posts reject new comments and edits by their author.
+        """
+        self.client.force_authenticate(self.user_subreddit_owner)
+        self.client.post(self.url, data={'action': 'lock', 'posts': [self.posts[0].pk]}, format='json')
+        self.client.force_authenticate(self.user_author)
+
+        comment_response = self.client.post(reverse('post_comments', kwargs={'pk': self.posts[0].pk}), data={'text': 'Text'}, format='json')
+        edit_response = self.client.put(reverse('post_detail', kwargs={'pk': self.posts[0].pk}), data={'title': 'Edit'}, format='json')
+
+        self.assertEqual(comment_response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(edit_response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_remove_user_content(self):
+        """
+        Ensure all content of a user in the subreddit can be removed at once.
+        """
+        self.client.force_authenticate(self.user_subreddit_owner)
+
+        response = self.client.post(self.url, data={'action': 'remove_user_content', 'user': self.user_author.pk}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'posts': 3, 'comments': 1})
+        self.assertFalse(Post.objects.get(pk=self.other_post.pk).is_removed)
+
+    def test_bulk_action_other_user(self):
+        """
+        Ensure other users can't apply moderation actions.
+        """
+        self.client.force_authenticate(self.user_no_role)
+
+        response = self.client.post(self.url, data={'action': 'remove', 'posts': [self.posts[0].pk]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_action_unauthorized(self):
+        """
+        Ensure we can't apply moderation actions without authorization.
+        """
+        response = self.client.post(self.url, data={'action': 'remove', 'posts': [self.posts[0].pk]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class DetailCacheTest(APITestCase):
+    """
+    Test the read-through cache of 'subreddit_detail', 'post_detail' and 'comment_detail' API.
+    """
+    def setUp(self):
+        self.user_subreddit_owner = User.objects.create_user('username1', 'password')
+        self.user_post_author = User.objects.create_user('username2', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user_subreddit_owner)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_post_author)
+        self.comment = Comment.objects.create(text='Comment text', post=self.post, author=self.user_post_author)
+        self.post_url = reverse('post_detail', kwargs={'pk': self.post.pk})
+        view_counter.reset()
+
+    def test_get_details_cached(self):
+        """
+        Ensure repeated detail reads don't hit the database.
+        """
+        urls = [
+            reverse('subreddit_detail', kwargs={'pk': self.subreddit.pk}),
+            self.post_url,
+            reverse('comment_detail', kwargs={'pk': self.comment.pk}),
+        ]
+        for url in urls:
+            first = self.client.get(url, format='json')
+
+            with self.assertNumQueries(0):
+                second = self.client.get(url, format='json')
+
+            self.assertEqual(second.status_code, status.HTTP_200_OK)
+            self.assertEqual(first.data, second.data)
+
+    def test_edit_post_writes_through(self):
+        """
+        Ensure edits through the detail view update the cached representation.
+        """
+        self.client.get(self.post_url, format='json')
+        self.client.force_authenticate(self.user_post_author)
+        self.client.put(self.post_url, data={'title': 'Post title edit'}, format='json')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.post_url, format='json')
+
+        self.assertEqual(response.data['title'], 'Post title edit')
+
+    def test_delete_post_invalidates(self):
+        """
+        Ensure deleted objects aren't served from the cache.
+        """
+        self.client.get(self.post_url, format='json')
+        self.client.force_authenticate(self.user_post_author)
+        self.client.delete(self.post_url)
+
+        response = self.client.get(self.post_url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_remove_invalidates(self):
+        """
+        Ensure bulk moderation actions invalidate cached objects.
+        """
+        self.client.get(self.post_url, format='json')
+        self.client.force_authenticate(self.user_subreddit_owner)
+        url = reverse('subreddit_moderation', kwargs={'pk': self.subreddit.pk})
+        self.client.post(url, data={'action': 'remove_user_content', 'user': self.user_post_author.pk}, format='json')
+
+        response = self.client.get(self.post_url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_moderator_change_invalidates(self):
+        """
+        Ensure changing subreddit moderators invalidates the cached subreddit.
+        """
+        url = reverse('subreddit_detail', kwargs={'pk': self.subreddit.pk})
+        self.client.get(url, format='json')
+        self.subreddit.moderator.add(self.user_post_author)
+
+        response = self.client.get(url, format='json')
+
+        self.assertEqual(response.data['moderator'], [self.user_post_author.pk])
+
+    def test_view_counts_keep_cached_post(self):
+        """
+        Ensure flushed view counts are served with the cached post instead of evicting it.
+        """
+        with mock.patch.object(view_counter, 'flush_interval', 3600):
+            self.client.get(self.post_url, format='json')
+            view_counter.flush()
+
+            with self.assertNumQueries(0):
+                response = self.client.get(self.post_url, format='json')
+
+        self.assertEqual((response.data['view_count'], response.data['unique_viewers']), (1, 1))
+        self.assertEqual(response.data['title'], self.post.title)
+
+    def test_process_local_entries_expire_early(self):
+        """
+        Ensure entries of a process-local cache, which other processes' writes don't reach, expire early.
+        """
+        self.assertEqual(ObjectCache(alias='default', timeout=300, local_timeout=5).entry_timeout, 5)
+        self.assertEqual(ObjectCache(alias='shared', timeout=300, local_timeout=5).entry_timeout, 300)
+
+    def test_early_refresh_serves_stale_value_while_locked(self):
+        """
+        Ensure only the lock holder refreshes a hot key, the others keep the cached value.
+        """
+        cache_ = ObjectCache(timeout=60)
+        cache_.set(Post, self.post.pk, 'cached')
+        cache_.acquire(cache_.key(Post, self.post.pk))
+        loader = mock.Mock(return_value='fresh')
+
+        with mock.patch.object(ObjectCache, 'should_refresh', return_value=True):
+            value = cache_.get(Post, self.post.pk, loader)
+
+        self.assertEqual(value, 'cached')
+        loader.assert_not_called()
+        cache_.release(cache_.key(Post, self.post.pk))
+
+    def test_miss_waits_for_lock_holder(self):
+        """
+        Ensure concurrent misses wait for the loading request instead of loading again.
+        """
+        cache_ = ObjectCache(timeout=60)
+        object_cache.delete(Post, self.post.pk)
+        cache_.acquire(cache_.key(Post, self.post.pk))
+        loader = mock.Mock(return_value='fresh')
+
+        with mock.patch('reddit.cache.time.sleep', side_effect=lambda _: cache_.set(Post, self.post.pk, 'loaded')):
+            value = cache_.get(Post, self.post.pk, loader)
+
+        self.assertEqual(value, 'loaded')
+        loader.assert_not_called()
+        cache_.release(cache_.key(Post, self.post.pk))
+
+
+@override_settings(SHARD_DATABASES=['default', 'shard_1'])
+class ShardingTest(APITestCase):
+    """
+    Test routing of posts and comments to the shard of their subreddit.
+    """
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('username', 'password')
+        self.subreddit_default = Subreddit.objects.create(name='Subreddit 1', description='Description', owner=self.user, shard='default')
+        self.subreddit_shard = Subreddit.objects.create(name='Subreddit 2', description='Description', owner=self.user, shard='shard_1')
+        self.client.force_authenticate(self.user)
+
+    def add_post(self, subreddit, title):
+        url = reverse('subreddit_posts', kwargs={'pk': subreddit.pk})
+        self.client.post(url, data={'title': title, 'text': 'Text'}, format='json')
+        return Post.objects.using(subreddit.shard).get(title=title)
+
+    def test_admin_reads_shards(self):
+        """
+        Ensure the admin lists the posts of a shard picked with its filter, and opens posts on any shard.
+        """
+        post_default = self.add_post(self.subreddit_default, 'Post 1')
+        post_shard = self.add_post(self.subreddit_shard, 'Post 2')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:reddit_post_changelist')
+
+        self.assertEqual(list(self.client.get(url).context['cl'].result_list), [post_default])
+        self.assertEqual(list(self.client.get(url, {'shard': 'shard_1'}).context['cl'].result_list), [post_shard])
+        response = self.client.get(reverse('admin:reddit_post_change', args=[post_shard.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context['original'], post_shard)
+
+    def test_add_post_routed_to_shard(self):
+        """
+        Ensure posts and their comments are written to the shard of the subreddit.
+        """
+        post = self.add_post(self.subreddit_shard, 'Post')
+        url = reverse('post_comments', kwargs={'pk': post.pk})
+
+        response = self.client.post(url, data={'text': 'Comment'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertEqual(Comment.objects.using('shard_1').get().post_id, post.pk)
+
+    def test_get_post_details_and_comments(self):
+        """
+        Ensure detail and comment views find objects on their shard.
+        """
+        post = self.add_post(self.subreddit_shard, 'Post')
+        Comment.objects.create(text='Comment', post=post, author=self.user)
+
+        detail = self.client.get(reverse('post_detail', kwargs={'pk': post.pk}), format='json')
+        comments = self.client.get(reverse('post_comments', kwargs={'pk': post.pk}), format='json')
+
+        self.assertEqual(detail.status_code, status.HTTP_200_OK)
+        self.assertEqual(detail.data['title'], 'Post')
+        self.assertEqual([comment['text'] for comment in comments.data], ['Comment'])
+
+    def test_get_posts_scatter_gather(self):
+        """
+        Ensure the global listing merges all shards newest first, with ids unique across shards.
+        """
+        now = timezone.now()
+        posts = [self.add_post(subreddit, f'Post {i}') for i, subreddit in enumerate(
+            [self.subreddit_default, self.subreddit_shard, self.subreddit_default, self.subreddit_shard]
+        )]
+        for i, post in enumerate(posts):
+            Post.objects.using(post._state.db).filter(pk=post.pk).update(created_at=now - timedelta(minutes=i))
+
+        response = self.client.get(reverse('posts'), format='json')
+
+        self.assertEqual([post['title'] for post in response.data], ['Post 0', 'Post 1', 'Post 2', 'Post 3'])
+        self.assertEqual(len({post.pk for post in posts}), 4)
+
+    def test_rebalance_subreddit(self):
+        """
+        Ensure the rebalancing command moves posts and comments with their ids and timestamps.
+        """
+        post = self.add_post(self.subreddit_default, 'Post')
+        comment = Comment.objects.create(text='Comment', post=post, author=self.user)
+        self.client.get(reverse('post_detail', kwargs={'pk': post.pk}), format='json')
+
+        call_command('rebalance_shards', subreddit=self.subreddit_default.pk, target='shard_1', stdout=StringIO())
+
+        moved_post = Post.objects.using('shard_1').get(pk=post.pk)
+        self.assertEqual(moved_post.created_at, post.created_at)
+        self.assertEqual(Comment.objects.using('shard_1').get().pk, comment.pk)
+        self.assertFalse(Post.objects.using('default').exists())
+        response = self.client.get(reverse('post_detail', kwargs={'pk': post.pk}), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('subreddit_posts', kwargs={'pk': self.subreddit_default.pk}), format='json')
+        self.assertEqual(len(response.data), 1)
+
+    def test_subreddit_moved_by_other_process(self):
+        """
+        Ensure reads and writes follow a subreddit moved by another process, whose cache isn't shared.
+        """
+        post = self.add_post(self.subreddit_default, 'Post')
+        self.client.get(reverse('post_detail', kwargs={'pk': post.pk}), format='json')
+        self.client.get(reverse('subreddit_posts', kwargs={'pk': self.subreddit_default.pk}), format='json')
+        # Move the rows and switch the shard map without touching this process' cache.
+        copy_rows(Post.objects.using('default').filter(pk=post.pk), 'shard_1')
+        with activity_rollups.paused():
+            Post.objects.using('default').filter(pk=post.pk).delete()
+        Subreddit.objects.filter(pk=self.subreddit_default.pk).update(shard='shard_1')
+
+        detail = self.client.get(reverse('post_detail', kwargs={'pk': post.pk}), format='json')
+        posts = self.client.get(reverse('subreddit_posts', kwargs={'pk': self.subreddit_default.pk}), format='json')
+        self.add_post(Subreddit.objects.get(pk=self.subreddit_default.pk), 'New post')
+
+        self.assertEqual(detail.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['title'] for item in posts.data], ['Post'])
+        self.assertEqual(Post.objects.using('shard_1').filter(subreddit=self.subreddit_default).count(), 2)
+        self.assertFalse(Post.objects.using('default').exists())
+
+    def test_edit_post_subreddit_moves_post(self):
+        """
+        Ensure moving a post to a subreddit on another shard moves its rows too.
+        """
+        post = self.add_post(self.subreddit_default, 'Post')
+        Comment.objects.create(text='Comment', post=post, author=self.user)
+        url = reverse('post_detail', kwargs={'pk': post.pk})
+
+        response = self.client.put(url, data={'subreddit': self.subreddit_shard.pk}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Post.objects.using('shard_1').get().pk, post.pk)
+        self.assertEqual(Comment.objects.using('shard_1').count(), 1)
+        self.assertEqual(self.client.get(url, format='json').data['subreddit'], self.subreddit_shard.pk)
+
+
+class ArchiveTest(APITestCase):
+    """
+    Test the 'archive_posts' command and reads of archived posts and comments.
+    """
+    def setUp(self):
+        self.user_subreddit_owner = User.objects.create_user('username1', 'password')
+        self.user_post_author = User.objects.create_user('username2', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user_subreddit_owner)
+        self.post_old = Post.objects.create(title='Old post', text='Old text', subreddit=self.subreddit, author=self.user_post_author)
+        self.post_new = Post.objects.create(title='New post', text='New text', subreddit=self.subreddit, author=self.user_post_author)
+        self.comment_old = Comment.objects.create(text='Old comment', post=self.post_old, author=self.user_post_author)
+        long_ago = timezone.now() - timedelta(days=365)
+        Post.objects.filter(pk=self.post_old.pk).update(created_at=long_ago)
+        Comment.objects.filter(pk=self.comment_old.pk).update(created_at=long_ago)
+        call_command('archive_posts', older_than=180, stdout=StringIO())
+
+    def test_archive_moves_old_posts(self):
+        """
+        Ensure only old posts with their comments leave the hot tables.
+        """
+        self.assertFalse(Post.objects.filter(pk=self.post_old.pk).exists())
+        self.assertFalse(Comment.objects.filter(pk=self.comment_old.pk).exists())
+        self.assertTrue(Post.objects.filter(pk=self.post_new.pk).exists())
+        self.assertTrue(ArchivedPost.objects.filter(pk=self.post_old.pk).exists())
+
+    def test_archive_rerun(self):
+        """
+        Ensure running the command again has nothing left to archive.
+        """
+        out = StringIO()
+        call_command('archive_posts', older_than=180, stdout=out)
+
+        self.assertIn('archived 0 posts and 0 comments', out.getvalue())
+
+    def test_get_archived_post(self):
+        """
+        Ensure archived posts are still served by 'post_detail', read-only.
+        """
+        url = reverse('post_detail', kwargs={'pk': self.post_old.pk})
+
+        response = self.client.get(url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Old post')
+        self.assertTrue(response.data['is_locked'])
+
+        self.client.force_authenticate(self.user_post_author)
+        response = self.client.put(url, data={'title': 'Old post edit'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_get_archived_comments(self):
+        """
+        Ensure comments of archived posts are listed and served from the archive.
+        """
+        response = self.client.get(reverse('post_comments', kwargs={'pk': self.post_old.pk}), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([comment['text'] for comment in response.data], ['Old comment'])
+
+        response = self.client.get(reverse('comment_detail', kwargs={'pk': self.comment_old.pk}), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['text'], 'Old comment')
+
+    def test_post_comment_on_archived_post(self):
+        """
+        Ensure archived posts can't be commented on.
+        """
+        self.client.force_authenticate(self.user_post_author)
+        url = reverse('post_comments', kwargs={'pk': self.post_old.pk})
+
+        response = self.client.post(url, data={'text': 'New comment'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ServeTest(APITestCase):
+    """
+    Test the warm-up of the 'serve' command.
+    """
+    databases = {'default', 'shard_1'}
+
+    def test_warmup_profile(self):
+        """
+        Ensure every warm-up phase runs and is reported.
+        """
+        self.addCleanup(gc.unfreeze)
+        out = StringIO()
+
+        call_command('serve', warmup_only=True, stdout=out)
+
+        for phase in ('application', 'urls', 'serializers', 'databases', 'total'):
+            self.assertIn(phase, out.getvalue())
+
+    def test_gunicorn_warmup(self):
+        """
+        Ensure the gunicorn config warms up the preloaded application in the master and logs every phase.
+        """
+        self.addCleanup(gc.unfreeze)
+        server = mock.Mock()
+
+        with mock.patch('reddit.warmup.get_internal_wsgi_application') as load:
+            gunicorn_conf.when_ready(server)
+
+        self.assertTrue(gunicorn_conf.preload_app)
+        server.app.wsgi.assert_called_once_with()
+        load.assert_not_called()
+        logged = [call.args[1] for call in server.log.info.call_args_list]
+        self.assertEqual(logged, ['urls', 'api settings', 'serializers', 'databases', 'freeze heap'])
+
+    def test_invalid_addrport(self):
+        """
+        Ensure an address without a port is rejected.
+        """
+        with self.assertRaises(CommandError):
+            call_command('serve', '127.0.0.1', warmup_only=True, stdout=StringIO())
+
+
+class IdempotencyTest(APITestCase):
+    """
+    Test the 'Idempotency-Key' header on create endpoints.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user_subreddit_owner = User.objects.create_user('username1', 'password')
+        self.user_post_author = User.objects.create_user('username2', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user_subreddit_owner)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_post_author)
+        self.url = reverse('post_comments', kwargs={'pk': self.post.pk})
+        self.client.force_authenticate(self.user_post_author)
+
+    def test_retry_replays_response(self):
+        """
+        Ensure a retried create returns the first response without creating another object.
+        """
+        first = self.client.post(self.url, data={'text': 'Comment text'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        second = self.client.post(self.url, data={'text': 'Comment text'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_retry_on_other_worker(self):
+        """
+        Ensure a retry reaching another worker process, with its own local cache, replays the first response.
+        """
+        self.client.post(self.url, data={'text': 'Comment text'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        cache.clear()
+
+        response = self.client.post(self.url, data={'text': 'Comment text'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_process_local_cache_rejected(self):
+        """
+        Ensure the system checks reject a process-local cache for stored responses.
+        """
+        with override_settings(IDEMPOTENCY_CACHE_ALIAS='default'):
+            errors = check_shared_caches(None)
+
+        self.assertEqual([error.id for error in errors], ['reddit.E001'])
+        self.assertEqual(check_shared_caches(None), [])
+
+    def test_without_key_creates_again(self):
+        """
+        Ensure requests without the header aren't deduplicated.
+        """
+        self.client.post(self.url, data={'text': 'Comment text'}, format='json')
+        self.client.post(self.url, data={'text': 'Comment text'}, format='json')
+
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_key_reused_for_other_request(self):
+        """
+        Ensure a key can't be reused with different data.
+        """
+        self.client.post(self.url, data={'text': 'Comment text'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        response = self.client.post(self.url, data={'text': 'Other text'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_keys_scoped_per_user(self):
+        """
+        Ensure the same key sent by another user runs a new request.
+        """
+        self.client.post(self.url, data={'text': 'Comment text'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        self.client.force_authenticate(self.user_subreddit_owner)
+
+        response = self.client.post(self.url, data={'text': 'Comment text'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_failed_request_not_stored(self):
+        """
+        Ensure a request that failed validation runs again when it's retried.
+        """
+        response = self.client.post(self.url, data={}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.url, data={}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_request_in_progress(self):
+        """
+        Ensure a duplicate of a request still running is rejected instead of run concurrently.
+        """
+        key = idempotency_store.key(self.user_post_author.pk, 'key-1')
+        idempotency_store.acquire(key)
+        self.addCleanup(idempotency_store.release, key)
+
+        with mock.patch.object(idempotency_store, 'wait_timeout', 0.05):
+            response = self.client.post(self.url, data={'text': 'Comment text'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Comment.objects.count(), 0)
+
+
+class AdminTest(APITestCase):
+    """
+    Test the changelists of the admin site.
+    """
+    def setUp(self):
+        self.superuser = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.superuser)
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', text='Post text', subreddit=self.subreddit, author=self.superuser)
+            for i in range(5)
+        ]
+        for post in self.posts:
+            Comment.objects.create(text='Comment text ' * 20, post=post, author=self.superuser)
+        self.client.force_login(self.superuser)
+
+    def test_changelist_cursor_pages(self):
+        """
+        Ensure changelists are paged by cursor, newest first.
+        """
+        url = reverse('admin:reddit_post_changelist')
+
+        with mock.patch('reddit.admin.LargeTableAdmin.list_per_page', 2):
+            first = self.client.get(url)
+            second = self.client.get(url + first.context['cl'].next_page_url)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(first.context['cl'].result_list), self.posts[:-3:-1])
+        self.assertEqual(list(second.context['cl'].result_list), self.posts[-3:-5:-1])
+
+    def test_changelist_bounded_queries(self):
+        """
+        Ensure the number of queries of a changelist doesn't depend on the number of rows.
+        """
+        url = reverse('admin:reddit_comment_changelist')
+        self.client.get(url)
+
+        # The date hierarchy seeks the first and last date, then one query per day of the month.
+        with self.assertNumQueries(9):
+            self.client.get(url)
+
+        for post in self.posts:
+            Comment.objects.create(text='Comment text', post=post, author=self.superuser)
+
+        with self.assertNumQueries(9):
+            self.client.get(url)
+
+    def test_changelist_filtered_count(self):
+        """
+        Ensure filtered changelists are counted exactly below the limit.
+        """
+        Post.objects.filter(pk=self.posts[0].pk).update(is_locked=True)
+
+        response = self.client.get(reverse('admin:reddit_post_changelist'), {'is_locked__exact': '1'})
+
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertTrue(response.context['cl'].result_count_exact)
+
+
+class ViewCountTest(APITestCase):
+    """
+    Test the view counts of 'post_detail' API.
+    """
+    def setUp(self):
+        self.user_subreddit_owner = User.objects.create_user('username1', 'password')
+        self.user_post_author = User.objects.create_user('username2', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user_subreddit_owner)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_post_author)
+        self.url = reverse('post_detail', kwargs={'pk': self.post.pk})
+        view_counter.reset()
+        self.addCleanup(view_counter.reset)
+
+    def test_views_buffered(self):
+        """
+        Ensure views aren't written until the buffer is flushed.
+        """
+        with mock.patch.object(view_counter, 'flush_interval', 3600):
+            self.client.get(self.url, format='json')
+            self.client.get(self.url, format='json')
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 0)
+
+        self.assertEqual(view_counter.flush(), 1)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 2)
+
+    def test_unique_viewers(self):
+        """
+        Ensure repeated views of the same user count as one viewer, also across flushes.
+        """
+        with mock.patch.object(view_counter, 'flush_interval', 3600):
+            self.client.get(self.url, format='json')
+            self.client.force_authenticate(self.user_post_author)
+            self.client.get(self.url, format='json')
+            view_counter.flush()
+            self.client.get(self.url, format='json')
+            view_counter.flush()
+
+        response = self.client.get(self.url, format='json')
+
+        self.assertEqual(response.data['view_count'], 3)
+        self.assertEqual(response.data['unique_viewers'], 2)
+
+    def test_flush_interval(self):
+        """
+        Ensure buffered views are flushed by the first view after the flush interval.
+        """
+        with mock.patch.object(view_counter, 'flush_interval', 0):
+            self.client.get(self.url, format='json')
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 1)
+
+    def test_flush_limit(self):
+        """
+        Ensure a request writes the views of at most `flush_limit` posts, leaving the others due.
+        """
+        other = Post.objects.create(title='Other', text='Post text', subreddit=self.subreddit, author=self.user_post_author)
+        view_counter.record(other.pk, 'address:1')
+
+        with mock.patch.object(view_counter, 'flush_interval', 0), mock.patch.object(view_counter, 'flush_limit', 1):
+            self.client.get(self.url, format='json')
+            self.assertEqual(len(view_counter.views), 1)
+            self.client.get(self.url, format='json')
+
+        other.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual((other.view_count, self.post.view_count), (1, 2))
+        self.assertEqual(len(view_counter.views), 0)
+
+    def test_failed_write_buffered_again(self):
+        """
+        Ensure views that fail to be written don't fail the request and are written by a later flush.
+        """
+        with mock.patch.object(view_counter, 'flush_interval', 0):
+            with mock.patch.object(view_counter, 'write', side_effect=DatabaseError), self.assertLogs('reddit.viewcounts'):
+                response = self.client.get(self.url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            self.assertEqual(view_counter.flush(), 1)
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.view_count, self.post.unique_viewers), (1, 1))
+
+    def test_sketch_merge(self):
+        """
+        Ensure merged sketches estimate the distinct values of their union.
+        """
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(5000):
+            first.add(i)
+            second.add(i + 2500)
+
+        first.merge(second)
+
+        self.assertEqual(len(first.to_bytes()), 4096)
+        self.assertAlmostEqual(first.count(), 7500, delta=7500 * 0.05)
+
+
+class MultiGetTest(APITestCase):
+    """
+    Test the 'ids' parameter of 'posts' and 'subreddits' API.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('username1', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user)
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', text='Post text', subreddit=self.subreddit, author=self.user)
+            for i in range(3)
+        ]
+
+    def test_get_posts_by_ids(self):
+        """
+        Ensure we get the requested posts in the requested order with one query.
+        """
+        ids = [self.posts[2].pk, self.posts[0].pk, 9999]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('posts'), {'ids': ','.join(map(str, ids))}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post['id'] for post in response.data], ids[:2])
+
+    def test_get_subreddits_by_ids(self):
+        """
+        Ensure multi-get works on 'subreddits' API.
+        """
+        response = self.client.get(reverse('subreddits'), {'ids': str(self.subreddit.pk)}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([subreddit['id'] for subreddit in response.data], [self.subreddit.pk])
+
+    def test_invalid_ids(self):
+        """
+        Ensure malformed or too many ids are rejected.
+        """
+        for ids in ('a,b', '', ','.join(str(i) for i in range(101))):
+            response = self.client.get(reverse('posts'), {'ids': ids}, format='json')
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchTest(APITestCase):
+    """
+    Test 'batch' API.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('username1', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user)
+        self.url = reverse('batch')
+
+    def test_batch_get(self):
+        """
+        Ensure sub-requests are run in order and their results returned together.
+        """
+        data = {'requests': [
+            {'method': 'GET', 'path': reverse('post_detail', kwargs={'pk': self.post.pk})},
+            {'method': 'GET', 'path': f'subreddits/{self.subreddit.pk}/'},
+            {'method': 'GET', 'path': reverse('post_detail', kwargs={'pk': 9999})},
+            {'method': 'GET', 'path': '/admin/'},
+        ]}
+
+        response = self.client.post(self.url, data=data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['responses']
+        self.assertEqual([result['status'] for result in results], [200, 200, 404, 404])
+        self.assertEqual(results[0]['body']['title'], 'Post title')
+        self.assertEqual(results[1]['body']['name'], 'Subreddit')
+
+    def test_batch_shares_authentication(self):
+        """
+        Ensure sub-requests run as the user of the batch request.
+        """
+        data = {'requests': [
+            {'method': 'POST', 'path': reverse('post_comments', kwargs={'pk': self.post.pk}), 'body': {'text': 'Comment text'}},
+        ]}
+
+        response = self.client.post(self.url, data=data, format='json')
+        self.assertEqual(response.data['responses'][0]['status'], status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post(self.url, data=data, format='json')
+
+        self.assertEqual(response.data['responses'][0]['status'], status.HTTP_201_CREATED)
+        self.assertEqual(Comment.objects.get().author, self.user)
+
+    def test_batch_retry_with_idempotency_key(self):
+        """
+        Ensure a retried batch with an Idempotency-Key replays its creates instead of writing them twice.
+        """
+        url = reverse('post_comments', kwargs={'pk': self.post.pk})
+        data = {'requests': [
+            {'method': 'POST', 'path': url, 'body': {'text': 'First'}},
+            {'method': 'POST', 'path': url, 'body': {'text': 'Second'}},
+        ]}
+        self.client.force_authenticate(self.user)
+
+        first = self.client.post(self.url, data=data, format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+        second = self.client.post(self.url, data=data, format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+
+        self.assertEqual([result['status'] for result in second.data['responses']], [201, 201])
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(sorted(Comment.objects.values_list('text', flat=True)), ['First', 'Second'])
+
+    def test_batch_nested(self):
+        """
+        Ensure batch requests can't contain batch requests.
+        """
+        data = {'requests': [{'method': 'POST', 'path': self.url, 'body': {'requests': []}}]}
+
+        response = self.client.post(self.url, data=data, format='json')
+
+        self.assertEqual(response.data['responses'][0]['status'], status.HTTP_400_BAD_REQUEST)
+
+
+class ExpandTest(APITestCase):
+    """
+    Test the 'expand' parameter.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('username1', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user)
+        self.comment = Comment.objects.create(text='Comment text', post=self.post, author=self.user)
+
+    def test_expand_detail(self):
+        """
+        Ensure related objects are inlined, also nested ones.
+        """
+        url = reverse('comment_detail', kwargs={'pk': self.comment.pk})
+
+        response = self.client.get(url, {'expand': 'post.subreddit,post.author'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['post']['title'], 'Post title')
+        self.assertEqual(response.data['post']['subreddit']['name'], 'Subreddit')
+        self.assertEqual(response.data['post']['author'], {'id': self.user.pk, 'username': 'username1'})
+
+    def test_expand_list_batched(self):
+        """
+        Ensure the number of queries depends on the expanded relations, not on the number of rows.
+        """
+        url = reverse('posts')
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'expand': 'author,subreddit'}, format='json')
+        self.assertEqual(response.data[0]['subreddit']['name'], 'Subreddit')
+
+        other_user = User.objects.create_user('username2', 'password')
+        for i in range(5):
+            Post.objects.create(title=f'Post {i}', text='Post text', subreddit=self.subreddit, author=other_user)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'expand': 'author,subreddit'}, format='json')
+        self.assertEqual({post['author']['username'] for post in response.data}, {'username1', 'username2'})
+
+    def test_expand_nested_shared_parent(self):
+        """
+        Ensure nested relations are expanded for rows sharing the same related object.
+        """
+        Comment.objects.create(text='Other comment', post=self.post, author=self.user)
+        url = reverse('post_comments', kwargs={'pk': self.post.pk})
+
+        response = self.client.get(url, {'expand': 'post.author,post.subreddit'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        for comment in response.data:
+            self.assertEqual(comment['post']['author'], {'id': self.user.pk, 'username': 'username1'})
+            self.assertEqual(comment['post']['subreddit']['name'], 'Subreddit')
+
+    def test_expand_overview(self):
+        """
+        Ensure tagged items of 'user_overview' are expanded.
+        """
+        response = self.client.get(reverse('user_overview', kwargs={'pk': self.user.pk}), {'expand': 'post'}, format='json')
+
+        comment = next(item['data'] for item in response.data['results'] if item['type'] == 'comment')
+        self.assertEqual(comment['post']['title'], 'Post title')
+
+    def test_expand_invalid(self):
+        """
+        Ensure unknown relations and too deep paths are rejected.
+        """
+        for expand in ('text', 'post.subreddit.owner'):
+            response = self.client.get(reverse('posts'), {'expand': expand}, format='json')
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProfilingTest(APITestCase):
+    """
+    Test request profiling and the 'profiles' command.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.staff = User.objects.create_user('username1', 'password', is_staff=True)
+        self.user = User.objects.create_user('username2', 'password')
+
+    def test_profile_staff_request(self):
+        """
+        Ensure staff requests with the header are profiled and named after their route.
+        """
+        self.client.force_authenticate(self.staff)
+
+        with override_settings(PROFILING_DIR=self.directory, PROFILING_INTERVAL=0.0001):
+            response = self.client.get(reverse('posts'), format='json', HTTP_X_PROFILE='1')
+
+        self.assertEqual(os.listdir(self.directory), [response['X-Profile']])
+        self.assertTrue(response['X-Profile'].startswith('posts.'))
+
+    def test_profile_staff_token(self):
+        """
+        Ensure staff requests authenticated with a token are profiled.
+        """
+        token = Token.objects.create(user=self.staff)
+
+        with override_settings(PROFILING_DIR=self.directory, PROFILING_INTERVAL=0.0001):
+            response = self.client.get(reverse('posts'), format='json', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        self.assertEqual(os.listdir(self.directory), [response['X-Profile']])
+
+    def test_profile_ignored_for_other_users(self):
+        """
+        Ensure profiles requested by users who aren't staff are discarded.
+        """
+        self.client.force_authenticate(self.user)
+
+        with override_settings(PROFILING_DIR=self.directory):
+            response = self.client.get(reverse('posts'), {'profile': '1'}, format='json')
+
+        self.assertFalse(response.has_header('X-Profile'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_profile_not_sampled_for_anonymous_users(self):
+        """
+        Ensure the stack sampler isn't started for requests of anonymous users or invalid tokens.
+        """
+        with override_settings(PROFILING_DIR=self.directory), mock.patch('reddit.middleware.StackSampler') as sampler:
+            anonymous = self.client.get(reverse('posts'), format='json', HTTP_X_PROFILE='1')
+            invalid = self.client.get(reverse('posts'), format='json', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Token invalid')
+
+        self.assertEqual(anonymous.status_code, status.HTTP_200_OK)
+        self.assertEqual(invalid.status_code, status.HTTP_401_UNAUTHORIZED)
+        sampler.assert_not_called()
+
+    def test_merge_profiles(self):
+        """
+        Ensure profiles of both formats are merged per route.
+        """
+        write_profile(Counter({'main;view;query': 3, 'main;view': 1}), self.directory, 'posts')
+        write_profile(Counter({'main;view;query': 2}), self.directory, 'posts', 'speedscope')
+        write_profile(Counter({'main;other': 5}), self.directory, 'subreddits')
+
+        out = StringIO()
+        call_command('profiles', dir=self.directory, merge=True, route='posts', stdout=out)
+
+        self.assertEqual(out.getvalue().splitlines(), ['main;view;query 5', 'main;view 1'])
+
+        out = StringIO()
+        call_command('profiles', dir=self.directory, stdout=out)
+
+        self.assertEqual([line.split()[:2] for line in out.getvalue().splitlines()], [['posts', '2'], ['subreddits', '1']])
+
+
+class RevisionTest(APITestCase):
+    """
+    Test the edit history of posts and comments.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('username1', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user)
+        self.comment = Comment.objects.create(text='Comment text', post=self.post, author=self.user)
+        self.post_url = reverse('post_detail', kwargs={'pk': self.post.pk})
+        self.client.force_authenticate(self.user)
+
+    def edit_post(self, count):
+        texts = []
+        for i in range(count):
+            text = f'Post text, edit {i}: ' + 'long unchanged paragraph. ' * 10 + 'The end.'
+            self.client.patch(self.post_url, data={'text': text}, format='json')
+            texts.append(text)
+        return texts
+
+    def test_edit_records_revisions(self):
+        """
+        Ensure the first edit records the original version and the edit.
+        """
+        self.edit_post(1)
+
+        response = self.client.get(reverse('post_history', kwargs={'pk': self.post.pk}), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([revision['number'] for revision in response.data], [2, 1])
+        self.assertEqual(response.data[0]['editor'], self.user.pk)
+
+    def test_rebuild_versions(self):
+        """
+        Ensure every version is rebuilt from snapshots and diffs, in a bounded number of queries.
+        """
+        texts = ['Post text'] + self.edit_post(25)
+
+        for number, text in enumerate(texts, start=1):
+            url = reverse('post_revision', kwargs={'pk': self.post.pk, 'number': number})
+            with self.assertNumQueries(2):
+                response = self.client.get(url, format='json')
+
+            self.assertEqual(response.data['title'], 'Post title')
+            self.assertEqual(response.data['text'], text)
+
+        response = self.client.get(reverse('post_revision', kwargs={'pk': self.post.pk, 'number': 99}), format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_concurrent_edits(self):
+        """
+        Ensure an edit made after another one loaded the object is the base of the latter's revision.
+        """
+        get_object = PostDetailView.get_object
+
+        def get_stale_object(view):
+            obj = get_object(view)
+            # Another request edits the post after this one loaded it.
+            edited = Post.objects.get(pk=obj.pk)
+            edited.text = 'Concurrent text'
+            edited.save()
+            revisions.record(edited, {'title': 'Post title', 'text': 'Post text'})
+            return obj
+
+        with mock.patch.object(PostDetailView, 'get_object', get_stale_object):
+            self.client.patch(self.post_url, data={'text': 'Final text'}, format='json')
+
+        texts = [
+            self.client.get(reverse('post_revision', kwargs={'pk': self.post.pk, 'number': number}), format='json').data['text']
+            for number in (1, 2, 3)
+        ]
+        self.assertEqual(texts, ['Post text', 'Concurrent text', 'Final text'])
+
+    def test_unchanged_edit_not_recorded(self):
+        """
+        Ensure edits that don't change tracked fields don't create revisions.
+        """
+        self.client.patch(self.post_url, data={'title': 'Post title'}, format='json')
+
+        response = self.client.get(reverse('post_history', kwargs={'pk': self.post.pk}), format='json')
+
+        self.assertEqual(response.data, [])
+
+    def test_as_of(self):
+        """
+        Ensure the version at a given time is returned.
+        """
+        url = reverse('comment_as_of', kwargs={'pk': self.comment.pk})
+        created = timezone.now()
+        self.client.patch(reverse('comment_detail', kwargs={'pk': self.comment.pk}), data={'text': 'Edited'}, format='json')
+
+        before = self.client.get(url, {'at': created.isoformat()}, format='json')
+        after = self.client.get(url, {'at': timezone.now().isoformat()}, format='json')
+        invalid = self.client.get(url, {'at': 'yesterday'}, format='json')
+
+        self.assertEqual(before.data['text'], 'Comment text')
+        self.assertEqual(after.data['text'], 'Edited')
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_storage_overhead(self):
+        """
+        Ensure diffs take less space than full copies and the overhead is reported.
+        """
+        self.edit_post(20)
+
+        count, snapshots, stored, full = storage_overhead(Post, 'default')
+
+        self.assertEqual((count, snapshots), (21, 3))
+        self.assertLess(stored, full / 2)
+
+        out = StringIO()
+        call_command('revision_stats', stdout=out)
+        self.assertIn('21 revisions', out.getvalue())
+
+
+class ImportDumpTest(APITestCase):
+    """
+    Test the 'import_dump' command.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('username1', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.posts_path = os.path.join(self.directory, 'posts.ndjson')
+        records = [
+            {'id': 1000 + i, 'subreddit': 'Subreddit', 'author': 'username1', 'title': f'Post {i}', 'text': 'Text',
+             'created_at': '2015-01-01T00:00:00Z', 'updated_at': 1420156800}
+            for i in range(5)
+        ]
+        records.append({'id': 2000, 'subreddit': 'Unknown', 'author': 'username1', 'title': 'Lost',
+                        'created_at': '2015-01-01T00:00:00Z'})
+        with open(self.posts_path, 'w') as file:
+            file.write('\n'.join(json.dumps(record) for record in records) + '\nnot json\n')
+
+    def import_dump(self, *args, **options):
+        out = StringIO()
+        call_command('import_dump', *args, batch_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_posts(self):
+        """
+        Ensure posts keep their ids and timestamps, and unresolved or invalid rows are skipped.
+        """
+        out = self.import_dump('posts', self.posts_path)
+
+        self.assertIn('Imported 5 posts', out)
+        self.assertIn('1 invalid, 1 unknown subreddit', out)
+        post = Post.objects.get(pk=1002)
+        self.assertEqual((post.title, post.author, post.subreddit), ('Post 2', self.user, self.subreddit))
+        self.assertEqual(post.created_at.year, 2015)
+        self.assertEqual(post.updated_at.isoformat(), '2015-01-02T00:00:00+00:00')
+
+        new_post = Post.objects.create(title='New post', subreddit=self.subreddit, author=self.user)
+        self.assertGreater(new_post.pk, 1004)
+
+    def test_import_duplicate_ids(self):
+        """
+        Ensure rows repeating an id within a batch are skipped, keeping the first one.
+        """
+        path = os.path.join(self.directory, 'duplicates.ndjson')
+        records = [
+            {'id': 3000, 'subreddit': 'Subreddit', 'title': title, 'created_at': '2015-01-01T00:00:00Z'}
+            for title in ('First', 'Repeated')
+        ]
+        with open(path, 'w') as file:
+            file.write('\n'.join(json.dumps(record) for record in records) + '\n')
+
+        out = self.import_dump('posts', path)
+
+        self.assertIn('Imported 1 posts', out)
+        self.assertIn('1 duplicate', out)
+        self.assertEqual(Post.objects.get(pk=3000).title, 'First')
+
+    def test_import_comments_csv(self):
+        """
+        Ensure comments are read from CSV and comments of missing posts are skipped.
+        """
+        self.import_dump('posts', self.posts_path)
+        comments_path = os.path.join(self.directory, 'comments.csv')
+        with open(comments_path, 'w') as file:
+            file.write('id,post,author,text,created_at\n')
+            file.write('5000,1000,username1,First,2015-01-02T00:00:00Z\n')
+            file.write('5001,1001,[deleted],Second,1420243200\n')
+            file.write('5002,9999,username1,Orphan,2015-01-02T00:00:00Z\n')
+
+        out = self.import_dump('comments', comments_path)
+
+        self.assertIn('Imported 2 comments', out)
+        self.assertIn('1 unknown post', out)
+        self.assertEqual(Comment.objects.get(pk=5000).post_id, 1000)
+        self.assertIsNone(Comment.objects.get(pk=5001).author)
+
+    def test_resume(self):
+        """
+        Ensure a rerun resumes after the checkpoint and rows already imported aren't inserted again.
+        """
+        checkpoint_path = f'{self.posts_path}.checkpoint'
+        with open(checkpoint_path, 'w') as file:
+            json.dump({'kind': 'posts', 'position': 2}, file)
+
+        with self.assertRaises(CommandError):
+            self.import_dump('comments', self.posts_path)
+
+        out = self.import_dump('posts', self.posts_path)
+
+        self.assertIn('Resuming after record 2', out)
+        self.assertEqual(sorted(Post.objects.values_list('pk', flat=True)), [1002, 1003, 1004])
+
+        out = self.import_dump('posts', self.posts_path, restart=True)
+
+        self.assertIn('Imported 2 posts', out)
+        self.assertIn('3 existing', out)
+
+    def test_import_twice(self):
+        """
+        Ensure a completed import removes its checkpoint, so importing the same dump again reads all of it.
+        """
+        self.import_dump('posts', self.posts_path)
+        self.assertFalse(os.path.exists(f'{self.posts_path}.checkpoint'))
+
+        out = self.import_dump('posts', self.posts_path)
+
+        self.assertNotIn('Resuming', out)
+        self.assertIn('Imported 0 posts', out)
+        self.assertIn('5 existing', out)
+
+    def test_defer_indexes(self):
+        """
+        Ensure deferred indexes are dropped for the import and created again afterwards.
+        """
+        out = self.import_dump('posts', self.posts_path, defer_indexes=True)
+
+        self.assertIn('dropped post_created_idx', out)
+        self.assertIn('created post_created_idx', out)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Post._meta.db_table)
+        self.assertTrue({index.name for index in Post._meta.indexes} <= set(constraints))
+
+
+class QueryPlanTest(APITestCase):
+    """
+    Test the query plans and query counts of the most frequent API calls.
+    Reads of large tables must use indexes for both filtering and ordering.
+    """
+    def setUp(self):
+        self.user_subreddit_owner = User.objects.create_user('username1', 'password')
+        self.user_subreddit_moderator = User.objects.create_user('username2', 'password')
+        self.user_post_author = User.objects.create_user('username3', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user_subreddit_owner)
+        self.subreddit.moderator.add(self.user_subreddit_moderator)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_post_author)
+        self.comment = Comment.objects.create(text='Comment text', post=self.post, author=self.user_post_author)
+        cache.clear()
+        view_counter.reset()
+
+    @contextmanager
+    def assertQueryPlans(self, budget):
+        """
+        Assert the block runs at most `budget` queries, and none of them scans or sorts a large table.
+        """
+        with CaptureQueriesContext(connection) as context:
+            yield
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertLessEqual(len(queries), budget, '\n'.join(queries))
+        for sql in queries:
+            if sql.startswith('SELECT') and touches(sql):
+                self.assertEqual(plan_problems(explain(sql), vendor=connection.vendor), [], sql)
+
+    def test_subreddit_posts_plan(self):
+        """
+        Ensure 'subreddit_posts' reads posts in index order.
+        """
+        with self.assertQueryPlans(1):
+            response = self.client.get(reverse('subreddit_posts', kwargs={'pk': self.subreddit.pk}), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_post_comments_plan(self):
+        """
+        Ensure 'post_comments' reads comments in index order.
+        """
+        with self.assertQueryPlans(2):
+            response = self.client.get(reverse('post_comments', kwargs={'pk': self.post.pk}), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_plans(self):
+        """
+        Ensure the lists of subreddits, posts and user activity are read in index order.
+        """
+        user_kwargs = {'pk': self.user_post_author.pk}
+        for url, budget in [
+            (reverse('subreddits'), 1),
+            (reverse('posts'), 1),
+            (reverse('user_posts', kwargs=user_kwargs), 1),
+            (reverse('user_comments', kwargs=user_kwargs), 1),
+            (reverse('user_overview', kwargs=user_kwargs), 2),
+        ]:
+            with self.subTest(url=url), self.assertQueryPlans(budget):
+                response = self.client.get(url, format='json')
+
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_paginated_plans(self):
+        """
+        Ensure paginated lists read pages and their bounded counts by index, and estimate long lists.
+        """
+        Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_post_author)
+        Comment.objects.create(text='Comment text', post=self.post, author=self.user_post_author)
+
+        # Counts are cached in the shared database cache: one read, and a write with its cull check.
+        for count_limit, budget in [(1000, 9), (0, 4)]:
+            for url in [
+                reverse('subreddit_posts', kwargs={'pk': self.subreddit.pk}),
+                reverse('post_comments', kwargs={'pk': self.post.pk}),
+            ]:
+                cache.clear()
+                caches['shared'].clear()
+                with self.subTest(url=url, count_limit=count_limit), self.assertQueryPlans(budget):
+                    with mock.patch.object(EstimatedCountPagination, 'count_limit', count_limit):
+                        response = self.client.get(url, {'page_size': 1}, format='json')
+
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertEqual(response.data['count_approximate'], count_limit == 0)
+
+    def test_admin_changelist_plans(self):
+        """
+        Ensure admin changelists, their filters, date hierarchy and cursor pages read rows by index.
+        """
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        Post.objects.filter(pk=self.post.pk).update(is_removed=True)
+        now = timezone.now()
+        date_range = {'created_at__gte': (now - timedelta(days=7)).isoformat(), 'created_at__lt': now.isoformat()}
+        cursor = f'{self.post.created_at},{self.post.pk}'
+
+        for name in ('post', 'comment'):
+            url = reverse(f'admin:reddit_{name}_changelist')
+            for params in [
+                {},
+                {'is_removed__exact': '1'},
+                {'is_locked__exact': '1'},
+                date_range,
+                {'created_at__year': now.year, 'created_at__month': now.month},
+                {'cursor': cursor},
+            ]:
+                with self.subTest(url=url, params=params), self.assertQueryPlans(10):
+                    response = self.client.get(url, params)
+
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_detail_plans(self):
+        """
+        Ensure details and edit history are read by primary key.
+        """
+        for url, budget in [
+            (reverse('subreddit_detail', kwargs={'pk': self.subreddit.pk}), 3),
+            (reverse('post_detail', kwargs={'pk': self.post.pk}), 1),
+            (reverse('comment_detail', kwargs={'pk': self.comment.pk}), 1),
+            (reverse('post_history', kwargs={'pk': self.post.pk}), 2),
+            (reverse('comment_history', kwargs={'pk': self.comment.pk}), 2),
+            (reverse('subreddit_stats', kwargs={'pk': self.subreddit.pk}), 2),
+        ]:
+            with self.subTest(url=url), self.assertQueryPlans(budget):
+                response = self.client.get(url, format='json')
+
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_permission_plans(self):
+        """
+        Ensure the owner and moderator lookups of edits by a moderator use indexes.
+        """
+        self.client.force_authenticate(self.user_subreddit_moderator)
+
+        with self.assertQueryPlans(14):
+            response = self.client.patch(
+                reverse('post_detail', kwargs={'pk': self.post.pk}), data={'title': 'Edited'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertQueryPlans(14):
+            response = self.client.patch(
+                reverse('comment_detail', kwargs={'pk': self.comment.pk}), data={'text': 'Edited'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_notification_plans(self):
+        """
+        Ensure the inbox and its unread counter are read by index.
+        """
+        Notification.objects.create(recipient=self.user_post_author, kind='reply', post_id=self.post.pk, comment_id=self.comment.pk)
+        self.client.force_authenticate(self.user_post_author)
+
+        for url, params, budget in [
+            (reverse('notifications'), {}, 1),
+            (reverse('notifications'), {'unread': 'true'}, 1),
+            (reverse('notifications_unread'), {}, 1),
+        ]:
+            with self.subTest(url=url, params=params), self.assertQueryPlans(budget):
+                response = self.client.get(url, params, format='json')
+
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_plan_problems(self):
+        """
+        Ensure scans and sorts of large tables are detected, and index scans are not.
+        """
+        self.assertEqual(plan_problems(['SCAN reddit_post']), ['SCAN reddit_post'])
+        self.assertEqual(plan_problems(['SCAN reddit_post USING INDEX post_created_idx']), [])
+        self.assertEqual(plan_problems(['SCAN django_migrations']), [])
+        self.assertEqual(plan_problems(['USE TEMP B-TREE FOR ORDER BY']), ['USE TEMP B-TREE FOR ORDER BY'])
+        self.assertEqual(
+            plan_problems(['Limit', '  ->  Seq Scan on reddit_comment'], vendor='postgresql'), ['Seq Scan on reddit_comment']
+        )
+
+        unindexed = Post.objects.filter(subreddit=self.subreddit).order_by('title')
+        self.assertNotEqual(plan_problems(explain(str(unindexed.query)), vendor=connection.vendor), [])
+
+
+class QueryCacheTest(APITransactionTestCase):
+    """
+    Test the query cache of the 'subreddits' API, and that subreddit owner and moderator lookups bypass it.
+    Queries inside transactions bypass the cache, so these tests run without one.
+    """
+    def setUp(self):
+        cache.clear()
+        query_cache.reset_stats()
+        self.user_subreddit_owner = User.objects.create_user('username1', 'password')
+        self.user_subreddit_moderator = User.objects.create_user('username2', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user_subreddit_owner)
+        self.subreddit.moderator.add(self.user_subreddit_moderator)
+        self.url = reverse('subreddits')
+
+    def names(self):
+        return [subreddit['name'] for subreddit in self.client.get(self.url, format='json').data]
+
+    def test_list_cached(self):
+        """
+        Ensure repeated lists are served from the cache and counted as hits.
+        """
+        self.assertEqual(self.names(), ['Subreddit'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ['Subreddit'])
+
+        self.assertEqual(query_cache.stats()['reddit.subreddit'], (1, 1))
+
+        out = StringIO()
+        call_command('query_cache_stats', reset=True, stdout=out)
+        self.assertIn('50.0% hit rate', out.getvalue())
+        self.assertEqual(query_cache.stats()['reddit.subreddit'], (0, 0))
+
+    def test_invalidated_on_writes(self):
+        """
+        Ensure saves, bulk writes, updates and raw SQL all invalidate cached results.
+        """
+        self.names()
+        Subreddit.objects.create(name='Created', owner=self.user_subreddit_owner)
+        self.assertIn('Created', self.names())
+
+        Subreddit.objects.bulk_create([Subreddit(name='Bulk', shard='default')])
+        self.assertIn('Bulk', self.names())
+
+        Subreddit.objects.filter(name='Bulk').update(name='Updated')
+        self.assertIn('Updated', self.names())
+
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM reddit_subreddit WHERE name = %s', ['Updated'])
+        self.assertNotIn('Updated', self.names())
+
+        with transaction.atomic():
+            Subreddit.objects.filter(name='Created').delete()
+        self.assertNotIn('Created', self.names())
+
+    def test_shared_database_cache(self):
+        """
+        Ensure writes are invalidated in a database cache without its own writes invalidating again.
+        """
+        caches['shared'].clear()
+        with mock.patch.object(query_cache, 'alias', 'shared'):
+            self.assertEqual(self.names(), ['Subreddit'])
+            Subreddit.objects.filter(pk=self.subreddit.pk).update(name='Updated')
+            self.assertEqual(self.names(), ['Updated'])
+
+    def test_moderators_not_cached(self):
+        """
+        Ensure moderator lookups bypass the cache, so moderators removed by another process lose their permissions.
+        """
+        post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_subreddit_owner)
+        url = reverse('post_detail', kwargs={'pk': post.pk})
+        self.client.force_authenticate(self.user_subreddit_moderator)
+
+        response = self.client.patch(url, data={'title': 'First edit'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(query_cache.stats()['reddit.subreddit'], (0, 0))
+
+        # The version bump of another process's write isn't seen by this one.
+        with mock.patch.object(query_cache, 'bump'):
+            self.subreddit.moderator.remove(self.user_subreddit_moderator)
+        response = self.client.patch(url, data={'title': 'Second edit'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SpamTest(APITestCase):
+    """
+    Test near-duplicate detection of new comments in 'post_comments' API.
+    """
+    text = 'Get free followers and likes for your account today, visit our website now and claim your bonus'
+
+    def setUp(self):
+        self.user_subreddit_owner = User.objects.create_user('username1', 'password')
+        self.user_spammer = User.objects.create_user('username2', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user_subreddit_owner)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_subreddit_owner)
+        self.url = reverse('post_comments', kwargs={'pk': self.post.pk})
+        self.client.force_authenticate(self.user_spammer)
+
+    def test_simhash(self):
+        """
+        Ensure case and punctuation don't change the hash, and buckets catch any hash within the distance.
+        """
+        value = simhash(self.text)
+
+        self.assertEqual(simhash(self.text.upper().replace(',', '!!')), value)
+        self.assertGreater(distance(value, simhash('A completely different comment about the second season of the show')), 6)
+
+        near = value ^ 0b1000001000001000001000001000001
+        self.assertEqual(distance(value, near), 6)
+        self.assertTrue(set(buckets(value, 7)) & set(buckets(near, 7)))
+
+    def test_flag_near_duplicate(self):
+        """
+        Ensure near-duplicates of recent comments are flagged into the moderation queue.
+        """
+        first = self.client.post(self.url, data={'text': self.text}, format='json')
+        second = self.client.post(self.url, data={'text': self.text.replace('today', 'TODAY!!!')}, format='json')
+
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Comment.objects.get(pk=first.data['id']).report_count, 0)
+        self.assertEqual(Comment.objects.get(pk=second.data['id']).report_count, 1)
+
+        self.client.force_authenticate(self.user_subreddit_owner)
+        response = self.client.get(reverse('subreddit_modqueue', kwargs={'pk': self.subreddit.pk}), format='json')
+
+        items = [(item['type'], item['data']['id']) for item in response.data['results']]
+        self.assertEqual(items, [('comment', second.data['id'])])
+
+    def test_reject_near_duplicate(self):
+        """
+        Ensure near-duplicates of recent posts are rejected when configured.
+        """
+        Post.objects.create(title='Spam', text=self.text, subreddit=self.subreddit, author=self.user_spammer)
+
+        with mock.patch.object(spam_detector, 'action', 'reject'):
+            response = self.client.post(self.url, data={'text': self.text}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Comment.objects.count(), 0)
+
+    def test_short_comments_ignored(self):
+        """
+        Ensure short comments are neither fingerprinted nor flagged.
+        """
+        self.client.post(self.url, data={'text': 'Thanks for sharing!'}, format='json')
+        response = self.client.post(self.url, data={'text': 'Thanks for sharing!'}, format='json')
+
+        self.assertEqual(Comment.objects.get(pk=response.data['id']).report_count, 0)
+        self.assertFalse(SimHashBucket.objects.filter(kind='comment').exists())
+
+    def test_fingerprints_follow_writes(self):
+        """
+        Ensure fingerprints are replaced on edits and removed with their content.
+        """
+        comment = Comment.objects.create(text=self.text, post=self.post, author=self.user_spammer)
+
+        self.assertEqual(spam_detector.find(self.text), [('comment', comment.pk)])
+
+        comment.text = 'A completely different comment about the second season of the show'
+        comment.save()
+
+        self.assertEqual(spam_detector.find(self.text), [])
+
+        comment.delete()
+
+        self.assertFalse(SimHashBucket.objects.exists())
+
+
+class ActivityStatsTest(APITestCase):
+    """
+    Test activity rollups and 'subreddit_stats' API.
+    """
+    def setUp(self):
+        self.user_subreddit_owner = User.objects.create_user('username1', 'password')
+        self.user_post_author = User.objects.create_user('username2', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user_subreddit_owner)
+        self.url = reverse('subreddit_stats', kwargs={'pk': self.subreddit.pk})
+        activity_rollups.reset()
+        self.addCleanup(activity_rollups.reset)
+
+    def create_content(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_post_author)
+            Comment.objects.create(text='Comment text', post=post, author=self.user_post_author)
+            Comment.objects.create(text='Comment text', post=post, author=self.user_subreddit_owner)
+        return post
+
+    def test_stats(self):
+        """
+        Ensure new posts and comments are counted per interval, with their distinct authors.
+        """
+        self.client.force_authenticate(self.user_post_author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('subreddit_posts', kwargs={'pk': self.subreddit.pk}), data={'title': 'Title', 'text': 'Text'}, format='json'
+            )
+            post = Post.objects.get()
+            self.client.post(reverse('post_comments', kwargs={'pk': post.pk}), data={'text': 'Comment'}, format='json')
+        self.create_content()
+        activity_rollups.flush()
+
+        response = self.client.get(self.url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            (response.data['posts'], response.data['comments'], response.data['active_authors']), (2, 3, 2)
+        )
+        self.assertEqual(response.data['interval'], 'hour')
+        self.assertEqual(sum(point['posts'] for point in response.data['series']), 2)
+
+    def test_deleted_content(self):
+        """
+        Ensure deleted posts and their comments are no longer counted, while their authors stay active.
+        """
+        post = self.create_content()
+        activity_rollups.flush()
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        activity_rollups.flush()
+
+        response = self.client.get(self.url, format='json')
+
+        self.assertEqual(
+            (response.data['posts'], response.data['comments'], response.data['active_authors']), (0, 0, 2)
+        )
+
+    def test_rollup_created_by_other_worker(self):
+        """
+        Ensure counts are added to a rollup another worker process created meanwhile.
+        """
+        now = timezone.now()
+        activity_rollups.add(self.subreddit.pk, now, self.user_post_author.pk, posts=1)
+        other = HyperLogLog(precision=10)
+        other.add(self.user_subreddit_owner.pk)
+        ActivityRollup.objects.create(
+            subreddit=self.subreddit, granularity='minute', start=now.replace(second=0, microsecond=0),
+            posts=2, comments=1, authors=other.to_bytes()
+        )
+
+        self.assertEqual(activity_rollups.flush(), 1)
+
+        response = self.client.get(self.url, format='json')
+        self.assertEqual(
+            (response.data['posts'], response.data['comments'], response.data['active_authors']), (3, 1, 2)
+        )
+
+    def test_flush_limit(self):
+        """
+        Ensure an event writes at most `flush_limit` buckets, leaving the others due.
+        """
+        now = timezone.now()
+        for minutes in range(3):
+            activity_rollups.add(self.subreddit.pk, now - timedelta(minutes=minutes), posts=1)
+
+        with mock.patch.object(activity_rollups, 'flush_interval', 0), mock.patch.object(activity_rollups, 'flush_limit', 2):
+            activity_rollups.add(self.subreddit.pk, now - timedelta(minutes=3), posts=1)
+            self.assertEqual(ActivityRollup.objects.count(), 2)
+            self.assertEqual(len(activity_rollups.pending), 2)
+            activity_rollups.add(self.subreddit.pk, now - timedelta(minutes=2), posts=1)
+
+        self.assertEqual(ActivityRollup.objects.count(), 4)
+        self.assertEqual(len(activity_rollups.pending), 0)
+        self.assertEqual(sum(ActivityRollup.objects.values_list('posts', flat=True)), 5)
+
+    def test_failed_write_buffered_again(self):
+        """
+        Ensure counts that fail to be written don't fail the flush and are written by the next one.
+        """
+        self.create_content()
+
+        with mock.patch.object(activity_rollups, 'write_batch', side_effect=DatabaseError):
+            with self.assertLogs('reddit.activity', 'ERROR'):
+                self.assertEqual(activity_rollups.flush(), 0)
+        self.assertFalse(ActivityRollup.objects.exists())
+
+        self.assertEqual(activity_rollups.flush(), 1)
+        response = self.client.get(self.url, format='json')
+        self.assertEqual(
+            (response.data['posts'], response.data['comments'], response.data['active_authors']), (1, 2, 2)
+        )
+
+    def test_compaction(self):
+        """
+        Ensure old minute and hour rollups are summed into coarser rollups without changing the stats.
+        """
+        now = timezone.now().replace(minute=30)
+        for age in (timedelta(hours=3), timedelta(hours=3, minutes=1), timedelta(days=10), timedelta(minutes=1)):
+            activity_rollups.add(self.subreddit.pk, now - age, self.user_post_author.pk, posts=1)
+        activity_rollups.flush()
+        params = {'start': (now - timedelta(days=30)).isoformat(), 'end': now.isoformat(), 'interval': 'day'}
+        before = self.client.get(self.url, params).data
+
+        # Three minute rollups into two hours, then the oldest hour into a day.
+        self.assertEqual(activity_rollups.compact(now), 4)
+
+        granularities = Counter(ActivityRollup.objects.values_list('granularity', flat=True))
+        self.assertEqual(granularities, Counter({'minute': 1, 'hour': 1, 'day': 1}))
+        after = self.client.get(self.url, params).data
+        self.assertEqual(after, before)
+        self.assertEqual((after['posts'], after['active_authors']), (4, 1))
+
+    def test_rebuild(self):
+        """
+        Ensure archived content stays counted, and rebuilt rollups match the incremental ones.
+        """
+        self.create_content()
+        activity_rollups.flush()
+        expected = self.client.get(self.url, format='json').data
+
+        call_command('archive_posts', '--older-than', '0', stdout=StringIO())
+        activity_rollups.flush()
+        self.assertEqual(ArchivedPost.objects.count(), 1)
+        self.assertEqual(self.client.get(self.url, format='json').data['comments'], 2)
+
+        activity_rollups.rebuild()
+        response = self.client.get(self.url, format='json')
+
+        self.assertEqual(
+            (response.data['posts'], response.data['comments'], response.data['active_authors']),
+            (expected['posts'], expected['comments'], expected['active_authors'])
+        )
+
+    def test_invalid_range(self):
+        """
+        Ensure ranges ending before they start and unknown subreddits are rejected.
+        """
+        response = self.client.get(self.url, {'start': '2024-01-02T00:00:00Z', 'end': '2024-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('subreddit_stats', kwargs={'pk': self.subreddit.pk + 1}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class NotificationTest(APITestCase):
+    """
+    Test notifications of replies and mentions, and the 'notifications' API.
+    """
+    def setUp(self):
+        self.user_post_author = User.objects.create_user('username1', 'password')
+        self.user_commenter = User.objects.create_user('username2', 'password')
+        self.user_mentioned = User.objects.create_user('username3', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user_post_author)
+        self.post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_post_author)
+        self.url = reverse('notifications')
+        notification_queue.reset()
+        self.addCleanup(notification_queue.reset)
+
+    def comment(self, user, text='Comment text', post=None):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('post_comments', kwargs={'pk': (post or self.post).pk}), data={'text': text}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_replies_coalesced(self):
+        """
+        Ensure replies to a post become one notification, without notifying authors of their own comments.
+        """
+        self.comment(self.user_commenter)
+        self.comment(self.user_mentioned)
+        self.comment(self.user_post_author)
+
+        self.assertEqual(notification_queue.flush(), 1)
+        self.comment(self.user_commenter)
+        notification_queue.flush()
+
+        self.client.force_authenticate(self.user_post_author)
+        response = self.client.get(self.url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        notification = response.data['results'][0]
+        self.assertEqual((notification['kind'], notification['post'], notification['count']), ('reply', self.post.pk, 3))
+        self.assertEqual(notification['actor'], self.user_commenter.pk)
+        self.assertEqual(self.client.get(reverse('notifications_unread')).data['unread'], 1)
+
+    def test_mentions(self):
+        """
+        Ensure users mentioned by `u/name` or `@name` are notified, and unknown names and emails ignored.
+        """
+        self.comment(self.user_commenter, 'Thanks u/username3, and @username2 and @nobody, mail me at a@username1.com')
+        notification_queue.flush()
+
+        mentions = Notification.objects.filter(kind='mention')
+        self.assertEqual(list(mentions.values_list('recipient', flat=True)), [self.user_mentioned.pk])
+        self.assertEqual(Notification.objects.filter(kind='reply', recipient=self.user_post_author).count(), 1)
+
+    def test_notification_created_by_other_worker(self):
+        """
+        Ensure replies are added to an unread notification another worker process created meanwhile.
+        """
+        self.comment(self.user_commenter)
+        Notification.objects.create(
+            recipient=self.user_post_author, kind='reply', post_id=self.post.pk, comment_id=1,
+            actor=self.user_mentioned, count=2
+        )
+        NotificationInbox.objects.create(user=self.user_post_author, unread=1)
+
+        self.assertEqual(notification_queue.flush(), 1)
+
+        notification = Notification.objects.get(recipient=self.user_post_author)
+        self.assertEqual((notification.count, notification.actor_id), (3, self.user_commenter.pk))
+        self.client.force_authenticate(self.user_post_author)
+        self.assertEqual(self.client.get(reverse('notifications_unread')).data['unread'], 1)
+
+    def test_flush_limit(self):
+        """
+        Ensure a comment writes at most `flush_limit` notifications, leaving the others queued.
+        """
+        with mock.patch.object(notification_queue, 'flush_interval', 0), \
+                mock.patch.object(notification_queue, 'flush_limit', 1):
+            self.comment(self.user_commenter, 'Thanks u/username3')
+
+        self.assertEqual(Notification.objects.get().kind, 'reply')
+        self.assertEqual(len(notification_queue.pending), 1)
+
+        self.assertEqual(notification_queue.flush(), 1)
+        self.assertEqual(Notification.objects.get(kind='mention').recipient, self.user_mentioned)
+
+    def test_failed_write_queued_again(self):
+        """
+        Ensure notifications that fail to be written don't fail the comment, and are written by the next flush.
+        """
+        with mock.patch.object(notification_queue, 'flush_interval', 0), \
+                mock.patch.object(notification_queue, 'write', side_effect=DatabaseError), \
+                self.assertLogs('reddit.notifications', 'ERROR'):
+            self.comment(self.user_commenter)
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(notification_queue.flush(), 1)
+        self.assertEqual(Notification.objects.get().recipient, self.user_post_author)
+
+    def test_mark_read(self):
+        """
+        Ensure read notifications leave the unread counter, and new replies start a new notification.
+        """
+        other_post = Post.objects.create(title='Post title', text='Post text', subreddit=self.subreddit, author=self.user_post_author)
+        self.comment(self.user_commenter)
+        self.comment(self.user_commenter, post=other_post)
+        notification_queue.flush()
+        first, second = Notification.objects.filter(recipient=self.user_post_author).order_by('post_id')
+
+        self.client.force_authenticate(self.user_post_author)
+        response = self.client.post(reverse('notifications_read'), data={'notifications': [first.pk]}, format='json')
+
+        self.assertEqual(response.data, {'read': 1, 'unread': 1})
+        self.comment(self.user_mentioned)
+        notification_queue.flush()
+        self.assertEqual(Notification.objects.filter(recipient=self.user_post_author).count(), 3)
+
+        self.client.force_authenticate(self.user_post_author)
+        unread = self.client.get(self.url, {'unread': 'true'}, format='json').data['results']
+        self.assertEqual(len(unread), 2)
+        response = self.client.post(reverse('notifications_read'), data={}, format='json')
+        self.assertEqual(response.data, {'read': 2, 'unread': 0})
+
+    def test_cursor_pagination(self):
+        """
+        Ensure the inbox is paginated with cursors by latest activity.
+        """
+        Notification.objects.bulk_create([
+            Notification(recipient=self.user_post_author, kind='reply', post_id=i, comment_id=i) for i in range(30)
+        ])
+        now = timezone.now()
+        for i in range(30):
+            Notification.objects.filter(post_id=i).update(updated_at=now - timedelta(minutes=i))
+        self.client.force_authenticate(self.user_post_author)
+
+        first = self.client.get(self.url, format='json')
+        second = self.client.get(first.data['next'], format='json')
+
+        self.assertEqual([item['post'] for item in first.data['results']], list(range(25)))
+        self.assertEqual([item['post'] for item in second.data['results']], list(range(25, 30)))
+        self.assertIsNone(second.data['next'])
+
+        self.client.force_authenticate(self.user_commenter)
+        self.assertEqual(self.client.get(self.url, format='json').data['results'], [])
+
+
+class EstimatedCountTest(APITestCase):
+    """
+    Test page number pagination with estimated counts of 'subreddit_posts' and 'post_comments' APIs.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('username1', 'password')
+        self.subreddit = Subreddit.objects.create(name='Subreddit', description='Description', owner=self.user)
+        self.url = reverse('subreddit_posts', kwargs={'pk': self.subreddit.pk})
+        activity_rollups.reset()
+        self.addCleanup(activity_rollups.reset)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts = [
+                Post.objects.create(title=f'Post {i}', text='Post text', subreddit=self.subreddit, author=self.user)
+                for i in range(10)
+            ]
+        activity_rollups.flush()
+        cache.clear()
+
+    def test_unpaginated_by_default(self):
+        """
+        Ensure lists are only paginated when a page is requested.
+        """
+        response = self.client.get(self.url, format='json')
+        self.assertEqual(len(response.data), 10)
+
+        response = self.client.get(self.url, {'page_size': 4}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['count'], response.data['count_approximate']), (10, False))
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIn('page=2', response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_cached_count(self):
+        """
+        Ensure small lists are counted once per subreddit, until a post is created.
+        """
+        with mock.patch('reddit.pagination.bounded_count', wraps=bounded_count) as counted:
+            self.client.get(self.url, {'page_size': 4}, format='json')
+            response = self.client.get(self.url, {'page_size': 4, 'page': 2}, format='json')
+
+            self.assertEqual(counted.call_count, 1)
+            self.assertEqual(response.data['count'], 10)
+
+            Post.objects.create(title='Post', text='Post text', subreddit=self.subreddit, author=self.user)
+            response = self.client.get(self.url, {'page_size': 4}, format='json')
+
+            self.assertEqual(counted.call_count, 2)
+            self.assertEqual(response.data['count'], 11)
+
+    @override_settings(COUNT_CACHE_ALIAS='default')
+    def test_process_local_count_cache(self):
+        """
+        Ensure counts cached per process are flagged as approximate, as other processes don't clear them.
+        """
+        response = self.client.get(self.url, {'page_size': 4}, format='json')
+        self.assertEqual((response.data['count'], response.data['count_approximate']), (10, False))
+
+        response = self.client.get(self.url, {'page_size': 4}, format='json')
+
+        self.assertEqual((response.data['count'], response.data['count_approximate']), (10, True))
+
+    def test_count_forgotten_on_moderation(self):
+        """
+        Ensure removing and approving posts and comments clear the cached counts of their lists.
+        """
+        user_author = User.objects.create_user('username2', 'password')
+        post = self.posts[0]
+        comments = [Comment.objects.create(text='Comment text', post=post, author=self.user) for i in range(2)]
+        Comment.objects.create(text='Comment text', post=post, author=user_author)
+        Post.objects.create(title='Post', text='Post text', subreddit=self.subreddit, author=user_author)
+        comments_url = reverse('post_comments', kwargs={'pk': post.pk})
+        moderation_url = reverse('subreddit_moderation', kwargs={'pk': self.subreddit.pk})
+        self.client.force_authenticate(self.user)
+
+        def counts():
+            return (
+                self.client.get(self.url, {'page_size': 1}, format='json').data['count'],
+                self.client.get(comments_url, {'page_size': 1}, format='json').data['count'],
+            )
+
+        self.assertEqual(counts(), (11, 3))
+
+        self.client.post(moderation_url, data={'action': 'remove', 'comments': [comments[0].pk]}, format='json')
+        self.assertEqual(counts(), (11, 2))
+
+        self.client.post(moderation_url, data={'action': 'approve', 'comments': [comments[0].pk]}, format='json')
+        self.assertEqual(counts(), (11, 3))
+
+        self.client.post(moderation_url, data={'action': 'remove_user_content', 'user': user_author.pk}, format='json')
+        self.assertEqual(counts(), (10, 2))
+
+    def test_estimated_count(self):
+        """
+        Ensure long lists are estimated from counters or statistics, deep pages aren't counted, and the last page is exact.
+        """
+        post = self.posts[0]
+        for i in range(10):
+            Comment.objects.create(text='Comment text', post=post, author=self.user)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        with mock.patch.object(EstimatedCountPagination, 'count_limit', 3):
+            with mock.patch('reddit.pagination.bounded_count', wraps=bounded_count) as counted:
+                posts = self.client.get(self.url, {'page_size': 2}, format='json').data
+                comments = self.client.get(reverse('post_comments', kwargs={'pk': post.pk}), {'page_size': 2}, format='json').data
+                self.assertEqual(counted.call_count, 2)
+
+                deep = self.client.get(self.url, {'page_size': 2, 'page': 3}, format='json').data
+                last = self.client.get(self.url, {'page_size': 2, 'page': 5}, format='json').data
+
+                self.assertEqual(counted.call_count, 2)
+
+        self.assertEqual((posts['count'], posts['count_approximate']), (10, True))
+        self.assertEqual((comments['count'], comments['count_approximate']), (10, True))
+        self.assertEqual((deep['count'], deep['count_approximate']), (10, True))
+        self.assertEqual((last['count'], last['count_approximate'], last['next']), (10, False, None))
+
+    def test_invalid_page(self):
+        """
+        Ensure pages past the end and malformed page numbers are not found.
+        """
+        for params in ({'page': 3, 'page_size': 5}, {'page': 'x'}, {'page': 0}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params, format='json')
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
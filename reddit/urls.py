@@ -1,13 +1,39 @@
 from django.urls import path
-from .views import PostCommentsView, CommentDetailView, PostView, PostDetailView, SubredditView, SubredditDetailView, SubredditPostsView
+from .views import (
+    PostCommentsView, CommentDetailView, PostView, PostDetailView, SubredditView, SubredditDetailView, SubredditPostsView,
+    SubredditStatsView,
+    UserCommentsView, UserOverviewView, UserPostsView,
+    BatchView, CommentReportView, ModerationView, ModQueueView, PostReportView,
+    NotificationView, ReadNotificationsView, UnreadNotificationsView,
+    CommentAsOfView, CommentRevisionDetailView, CommentRevisionListView,
+    PostAsOfView, PostRevisionDetailView, PostRevisionListView
+    )
 
 
 urlpatterns = [
     path('subreddits/', SubredditView.as_view(), name='subreddits'),
     path('subreddits/<int:pk>/', SubredditDetailView.as_view(), name='subreddit_detail'),
     path('subreddits/<int:pk>/posts/', SubredditPostsView.as_view(), name='subreddit_posts'),
+    path('subreddits/<int:pk>/stats/', SubredditStatsView.as_view(), name='subreddit_stats'),
+    path('subreddits/<int:pk>/modqueue/', ModQueueView.as_view(), name='subreddit_modqueue'),
+    path('subreddits/<int:pk>/moderation/', ModerationView.as_view(), name='subreddit_moderation'),
     path('posts/', PostView.as_view(), name='posts'),
     path('posts/<int:pk>/', PostDetailView.as_view(), name='post_detail'),
     path('posts/<int:pk>/comments/', PostCommentsView.as_view(), name='post_comments'),
+    path('posts/<int:pk>/report/', PostReportView.as_view(), name='post_report'),
+    path('posts/<int:pk>/history/', PostRevisionListView.as_view(), name='post_history'),
+    path('posts/<int:pk>/history/<int:number>/', PostRevisionDetailView.as_view(), name='post_revision'),
+    path('posts/<int:pk>/history/as-of/', PostAsOfView.as_view(), name='post_as_of'),
     path('comments/<int:pk>/', CommentDetailView.as_view(), name='comment_detail'),
+    path('comments/<int:pk>/report/', CommentReportView.as_view(), name='comment_report'),
+    path('comments/<int:pk>/history/', CommentRevisionListView.as_view(), name='comment_history'),
+    path('comments/<int:pk>/history/<int:number>/', CommentRevisionDetailView.as_view(), name='comment_revision'),
+    path('comments/<int:pk>/history/as-of/', CommentAsOfView.as_view(), name='comment_as_of'),
+    path('users/<int:pk>/posts/', UserPostsView.as_view(), name='user_posts'),
+    path('users/<int:pk>/comments/', UserCommentsView.as_view(), name='user_comments'),
+    path('users/<int:pk>/overview/', UserOverviewView.as_view(), name='user_overview'),
+    path('notifications/', NotificationView.as_view(), name='notifications'),
+    path('notifications/unread/', UnreadNotificationsView.as_view(), name='notifications_unread'),
+    path('notifications/read/', ReadNotificationsView.as_view(), name='notifications_read'),
+    path('batch/', BatchView.as_view(), name='batch'),
 ]
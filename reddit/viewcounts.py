@@ -0,0 +1,128 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .cache import object_cache
+from .hyperloglog import HyperLogLog
+from .models import Post, PostViewers
+from .sharding import locate
+
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    Process-local buffer of post views.
+
+    Views are counted in memory, and viewers added to one HyperLogLog sketch per post, so a
+    GET costs no database write. Buffered views are flushed as one UPDATE per post by the
+    requests after `flush_interval` seconds or `max_pending` buffered posts, each writing at
+    most `flush_limit` posts until the buffer is empty, and all at exit. Views that fail to be
+    written are logged and buffered again, never failing the request. Flushing merges the
+    local sketch into the stored one, so unique viewers are estimated across all worker processes.
+    The written counts are cached as counters of the post, leaving its cached details in place.
+    """
+
+    def __init__(self, flush_interval=10, max_pending=10000, flush_limit=100, enabled=True):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flush_limit = flush_limit
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.views = Counter()
+        self.viewers = defaultdict(HyperLogLog)
+        self.last_flush = time.monotonic()
+
+    def record(self, post_pk, viewer):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.views[post_pk] += 1
+            self.viewers[post_pk].add(viewer)
+            due = len(self.views) >= self.max_pending or time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush(limit=self.flush_limit)
+
+    def flush(self, limit=None):
+        """
+        Write the buffered views of at most `limit` posts to the database, the others stay buffered
+        and due. Returns the number of flushed posts.
+        """
+        with self.lock:
+            if limit is None or len(self.views) <= limit:
+                views, viewers = self.views, self.viewers
+                self.reset()
+            else:
+                views, viewers = Counter(), {}
+                for post_pk in list(islice(self.views, limit)):
+                    views[post_pk] = self.views.pop(post_pk)
+                    viewers[post_pk] = self.viewers.pop(post_pk)
+
+        flushed = 0
+        counters = {}
+        for post_pk, count in views.items():
+            try:
+                written = self.write(post_pk, count, viewers[post_pk])
+            except Exception:
+                logger.exception('Writing the views of post %s failed, buffering them again.', post_pk)
+                self.restore(post_pk, count, viewers[post_pk])
+                continue
+            flushed += 1
+            if written is not None:
+                counters[post_pk] = written
+        if counters:
+            object_cache.set_counters(Post, counters)
+        return flushed
+
+    def restore(self, post_pk, count, sketch):
+        with self.lock:
+            self.views[post_pk] += count
+            self.viewers[post_pk].merge(sketch)
+
+    def write(self, post_pk, count, sketch):
+        """
+        Add the views to the post, and return its updated counters, or None when it's gone.
+        """
+        alias = locate(Post, post_pk)
+        with transaction.atomic(using=alias):
+            if not Post.objects.using(alias).filter(pk=post_pk).update(view_count=F('view_count') + count):
+                # The post was deleted or archived since it was viewed.
+                return
+            # Insert the sketch row if it's missing, without failing when another process just did.
+            PostViewers.objects.using(alias).bulk_create(
+                [PostViewers(post_id=post_pk, sketch=b'')], ignore_conflicts=True
+            )
+            stored = PostViewers.objects.using(alias).select_for_update().get(post=post_pk)
+            sketch.merge(HyperLogLog.from_bytes(stored.sketch))
+            PostViewers.objects.using(alias).filter(post=post_pk).update(sketch=sketch.to_bytes())
+            posts = Post.objects.using(alias).filter(pk=post_pk)
+            posts.update(unique_viewers=sketch.count())
+            return posts.values('view_count', 'unique_viewers').get()
+
+
+def viewer_id(request):
+    """
+    Return what identifies the viewer of a request: the user, or the address of anonymous clients.
+    """
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'address:{request.META.get("REMOTE_ADDR")}'
+
+
+view_counter = ViewCounter(
+    flush_interval=getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10),
+    max_pending=getattr(settings, 'VIEW_COUNT_MAX_PENDING', 10000),
+    flush_limit=getattr(settings, 'VIEW_COUNT_FLUSH_LIMIT', 100),
+)
+atexit.register(view_counter.flush)
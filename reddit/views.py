@@ -1,76 +1,420 @@
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.generics import (
+    CreateAPIView, GenericAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView
+    )
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
 
-from .models import Comment, Post, Subreddit
+from .activity import activity_stats, post_count
+from .cache import object_cache
+from . import archive, revisions
+from .batch import execute_batch
+from .mixins import (
+    ArchiveFallbackMixin, CachedQueryMixin, CachedRetrieveMixin, ExpandMixin, IdempotentCreateMixin, LocatedObjectMixin, MergedStreamListMixin,
+    MultiGetMixin, RevisionMixin, StreamingListMixin
+    )
+from .models import Comment, Notification, Post, Report, Subreddit
+from .moderation import moderate
+from .notifications import mark_read, unread_count
+from .pagination import EstimatedCountPagination, MergedCursorPagination, NotificationCursorPagination
 from .permissions import (
     IsAuthorOrReadOnly,
     IsOwnerOrReadOnly,
     SubredditOwnerModeratorCommentPermission,
+    SubredditOwnerModeratorPermission,
     SubredditOwnerModeratorPostPermission,
     SuperUserPermission
     )
 from .serializers import (
+    ActivityStatsQuerySerializer,
+    BatchSerializer,
     CommentDetailSerializer,
+    ModerationActionSerializer, ModQueueCommentSerializer, ModQueuePostSerializer,
+    NotificationReadSerializer, NotificationSerializer,
     PostSerializer, PostDetailSerializer, PostCommentsSerializer,
-    SubredditSerializer, SubredditDetailSerializer, SubredditPostsSerializer
+    SubredditSerializer, SubredditDetailSerializer, SubredditPostsSerializer,
+    ReportSerializer, RevisionSerializer,
+    UserCommentsSerializer, UserPostsSerializer
     )
+from .sharding import locate, relocate_post, shard_for_subreddit, shard_streams, sharded
+from .spam import spam_detector
+from .viewcounts import view_counter, viewer_id
 
 
-class SubredditView(ListCreateAPIView):
+class SubredditView(ExpandMixin, IdempotentCreateMixin, MultiGetMixin, CachedQueryMixin, ListCreateAPIView):
     serializer_class = SubredditSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     queryset = Subreddit.objects.all()
 
 
-class SubredditDetailView(RetrieveUpdateDestroyAPIView):
+class SubredditDetailView(ExpandMixin, CachedRetrieveMixin, RetrieveUpdateDestroyAPIView):
     serializer_class = SubredditDetailSerializer
     permission_classes = [IsOwnerOrReadOnly|SuperUserPermission]
     queryset = Subreddit.objects.all()
 
 
-class SubredditPostsView(ListCreateAPIView):
+class SubredditPostsView(ExpandMixin, IdempotentCreateMixin, StreamingListMixin, ListCreateAPIView):
     serializer_class = SubredditPostsSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = EstimatedCountPagination
+    count_scope = 'subreddit'
 
     def get_queryset(self):
-        subreddit_posts = Post.objects.filter(subreddit=self.kwargs['pk'])
+        shard = shard_for_subreddit(self.kwargs['pk'])
+        subreddit_posts = Post.objects.using(shard).filter(subreddit=self.kwargs['pk'], is_removed=False)
         return subreddit_posts
+
+    def estimate_count(self):
+        return post_count(self.kwargs['pk'])
     
     def perform_create(self, serializer):
         subreddit = Subreddit.objects.filter(id=self.kwargs['pk']).first()
         return serializer.save(author=self.request.user, subreddit=subreddit)
 
 
-class PostView(ListCreateAPIView):
+class SubredditStatsView(GenericAPIView):
+    """
+    Posts, comments and active authors of the subreddit over `?start=` to `?end=`, in total and
+    per `?interval=`, summed from pre-aggregated activity rollups.
+    """
+    serializer_class = ActivityStatsQuerySerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        if not Subreddit.objects.filter(pk=self.kwargs['pk']).exists():
+            raise NotFound()
+        return Response(activity_stats(self.kwargs['pk'], **serializer.validated_data))
+
+
+class PostView(ExpandMixin, IdempotentCreateMixin, MultiGetMixin, StreamingListMixin, ListCreateAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    queryset = Post.objects.all()
+
+    def get_queryset(self):
+        return sharded(Post.objects.filter(is_removed=False))
 
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
 
 
-class PostDetailView(RetrieveUpdateDestroyAPIView):
+class PostDetailView(
+    ExpandMixin, CachedRetrieveMixin, RevisionMixin, ArchiveFallbackMixin, LocatedObjectMixin,
+    RetrieveUpdateDestroyAPIView
+    ):
     serializer_class = PostDetailSerializer
     permission_classes = [IsAuthorOrReadOnly|SubredditOwnerModeratorPostPermission|SuperUserPermission]
-    queryset = Post.objects.all()
+    queryset = Post.objects.filter(is_removed=False)
+    cached_counters = ('view_count', 'unique_viewers')
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        view_counter.record(int(self.kwargs['pk']), viewer_id(request))
+        return response
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        relocate_post(serializer.instance)
 
-class PostCommentsView(ListCreateAPIView):
+
+class PostCommentsView(ExpandMixin, IdempotentCreateMixin, StreamingListMixin, ListCreateAPIView):
     serializer_class = PostCommentsSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = EstimatedCountPagination
+    count_scope = 'post'
 
     def get_queryset(self):
         post_pk = self.kwargs['pk']
-        post_comments = Comment.objects.filter(post=post_pk)
+        shard = locate(Post, post_pk)
+        if not Post.objects.using(shard).filter(pk=post_pk).exists() and archive.is_archived(post_pk):
+            return [comment for comment in archive.load_comments(post_pk) if not comment.is_removed]
+        post_comments = Comment.objects.using(shard).filter(post=post_pk, is_removed=False)
         return post_comments
 
     def perform_create(self, serializer):
-        post = Post.objects.filter(id=self.kwargs['pk']).first()
-        return serializer.save(author=self.request.user, post=post)
+        post = Post.objects.using(locate(Post, self.kwargs['pk'])).filter(id=self.kwargs['pk']).first()
+        if post is None and archive.is_archived(self.kwargs['pk']):
+            raise PermissionDenied('This post is archived and can no longer be commented on.')
+        if post is not None and post.is_locked:
+            raise PermissionDenied('This post is locked.')
+
+        flags = {}
+        if spam_detector.find(serializer.validated_data['text']):
+            if spam_detector.action == 'reject':
+                raise ValidationError({'text': ['This comment is a near-duplicate of recent content.']})
+            # Flagged comments are counted as reported once, which puts them in the moderation queue.
+            flags['report_count'] = 1
+        return serializer.save(author=self.request.user, post=post, **flags)
 
 
-class CommentDetailView(RetrieveUpdateDestroyAPIView):
+class CommentDetailView(
+    ExpandMixin, CachedRetrieveMixin, RevisionMixin, ArchiveFallbackMixin, LocatedObjectMixin,
+    RetrieveUpdateDestroyAPIView
+    ):
     serializer_class = CommentDetailSerializer
     permission_classes = [IsAuthorOrReadOnly|SubredditOwnerModeratorCommentPermission|SuperUserPermission]
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.filter(is_removed=False).select_related('post')
+
+
+class UserPostsView(ExpandMixin, MergedStreamListMixin, GenericAPIView):
+    pagination_class = MergedCursorPagination
+    stream_serializers = {'post': UserPostsSerializer}
+    tag_results = False
+
+    def get_streams(self):
+        return shard_streams('post', Post.objects.filter(author=self.kwargs['pk'], is_removed=False))
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class UserCommentsView(ExpandMixin, MergedStreamListMixin, GenericAPIView):
+    pagination_class = MergedCursorPagination
+    stream_serializers = {'comment': UserCommentsSerializer}
+    tag_results = False
+
+    def get_streams(self):
+        return shard_streams('comment', Comment.objects.filter(author=self.kwargs['pk'], is_removed=False))
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class UserOverviewView(ExpandMixin, MergedStreamListMixin, GenericAPIView):
+    """
+    Posts and comments of the user in a single stream, newest first.
+    """
+    pagination_class = MergedCursorPagination
+    stream_serializers = {
+        'post': UserPostsSerializer,
+        'comment': UserCommentsSerializer,
+    }
+
+    def get_streams(self):
+        return {
+            **shard_streams('post', Post.objects.filter(author=self.kwargs['pk'], is_removed=False)),
+            **shard_streams('comment', Comment.objects.filter(author=self.kwargs['pk'], is_removed=False)),
+        }
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class ReportView(IdempotentCreateMixin, CreateAPIView):
+    """
+    Report a post or comment to the subreddit moderators, once per user.
+    """
+    serializer_class = ReportSerializer
+    permission_classes = [IsAuthenticated]
+    target_model = None
+    target_field = None
+
+    def perform_create(self, serializer):
+        shard = locate(self.target_model, self.kwargs['pk'])
+        target = get_object_or_404(self.target_model.objects.using(shard), pk=self.kwargs['pk'], is_removed=False)
+        already_reported = ValidationError(f'You have already reported this {self.target_field}.')
+        if Report.objects.using(shard).filter(reporter=self.request.user, **{self.target_field: target}).exists():
+            raise already_reported
+
+        try:
+            with transaction.atomic(using=shard):
+                serializer.save(reporter=self.request.user, **{self.target_field: target})
+                self.target_model.objects.using(shard).filter(pk=target.pk).update(report_count=F('report_count') + 1)
+        except IntegrityError:
+            # A concurrent report by the same user was saved after the check above.
+            raise already_reported
+        object_cache.delete(self.target_model, target.pk)
+
+
+class PostReportView(ReportView):
+    target_model = Post
+    target_field = 'post'
+
+
+class CommentReportView(ReportView):
+    target_model = Comment
+    target_field = 'comment'
+
+
+class HistoryView(GenericAPIView):
+    """
+    Base view of the edit history of a post or comment.
+    """
+    serializer_class = RevisionSerializer
+    target_model = None
+
+    def get_target(self):
+        shard = locate(self.target_model, self.kwargs['pk'])
+        return get_object_or_404(self.target_model.objects.using(shard), pk=self.kwargs['pk'], is_removed=False)
+
+    def version_response(self, revision, fields):
+        return Response({**self.get_serializer(revision).data, **fields})
+
+
+class RevisionListView(HistoryView):
+    """
+    Revisions of a post or comment, newest first. Objects that were never edited have none.
+    """
+
+    def get(self, request, *args, **kwargs):
+        target = self.get_target()
+        return Response(self.get_serializer(revisions.revisions_of(target), many=True).data)
+
+
+class RevisionDetailView(HistoryView):
+    """
+    One version of a post or comment, rebuilt from the closest snapshot.
+    """
+
+    def get(self, request, *args, **kwargs):
+        found = revisions.version(revisions.revisions_of(self.get_target()), number=self.kwargs['number'])
+        if found is None:
+            raise NotFound()
+        return self.version_response(*found)
+
+
+class AsOfView(HistoryView):
+    """
+    The version of a post or comment at the time given by `?at=`.
+    """
+
+    def get(self, request, *args, **kwargs):
+        at = parse_datetime(request.query_params.get('at', ''))
+        if at is None:
+            raise ValidationError({'at': 'Expected an ISO 8601 date and time.'})
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+
+        target = self.get_target()
+        if at < target.created_at:
+            raise NotFound('The object didn\'t exist at that time.')
+        target_revisions = revisions.revisions_of(target)
+        # The original version, revision 1, is valid from creation until the first edit.
+        found = revisions.version(target_revisions, created_at__lte=at) or revisions.version(target_revisions, number=1)
+        if found is None:
+            fields = {field: getattr(target, field) for field in revisions.TRACKED_FIELDS[self.target_model]}
+            return Response({'number': 1, 'editor': None, 'created_at': target.created_at, **fields})
+        return self.version_response(*found)
+
+
+class PostRevisionListView(RevisionListView):
+    target_model = Post
+
+
+class PostRevisionDetailView(RevisionDetailView):
+    target_model = Post
+
+
+class PostAsOfView(AsOfView):
+    target_model = Post
+
+
+class CommentRevisionListView(RevisionListView):
+    target_model = Comment
+
+
+class CommentRevisionDetailView(RevisionDetailView):
+    target_model = Comment
+
+
+class CommentAsOfView(AsOfView):
+    target_model = Comment
+
+
+class ModQueueView(ExpandMixin, MergedStreamListMixin, GenericAPIView):
+    """
+    Reported posts and comments of the subreddit awaiting moderation, newest first.
+    """
+    permission_classes = [SubredditOwnerModeratorPermission|SuperUserPermission]
+    pagination_class = MergedCursorPagination
+    stream_serializers = {
+        'post': ModQueuePostSerializer,
+        'comment': ModQueueCommentSerializer,
+    }
+
+    def get_streams(self):
+        shard = shard_for_subreddit(self.kwargs['pk'])
+        return {
+            'post': Post.objects.using(shard).filter(subreddit=self.kwargs['pk'], report_count__gt=0, is_removed=False),
+            'comment': Comment.objects.using(shard).filter(
+                post__subreddit=self.kwargs['pk'], report_count__gt=0, is_removed=False
+            ),
+        }
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class ModerationView(IdempotentCreateMixin, CreateAPIView):
+    """
+    Apply a moderation action to many posts and comments of the subreddit at once.
+    """
+    serializer_class = ModerationActionSerializer
+    permission_classes = [SubredditOwnerModeratorPermission|SuperUserPermission]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = moderate(self.kwargs['pk'], **serializer.validated_data)
+        return Response(changed)
+
+
+class NotificationView(MergedStreamListMixin, GenericAPIView):
+    """
+    Notifications of the user, by latest activity. Only unread ones with `?unread=true`.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = NotificationCursorPagination
+    stream_serializers = {'notification': NotificationSerializer}
+    tag_results = False
+
+    def get_streams(self):
+        notifications = Notification.objects.filter(recipient=self.request.user)
+        if self.request.query_params.get('unread') in ('true', '1'):
+            notifications = notifications.filter(is_read=False)
+        return {'notification': notifications}
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class UnreadNotificationsView(GenericAPIView):
+    """
+    Number of unread notifications of the user, read from a counter.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response({'unread': unread_count(request.user.pk)})
+
+
+class ReadNotificationsView(GenericAPIView):
+    """
+    Mark notifications of the user as read.
+    """
+    serializer_class = NotificationReadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        read = mark_read(request.user.pk, serializer.validated_data.get('notifications'))
+        return Response({'read': read, 'unread': unread_count(request.user.pk)})
+
+
+class BatchView(GenericAPIView):
+    """
+    Run a list of API requests in one round-trip, as the same user, and return all results.
+    """
+    serializer_class = BatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'responses': execute_batch(request, serializer.validated_data['requests'])})
@@ -0,0 +1,104 @@
+import gc
+import time
+
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.settings import api_settings
+
+
+def iter_patterns(patterns):
+    """
+    Yield all URL patterns, including the ones of included URLconfs.
+    """
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def iter_views():
+    for pattern in iter_patterns(get_resolver().url_patterns):
+        view_class = getattr(pattern.callback, 'view_class', None)
+        if view_class is not None:
+            yield view_class
+
+
+def load_application():
+    return get_internal_wsgi_application()
+
+
+def compile_urls():
+    """
+    Import the URLconf and build the resolver's lookup tables, compiling every pattern.
+    """
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for pattern in iter_patterns(resolver.url_patterns):
+        pattern.pattern.regex
+
+
+def load_api_settings():
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES',
+                 'DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES'):
+        getattr(api_settings, name)
+
+
+def build_serializers():
+    """
+    Build the fields of every serializer used by a view, which also fills the model metadata caches.
+    """
+    serializer_classes = set()
+    for view_class in iter_views():
+        if getattr(view_class, 'serializer_class', None) is not None:
+            serializer_classes.add(view_class.serializer_class)
+        serializer_classes.update(getattr(view_class, 'stream_serializers', {}).values())
+    for serializer_class in serializer_classes:
+        serializer_class().fields
+
+
+def connect_databases():
+    """
+    Open a connection to every database to load the backends, then close them all:
+    connections must not be shared with forked workers.
+    """
+    for connection in connections.all():
+        connection.ensure_connection()
+    connections.close_all()
+
+
+def freeze_heap():
+    """
+    Move everything allocated so far out of the garbage collector's reach, so collections in
+    the workers don't write to, and copy, the pages shared with the master process.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+PHASES = [
+    ('application', load_application),
+    ('urls', compile_urls),
+    ('api settings', load_api_settings),
+    ('serializers', build_serializers),
+    ('databases', connect_databases),
+    ('freeze heap', freeze_heap),
+]
+
+
+def warm_up(application=None):
+    """
+    Run every warm-up phase. Returns the WSGI application and a list of (phase, seconds).
+    An `application` already loaded, e.g. preloaded by gunicorn, is warmed up instead of loading another.
+    """
+    profile = []
+    for name, phase in PHASES:
+        if name == 'application' and application is not None:
+            continue
+        start = time.perf_counter()
+        result = phase()
+        profile.append((name, time.perf_counter() - start))
+        if name == 'application':
+            application = result
+    return application, profile
@@ -0,0 +1,18 @@
+"""
+Gunicorn config for serving the project in production.
+
+    gunicorn -c reddit_project/gunicorn_conf.py --workers 4 --bind 0.0.0.0:8000 reddit_project.wsgi
+
+The application is preloaded by gunicorn in the master process, and warmed up once it's ready,
+before the workers are forked, like `manage.py serve` does. The time of each phase is logged.
+"""
+
+preload_app = True
+
+
+def when_ready(server):
+    from reddit.warmup import warm_up
+
+    _, profile = warm_up(application=server.app.wsgi())
+    for phase, seconds in profile:
+        server.log.info('Warm-up %s: %.1f ms', phase, seconds * 1000)
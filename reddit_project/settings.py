@@ -49,10 +49,30 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'reddit.renderers.MessagePackRenderer',
+        'reddit.renderers.CBORRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'reddit.parsers.MessagePackParser',
+        'reddit.parsers.CBORParser',
+    ],
+    # Keep datetimes as objects until rendering: the JSON renderer writes the same
+    # ISO 8601 strings as before, the binary renderers use native timestamp types.
+    # They're rendered in UTC as stored, without converting to the current timezone,
+    # so TIME_ZONE must stay 'UTC' (checked at startup).
+    'DATETIME_FORMAT': None,
 }
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'reddit.middleware.ProfilingMiddleware',
+    'reddit.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -89,9 +109,134 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Spare shard for posts and comments. Add it to SHARD_DATABASES and run
+    # `migrate --database shard_1` to place subreddits on it.
+    'shard_1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_shard_1.sqlite3',
+    },
 }
 
+DATABASE_ROUTERS = ['reddit.sharding.ShardRouter']
+
+# Databases holding posts, comments and reports, sharded by subreddit.
+# Users, subreddits and the subreddit-to-shard map always stay on 'default'.
+SHARD_DATABASES = ['default']
+
+# Number of primary keys reserved at once when ids are allocated across shards.
+SHARD_ID_BLOCK_SIZE = 100
+
+# Posts older than this are moved to the archive tables by `manage.py archive_posts`.
+ARCHIVE_AFTER_DAYS = 180
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by all worker processes, for entries every process must see. Create its table with
+    # `manage.py createcachetable`, or point it at Redis or Memcached.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'reddit_cache',
+    },
+    # Compressed response bodies, kept apart so they don't evict the object and query caches.
+    'compression': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'compression',
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+}
+
+
+# Response compression
+# Bodies shorter than this are sent uncompressed.
+COMPRESSION_MIN_LENGTH = 1024
+# Compressed bodies are cached by content digest, so repeated responses aren't recompressed.
+# Only public responses (no credentials sent, not private) of at least this length are cached.
+COMPRESSION_CACHE_MIN_LENGTH = 4096
+COMPRESSION_CACHE_ALIAS = 'compression'
+COMPRESSION_CACHE_TIMEOUT = 300
+
+
+# Per-object cache of serialized detail responses. Writes only reach the cache they run
+# against: with a process-local cache, other processes serve edited, removed or deleted
+# objects for up to OBJECT_CACHE_LOCAL_TIMEOUT seconds, the lifetime of its entries.
+# Point OBJECT_CACHE_ALIAS at Redis or Memcached to keep entries for OBJECT_CACHE_TIMEOUT.
+OBJECT_CACHE_ALIAS = 'default'
+OBJECT_CACHE_TIMEOUT = 300
+OBJECT_CACHE_LOCAL_TIMEOUT = 5
+
+
+# ORM query results cached with `.cached()`, until a write to one of the tables they read.
+# Writes are only seen by the processes sharing this cache, the others may serve results up
+# to QUERY_CACHE_TIMEOUT seconds old.
+QUERY_CACHE_ALIAS = 'default'
+QUERY_CACHE_TIMEOUT = 300
+
+
+# Stored responses of requests sent with an Idempotency-Key header, replayed for this long.
+# Retries can reach any worker, so the cache must be shared by all of them.
+IDEMPOTENCY_CACHE_ALIAS = 'shared'
+IDEMPOTENCY_TIMEOUT = 86400
+
+
+# Post views are buffered per process and written at most this often (seconds),
+# or when this many posts have buffered views, by requests writing at most
+# VIEW_COUNT_FLUSH_LIMIT posts each.
+VIEW_COUNT_FLUSH_INTERVAL = 10
+VIEW_COUNT_MAX_PENDING = 10000
+VIEW_COUNT_FLUSH_LIMIT = 100
+
+# New and deleted posts and comments are buffered per process and added to the activity rollups
+# of their minute at most this often (seconds), or when this many minutes are buffered, by
+# requests writing at most ACTIVITY_FLUSH_LIMIT of them each. The rollup_activity command, run
+# periodically, sums minute and hour rollups older than their ACTIVITY_RETENTION (seconds) into
+# hour and day rollups.
+ACTIVITY_FLUSH_INTERVAL = 10
+ACTIVITY_MAX_PENDING = 10000
+ACTIVITY_FLUSH_LIMIT = 500
+ACTIVITY_RETENTION = {'minute': 2 * 3600, 'hour': 7 * 86400}
+
+# Paginated lists of a subreddit or post (?page=) cache their exact counts for this long (seconds).
+# Creating or deleting a row of the list clears its count in this cache; counts cached in a
+# process-local one are flagged as approximate.
+COUNT_CACHE_ALIAS = 'shared'
+COUNT_CACHE_TIMEOUT = 60
+
+# Notifications of new comments are buffered per process and written at most this often
+# (seconds), or when this many are buffered, by comments writing at most NOTIFICATION_FLUSH_LIMIT
+# each. Only the first NOTIFICATION_MAX_MENTIONS users mentioned in a comment are notified.
+NOTIFICATION_FLUSH_INTERVAL = 5
+NOTIFICATION_MAX_PENDING = 10000
+NOTIFICATION_FLUSH_LIMIT = 500
+NOTIFICATION_MAX_MENTIONS = 10
+
+# New comments within SPAM_MAX_DISTANCE bits of the SimHash of a post or comment of the last
+# SPAM_WINDOW seconds are flagged for moderators ('flag') or rejected ('reject').
+# Texts shorter than SPAM_MIN_WORDS words aren't compared.
+SPAM_MAX_DISTANCE = 6
+SPAM_WINDOW = 3600
+SPAM_MIN_WORDS = 8
+SPAM_ACTION = 'flag'
+
+# Edit history stores a full snapshot every this many revisions, diffs in between.
+REVISION_SNAPSHOT_INTERVAL = 10
+
+
+# Request profiling
+# Staff users profile a request with the X-Profile header or ?profile=1, a fraction of all
+# requests is profiled at random. Stacks are sampled every PROFILING_INTERVAL seconds and
+# written to PROFILING_DIR as collapsed stacks or speedscope files.
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_INTERVAL = 0.005
+PROFILING_FORMAT = 'collapsed'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators